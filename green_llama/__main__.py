@@ -1,20 +1,56 @@
+import argparse
+import os
+import platform
 import signal
+import subprocess
 
-from rich.console import Console
-from rich.prompt import Prompt
-from green_llama.benchmark import run_benchmark, save_logs
+from . import cli
 
-from green_llama.metrics.metrics import test_all
-from green_llama.utils import clear_terminal
-from . import models
-from . import monitoring
-from . import utils
-from . import interface
-import subprocess
-import platform
-import os
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="green-llama", description="Monitor energy metrics of Ollama models",
+        epilog="Without a command, green-llama starts the interactive mode."
+    )
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the latest unfinished benchmark run instead of starting over")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port, off by default")
+    parser.add_argument("--backend", default=None,
+                        help="inference backend: ollama[:HOST], openai:BASE_URL or synthetic[:rate=N,burn=F,tokens=N], "
+                             "defaults to GREEN_LLAMA_BACKEND or ollama")
+    parser.add_argument("--profile-overhead", action="store_true",
+                        help="time green-llama's own measurement phases and report their overhead per request")
+    cli.add_subcommands(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.backend:
+        from .backends import backend_from_spec, set_backend
+        set_backend(backend_from_spec(args.backend))
+    if args.profile_overhead:
+        from .metrics.overhead import enable_profiling
+        enable_profiling()
+    if args.metrics_port:
+        from .metrics.exporter import start_exporter
+        start_exporter(args.metrics_port)
+    if args.command:
+        return cli.run(args)
+    interactive(args)
+
+def interactive(args):
+    # Imported here so the batch commands don't pay for the interactive UI
+    from rich.console import Console
+    from rich.prompt import IntPrompt, Prompt
+    from .benchmark import run_benchmark, save_logs
+    from .metrics.metrics import BASELINE_METRICS, STREAMING_METRICS, TOKEN_METRICS, stream_all
+    from .metrics.overhead import OVERHEAD_METRICS, get_profile
+    from .utils import clear_terminal
+    from . import models
+    from . import monitoring
+    from . import utils
+    from . import interface
 
-def main():
     clear_terminal()
     console = Console()
     interface.display_banner()
@@ -63,7 +99,10 @@ def main():
                 model_choice = True
 
         metrics = interface.choose_metric()
-        metrics_storage = {metric: {"prompts": [], "values": [], "times": []} for metric in metrics}
+        tracked_metrics = [*metrics, *BASELINE_METRICS, *STREAMING_METRICS, *TOKEN_METRICS, *monitoring.FLOPS_METRICS]
+        if get_profile():
+            tracked_metrics += OVERHEAD_METRICS
+        metrics_storage = {metric: {"prompts": [], "values": [], "times": []} for metric in tracked_metrics}
 
         while True:
             prompt = Prompt.ask(
@@ -101,9 +140,9 @@ def main():
             elif prompt.lower() == "benchmark":
 
                 benchmark_names = {
-                    1: "chat_benchmark",
+                    1: "text_benchmark",
                     2: "code_benchmark",
-                    3: "text_benchmark"
+                    3: "chat_benchmark"
                 }
                 console.print("\n[bold]Choose benchmark type:[/bold]")
                 console.print("1. Text Generation")
@@ -125,24 +164,34 @@ def main():
                     console.print(f"[bold green]Running chat testing benchmark with {len(prompts)} prompts...[/bold green]")
                     task_name = "chat-testing"
                 
-                for metric_name, measure_function in metrics.items():
-                    results = run_benchmark(model, prompts, metric_name, measure_function, task_name)
-                    for metric, data in results.items():
-                        if metric not in metrics_storage:
-                            metrics_storage[metric] = {"prompts": [], "values": [], "times": []}
-                        metrics_storage[metric]["prompts"].extend(data["prompts"])
-                        metrics_storage[metric]["values"].extend(data["values"])
-                        metrics_storage[metric]["times"].extend(data["times"])
-                    utils.display_summary(metrics_storage)
-                    save_logs(metrics_storage, model, benchmark_names[int(benchmark_type)])
+                # Every measurement records all metrics, the chosen metrics
+                # only filter what the summary shows
+                repetitions = IntPrompt.ask("Measurements per prompt", default=1)
+                results = run_benchmark(model, prompts, task_name, resume=args.resume, warmup=1,
+                                        repetitions=max(repetitions, 1))
+                for metric, data in results.items():
+                    if metric not in metrics_storage:
+                        metrics_storage[metric] = {"prompts": [], "values": [], "times": []}
+                    metrics_storage[metric]["prompts"].extend(data["prompts"])
+                    metrics_storage[metric]["values"].extend(data["values"])
+                    metrics_storage[metric]["times"].extend(data["times"])
+                utils.display_summary(metrics_storage, selected_metrics=list(metrics))
+                utils.display_statistics(results, selected_metrics=list(metrics))
+                save_logs(results, model, benchmark_names[int(benchmark_type)])
                 break
 
 
             else:
                 console.print("[yellow]Thinking...[/yellow]")
-                response, metrics_data = test_all(model, prompt)
+                response, metrics_data = stream_all(
+                    model, prompt,
+                    on_token=lambda token: console.print(token, end="", style="yellow", markup=False, highlight=False)
+                )
+                console.print()
+                metrics_data.update(monitoring.flops_metrics(
+                    model, response, metrics_data["Total Energy (J)"], metrics_data["elapsed_time"]
+                ))
                 monitoring.record_metrics(prompt, metrics_data, metrics_storage)
-                console.print(f"[yellow]{response['message']['content']}[/yellow]")
 
 
 if __name__ == "__main__":
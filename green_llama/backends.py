@@ -0,0 +1,345 @@
+import abc
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+DEFAULT_KEEP_ALIVE = 300  # s Ollama keeps a model loaded after a request unless told otherwise
+
+# Words the synthetic backend generates from, one per token
+SYNTHETIC_WORDS = ["the", "model", "energy", "green", "llama", "token", "watt", "carbon", "prompt", "answer",
+                   "power", "joule", "grid", "idle", "sample", "batch"]
+
+class Backend(abc.ABC):
+    """An inference server the measured functions talk to.
+
+    chat() answers like ollama.chat: a dict with message.content and, on the
+    final response, Ollama's token counters and nanosecond durations. With
+    stream=True it yields one such dict per chunk, the last one with done set.
+    keep_alive is how long the model stays loaded afterwards, as seconds or
+    an Ollama duration such as "10m", negative to keep it loaded; None leaves
+    it to the server. Backends that can't control residency ignore it.
+    """
+
+    name = "backend"
+    # Whether load() and unload() really load and evict models
+    controls_residency = False
+
+    @abc.abstractmethod
+    def chat(self, model, messages, stream=False, keep_alive=None):
+        """Answer messages, or yield the chunks of the answer with stream=True"""
+
+    def load(self, model, keep_alive=None):
+        """Load a model without generating and return the response, with its load_duration"""
+        return {}
+
+    def unload(self, model):
+        """Evict a model from memory so the next request starts cold, if controls_residency"""
+
+    def list_models(self):
+        return []
+
+    def show(self, model):
+        """Model metadata in the shape of ollama.show, empty when unknown"""
+        return {}
+
+    def pull(self, model):
+        raise RuntimeError(f"The {self.name} backend can't download models")
+
+class OllamaBackend(Backend):
+    """The Ollama API, through the ollama package. host defaults to OLLAMA_HOST."""
+
+    name = "ollama"
+    controls_residency = True
+
+    def __init__(self, host=None):
+        self.host = host
+        self._client = None
+
+    @property
+    def client(self):
+        import ollama
+
+        if self.host is None:
+            return ollama
+        if self._client is None:
+            self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def chat(self, model, messages, stream=False, keep_alive=None):
+        return self.client.chat(model=model, messages=messages, stream=stream, keep_alive=keep_alive)
+
+    def load(self, model, keep_alive=None):
+        # A generate request without a prompt only loads the model
+        return self.client.generate(model=model, keep_alive=keep_alive)
+
+    def unload(self, model):
+        self.client.generate(model=model, keep_alive=0)
+
+    def list_models(self):
+        return [model["model"] for model in self.client.list()["models"]]
+
+    def show(self, model):
+        return self.client.show(model)
+
+    def pull(self, model):
+        self.client.pull(model)
+
+class OpenAIBackend(Backend):
+    """An OpenAI-compatible /v1 endpoint such as llama.cpp server or vLLM.
+
+    Usage counts become Ollama's token counters; the durations are timed
+    here, prefill up to the first token and decode after it.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url="http://127.0.0.1:8080/v1", api_key=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        import httpx
+
+        with self._lock:
+            if self._client is None:
+                headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+                self._client = httpx.Client(base_url=self.base_url, headers=headers,
+                                            timeout=httpx.Timeout(None, connect=10.0))
+        return self._client
+
+    def chat(self, model, messages, stream=False, keep_alive=None):
+        request = {"model": model, "messages": messages, "stream": stream}
+        if stream:
+            request["stream_options"] = {"include_usage": True}
+            return self._stream(request)
+        start_time = time.perf_counter()
+        response = self.client.post("/chat/completions", json=request)
+        response.raise_for_status()
+        body = response.json()
+        content = body["choices"][0]["message"].get("content") or ""
+        # Without streaming prefill and decode can't be told apart
+        return self._response(model, content, body.get("usage"), start_time, None, time.perf_counter(), 1)
+
+    def _stream(self, request):
+        start_time = time.perf_counter()
+        first_token_time = None
+        chunks = []
+        usage = None
+        with self.client.stream("POST", "/chat/completions", json=request) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                body = json.loads(data)
+                usage = body.get("usage") or usage
+                content = "".join((choice.get("delta") or {}).get("content") or ""
+                                  for choice in body.get("choices") or [])
+                if not content:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                chunks.append(content)
+                yield {"model": request["model"], "message": {"role": "assistant", "content": content},
+                       "done": False}
+        yield self._response(request["model"], "", usage, start_time, first_token_time, time.perf_counter(),
+                             len(chunks))
+
+    @staticmethod
+    def _response(model, content, usage, start_time, first_token_time, end_time, chunks):
+        usage = usage or {}
+        first_token_time = first_token_time or start_time
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": usage.get("prompt_tokens") or 0,
+            # Servers that don't report usage stream about one token per chunk
+            "eval_count": usage.get("completion_tokens") or chunks,
+            "prompt_eval_duration": int((first_token_time - start_time) * 1e9),
+            "eval_duration": int((end_time - first_token_time) * 1e9),
+            "load_duration": 0,
+            "total_duration": int((end_time - start_time) * 1e9),
+        }
+
+    def list_models(self):
+        response = self.client.get("/models")
+        response.raise_for_status()
+        return [model["id"] for model in response.json()["data"]]
+
+class SyntheticBackend(Backend):
+    """Generates text locally at a fixed rate, for offline runs and overhead measurements.
+
+    Each token takes 1/rate seconds, the first `burn` of which is spent
+    spinning on the CPU and the rest sleeping. Answers depend only on the
+    model and prompt, so runs are reproducible. Any model name is accepted.
+    A model that isn't resident takes `load` seconds to load first and then
+    stays resident for keep_alive, like on an Ollama server.
+    """
+
+    name = "synthetic"
+    controls_residency = True
+
+    def __init__(self, rate=50.0, burn=0.0, tokens=32, parameters="1B", load=0.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if not 0.0 <= burn <= 1.0:
+            raise ValueError("burn must be between 0 and 1")
+        self.rate = float(rate)
+        self.burn = float(burn)
+        self.tokens = int(tokens)
+        self.parameters = parameters
+        self.load_time = float(load)
+        self._lock = threading.Lock()
+        self._resident = {}  # model -> perf_counter time it is evicted at
+
+    def resident(self, model):
+        with self._lock:
+            return self._resident.get(model, 0.0) > time.perf_counter()
+
+    def _load(self, model):
+        """Load the model unless it is resident, returning the seconds spent"""
+        if self.resident(model):
+            return 0.0
+        start_time = time.perf_counter()
+        busy_until = start_time + self.load_time * self.burn
+        while time.perf_counter() < busy_until:
+            pass
+        remaining = start_time + self.load_time - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return time.perf_counter() - start_time
+
+    def _keep(self, model, keep_alive):
+        with self._lock:
+            self._resident[model] = time.perf_counter() + parse_keep_alive(keep_alive)
+
+    def words(self, model, prompt):
+        digest = hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).digest()
+        return [SYNTHETIC_WORDS[digest[index % len(digest)] % len(SYNTHETIC_WORDS)]
+                for index in range(self.tokens)]
+
+    def _generate(self, model, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        interval = 1 / self.rate
+        deadline = time.perf_counter()
+        for index, word in enumerate(self.words(model, prompt)):
+            # Paced against a schedule so slow consumers don't lower the rate
+            busy_until = deadline + interval * self.burn
+            deadline += interval
+            while time.perf_counter() < busy_until:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            yield (" " if index else "") + word
+
+    def _final(self, model, messages, content, load_time, duration):
+        prompt = messages[-1]["content"] if messages else ""
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": self.tokens,
+            "prompt_eval_duration": 0,
+            "eval_duration": int(duration * 1e9),
+            "load_duration": int(load_time * 1e9),
+            "total_duration": int((load_time + duration) * 1e9),
+        }
+
+    def chat(self, model, messages, stream=False, keep_alive=None):
+        if stream:
+            return self._stream(model, messages, keep_alive)
+        load_time = self._load(model)
+        start_time = time.perf_counter()
+        content = "".join(self._generate(model, messages))
+        self._keep(model, keep_alive)
+        return self._final(model, messages, content, load_time, time.perf_counter() - start_time)
+
+    def _stream(self, model, messages, keep_alive):
+        load_time = self._load(model)
+        start_time = time.perf_counter()
+        for word in self._generate(model, messages):
+            yield {"model": model, "message": {"role": "assistant", "content": word}, "done": False}
+        self._keep(model, keep_alive)
+        yield self._final(model, messages, "", load_time, time.perf_counter() - start_time)
+
+    def load(self, model, keep_alive=None):
+        load_time = self._load(model)
+        self._keep(model, keep_alive)
+        return {"model": model, "done": True, "load_duration": int(load_time * 1e9),
+                "total_duration": int(load_time * 1e9)}
+
+    def unload(self, model):
+        with self._lock:
+            self._resident.pop(model, None)
+
+    def list_models(self):
+        return [self.name]
+
+    def show(self, model):
+        return {"details": {"parameter_size": self.parameters, "quantization_level": "F16"}}
+
+    def pull(self, model):
+        pass
+
+def parse_keep_alive(keep_alive):
+    """Seconds a model stays loaded for a keep_alive such as 300, "10m" or "-1", infinite when negative"""
+    if keep_alive is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(keep_alive, str):
+        match = re.fullmatch(r"\s*(-?[\d.]+)\s*(ms|s|m|h)?\s*", keep_alive)
+        if not match:
+            raise ValueError(f"Invalid keep_alive {keep_alive!r}")
+        scale = {"ms": 1e-3, "s": 1, None: 1, "m": 60, "h": 3600}[match.group(2)]
+        keep_alive = float(match.group(1)) * scale
+    return math.inf if keep_alive < 0 else float(keep_alive)
+
+BACKENDS = {"ollama": OllamaBackend, "openai": OpenAIBackend, "synthetic": SyntheticBackend}
+
+def backend_from_spec(spec):
+    """Backend from a spec such as "ollama", "ollama:http://gpu-box:11434",
+    "openai:http://127.0.0.1:8080/v1" or "synthetic:rate=20,burn=0.5"."""
+    name, _, argument = spec.partition(":")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    if not argument:
+        return BACKENDS[name]()
+    if name == "synthetic":
+        options = {}
+        for option in argument.split(","):
+            key, _, value = option.partition("=")
+            if key not in ("rate", "burn", "tokens", "parameters", "load"):
+                raise ValueError(f"Unknown synthetic backend option {key!r}")
+            options[key] = value if key == "parameters" else float(value)
+        return SyntheticBackend(**options)
+    return BACKENDS[name](argument)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The backend every measured call goes through: the one set with
+    set_backend(), else the GREEN_LLAMA_BACKEND spec, else Ollama."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_spec(os.environ.get("GREEN_LLAMA_BACKEND") or "ollama")
+    return _backend
+
+def set_backend(backend):
+    """Replace the shared backend, None to go back to the environment's default"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
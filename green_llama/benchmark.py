@@ -1,19 +1,347 @@
 from rich.console import Console
 import os
-import csv
-from .metrics.metrics import test_all
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .backends import get_backend
+from .metrics.baseline import calibrate, load_baseline
+from .metrics.metrics import all_metrics, chat
+from .metrics import exporter
+from .metrics.energy_tracker import EnergyTracker
+from .metrics.emissions import EmissionsTracker
+from .metrics.overlap import OverlapAttributor
+from .metrics.overhead import RequestOverhead
+from .monitoring import flops_metrics
+from .prompt_store import content_hash
+from .metrics_store import MetricsStore, new_run_id
+from .rank_index import RankIndex
 import re
 import platform
+import uuid
 
 console = Console()
 
-def run_benchmark(model: str, prompts: list, metric_name: str, measure_function, task_name: str = "text-generation"):
-    prompts = prompts[:2] # In total we have 678, but it takes too long.
-    metrics_storage = {}
+RUNS_DIR = "benchmark_runs"
+RECALIBRATE_INTERVAL = 1800  # s an idle baseline is trusted during a benchmark
+CALIBRATION_CHUNK = 50       # prompts run between idle baseline checks
+
+COLD_START_METRICS = ["Model Load Time (s)", "Model Load Energy (J)", "Cold Start Time (s)", "Cold Start Energy (J)"]
+
+NOVEL_PROMPTS = [
+    "Generate the beginning of a science fiction story",
+    # "Write a poem about the future world",
+    # "Tell a humorous joke",
+    # "Suggest an innovative business idea",
+    # "Describe an abstract art picture"
+]
+
+def default_concurrency():
+    """In-flight requests matching the server's OLLAMA_NUM_PARALLEL, 1 when unset"""
+    try:
+        return max(int(os.environ.get("OLLAMA_NUM_PARALLEL", 1)), 1)
+    except ValueError:
+        return 1
+
+def _chat_options(keep_alive):
+    # Leave keep_alive to the server unless it is set
+    return {} if keep_alive is None else {"keep_alive": keep_alive}
+
+def run_prompts(model: str, prompts: list, concurrency: int = 1, label: str = "Prompt", on_result=None,
+                baseline=None, keep_alive=None):
+    """Run prompts with up to `concurrency` requests in flight.
+
+    One tracker covers the whole batch and an OverlapAttributor charges each
+    request its share of the energy spent while it was in flight, along with
+    its share of the idle baseline's energy when one is given. on_result is
+    called with (index, metrics_data) as each prompt finishes. Returns the
+    (response, metrics_data) of every prompt in prompt order.
+    """
+    options = _chat_options(keep_alive)
+    results = [None] * len(prompts)
+    energy_tracker = EnergyTracker(baseline=baseline)
+    emissions_tracker = EmissionsTracker()
+    attributor = OverlapAttributor(energy_tracker)
+
+    def run_one(index, prompt):
+        overhead = RequestOverhead()
+        with overhead.phase("attribution"):
+            attributor.begin(index)
+        start_time = time.perf_counter()
+        try:
+            response = chat(model, prompt, **options)
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            with overhead.phase("attribution"):
+                energy = attributor.end(index)
+        return response, energy, elapsed_time, overhead
+
+    start_time = time.perf_counter()
+    with energy_tracker, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(run_one, index, prompt): index for index, prompt in enumerate(prompts)}
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                response, energy, elapsed_time, overhead = future.result()
+                with overhead.phase("metrics"):
+                    emissions = emissions_tracker.compute_emissions(energy.total)
+                    metrics_data = all_metrics(response, energy, emissions, elapsed_time)
+                    metrics_data.update(flops_metrics(model, response, energy.total, elapsed_time))
+                metrics_data.update(overhead.metrics(energy, elapsed_time))
+                results[index] = (response, metrics_data)
+                exporter.observe(metrics_data, model)
+                if on_result:
+                    on_result(index, metrics_data)
+                console.print(f"[blue]{label} {done}/{len(prompts)}[/blue] - Time: {elapsed_time:.2f}s")
+        except BaseException:
+            # Don't start queued prompts on Ctrl-C or errors, only in-flight ones finish
+            for future in futures:
+                future.cancel()
+            raise
+    wall_time = time.perf_counter() - start_time
+
+    if prompts and wall_time > 0:
+        tokens = sum(metrics_data.get("Generated Tokens", 0) for _, metrics_data in results)
+        console.print(
+            f"[bold]Throughput at concurrency {concurrency}:[/bold] "
+            f"{len(prompts) / wall_time:.2f} requests/s, {tokens / wall_time:.2f} tokens/s"
+        )
+    return results
+
+class RunJournal:
+    """Durable record of one benchmark run.
+
+    manifest.json holds the model, task, dataset hash, prompt indices and
+    config; results.jsonl gets one fsynced line per finished prompt, so an
+    interrupted run loses at most the prompts that were in flight.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.results_path = os.path.join(directory, "results.jsonl")
+        with open(self.manifest_path) as file:
+            self.manifest = json.load(file)
+        self._file = None
+
+    @classmethod
+    def create(cls, model, task_name, dataset_sha256, prompt_indices, config, runs_dir=RUNS_DIR):
+        safe_model = re.sub(r'[\\/:*?"<>|]', '_', model)
+        # The random suffix keeps runs started within the same second apart
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_model}-{task_name}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(runs_dir, run_id)
+        os.makedirs(directory, exist_ok=False)
+        manifest = {
+            "run_id": run_id,
+            "model": model,
+            "task": task_name,
+            "dataset_sha256": dataset_sha256,
+            "prompt_indices": prompt_indices,
+            "config": config,
+            "created": time.time(),
+            "completed": False,
+        }
+        _write_json(os.path.join(directory, "manifest.json"), manifest)
+        return cls(directory)
+
+    @classmethod
+    def find_incomplete(cls, model, task_name, dataset_sha256, prompt_indices, runs_dir=RUNS_DIR, repetitions=1,
+                        cold_starts=0):
+        """Latest unfinished run of the same model, task, prompts, repetitions and cold starts, or None"""
+        candidates = []
+        if os.path.isdir(runs_dir):
+            for name in os.listdir(runs_dir):
+                try:
+                    journal = cls(os.path.join(runs_dir, name))
+                except (OSError, ValueError):
+                    continue
+                manifest = journal.manifest
+                if (not manifest["completed"] and manifest["model"] == model and manifest["task"] == task_name
+                        and manifest["dataset_sha256"] == dataset_sha256
+                        and manifest["prompt_indices"] == prompt_indices
+                        and manifest["config"].get("repetitions", 1) == repetitions
+                        and manifest["config"].get("cold_starts", 0) == cold_starts):
+                    candidates.append(journal)
+        return max(candidates, key=lambda journal: journal.manifest["created"], default=None)
+
+    def results(self):
+        """Metrics of every finished prompt by key, ignoring a line torn by a crash"""
+        results = {}
+        if os.path.exists(self.results_path):
+            with open(self.results_path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    results[record["key"]] = record["metrics"]
+        return results
 
-    console.print(f"[bold green]Starting benchmark on model: {model} using first {len(prompts)} prompts[/bold green]")
-    for i, prompt in enumerate(prompts):
-        response, metrics_data = test_all(model, prompt)
+    def append(self, key, prompt, metrics_data):
+        if self._file is None:
+            self._file = open(self.results_path, mode="a", encoding="utf-8")
+        self._file.write(json.dumps({"key": key, "prompt": prompt, "metrics": metrics_data}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        self.close()
+        self.manifest["completed"] = True
+        _write_json(self.manifest_path, self.manifest)
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temp_path, path)
+
+def warm_up(model: str, prompts: list, iterations: int, keep_alive=None):
+    """Send unmeasured requests so model load isn't charged to the first measured prompt"""
+    for iteration in range(iterations):
+        console.print(f"[blue]Warmup {iteration + 1}/{iterations}[/blue]")
+        chat(model, prompts[iteration % len(prompts)], **_chat_options(keep_alive))
+
+def run_cold_start(model: str, prompt: str, keep_alive=None, baseline=None):
+    """Evict the model, then measure loading it and answering one prompt.
+
+    Returns the COLD_START_METRICS of the run: the load on its own, and the
+    load plus the first request, which is what a user of a cold model waits for.
+    """
+    backend = get_backend()
+    if not backend.controls_residency:
+        raise ValueError(f"The {backend.name} backend can't unload models, so it has no cold starts")
+    backend.unload(model)
+    energy_tracker = EnergyTracker(baseline=baseline)
+    with energy_tracker:
+        start_time = time.perf_counter()
+        loaded = backend.load(model, keep_alive)
+        load_time = time.perf_counter() - start_time
+        load_energy = energy_tracker.snapshot()
+        chat(model, prompt, **_chat_options(keep_alive))
+        elapsed_time = time.perf_counter() - start_time
+    energy = energy_tracker.stop()
+    # Ollama times the load itself, without the HTTP round trip
+    load_duration = (loaded.get("load_duration") or 0) / 1e9 if hasattr(loaded, "get") else 0.0
+    return {
+        "Model Load Time (s)": load_duration or load_time,
+        "Model Load Energy (J)": load_energy.total,
+        "Cold Start Time (s)": elapsed_time,
+        "Cold Start Energy (J)": energy.total,
+        "elapsed_time": elapsed_time,
+    }
+
+def refresh_baseline(baseline, max_age=RECALIBRATE_INTERVAL):
+    """Keep an idle baseline younger than max_age, from the host cache or by calibrating"""
+    if baseline is not None and baseline.age() <= max_age:
+        return baseline
+    baseline = load_baseline(max_age)
+    if baseline is None:
+        console.print("[blue]Measuring idle power...[/blue]")
+        baseline = calibrate()
+        console.print(f"[blue]Idle power: {baseline.total_power:.2f} W[/blue]")
+    return baseline
+
+def run_benchmark(model: str, prompts: list, task_name: str = "text-generation", concurrency: int = None,
+                  limit: int = None, resume: bool = False, runs_dir: str = RUNS_DIR,
+                  warmup: int = 0, repetitions: int = 1, idle_baseline: bool = False,
+                  recalibrate_interval: float = RECALIBRATE_INTERVAL, keep_alive=None, cold_starts: int = 0):
+    """Run every prompt `repetitions` times, recording all metrics, and return them as metrics_storage.
+
+    `warmup` unmeasured requests go first. Repetitions run round-robin over
+    the prompts so slow drift doesn't pile up on one prompt. Results are
+    journaled as they complete; with resume=True the latest unfinished run of
+    the same model, prompts and repetitions is continued instead of starting
+    over.
+
+    Before that, `cold_starts` runs evict the model and measure loading it
+    plus one prompt, reported as COLD_START_METRICS apart from the warm runs.
+    They are skipped on backends that can't evict models.
+    With keep_alive the model is then preloaded and every request asks the
+    server to keep it loaded that long, so warm runs never pay for a reload.
+
+    With idle_baseline, net energy above the machine's idle power is reported
+    too. The baseline is re-measured when it gets older than
+    recalibrate_interval, checked every CALIBRATION_CHUNK prompts while no
+    request is in flight.
+    """
+    dataset_sha256 = getattr(prompts, "sha256", None) or content_hash(prompts)
+    if limit:
+        prompts = prompts[:limit]
+    concurrency = concurrency or default_concurrency()
+    novel_prompts = NOVEL_PROMPTS if task_name == "text-generation" else []
+    work = []
+    for repetition in range(repetitions):
+        # The first repetition keeps the keys of single-pass journals
+        suffix = f":{repetition}" if repetition else ""
+        work += [(f"dataset:{index}{suffix}", prompt) for index, prompt in enumerate(prompts)]
+        work += [(f"novel:{index}{suffix}", prompt) for index, prompt in enumerate(novel_prompts)]
+    if cold_starts and not get_backend().controls_residency:
+        console.print(f"[yellow]The {get_backend().name} backend can't unload models, "
+                      f"skipping {cold_starts} cold starts[/yellow]")
+        cold_starts = 0
+    cold_work = [(f"cold:{index}", prompts[index % len(prompts)]) for index in range(cold_starts if prompts else 0)]
+    prompt_indices = list(range(len(prompts)))
+
+    journal = None
+    if resume:
+        journal = RunJournal.find_incomplete(model, task_name, dataset_sha256, prompt_indices, runs_dir,
+                                             repetitions, cold_starts)
+    if journal is None:
+        config = {"concurrency": concurrency, "limit": limit, "novel_prompts": novel_prompts,
+                  "warmup": warmup, "repetitions": repetitions, "keep_alive": keep_alive,
+                  "cold_starts": cold_starts}
+        journal = RunJournal.create(model, task_name, dataset_sha256, prompt_indices, config, runs_dir)
+        finished = {}
+    else:
+        finished = journal.results()
+        console.print(f"[bold green]Resuming run {journal.manifest['run_id']}: "
+                      f"{len(finished)}/{len(cold_work) + len(work)} prompts already done[/bold green]")
+    pending = [(key, prompt) for key, prompt in work if key not in finished]
+    pending_cold = [(key, prompt) for key, prompt in cold_work if key not in finished]
+    baseline = None
+    chunk_size = CALIBRATION_CHUNK if idle_baseline else max(len(pending), 1)
+    try:
+        if pending_cold and idle_baseline:
+            baseline = refresh_baseline(baseline, recalibrate_interval)
+        for done, (key, prompt) in enumerate(pending_cold, start=1):
+            metrics_data = run_cold_start(model, prompt, keep_alive, baseline)
+            journal.append(key, prompt, metrics_data)
+            console.print(f"[blue]Cold start {done}/{len(pending_cold)}[/blue] - "
+                          f"Load: {metrics_data['Model Load Time (s)']:.2f}s, "
+                          f"Total: {metrics_data['Cold Start Time (s)']:.2f}s")
+        if pending and keep_alive is not None and get_backend().controls_residency:
+            console.print(f"[blue]Loading {model}, keep_alive={keep_alive}[/blue]")
+            get_backend().load(model, keep_alive)
+        if pending and warmup:
+            warm_up(model, [prompt for _, prompt in pending], warmup, keep_alive)
+
+        console.print(f"[bold green]Starting benchmark on model: {model} with {len(pending)} prompts, "
+                      f"{concurrency} in flight[/bold green]")
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            if idle_baseline:
+                baseline = refresh_baseline(baseline, recalibrate_interval)
+            run_prompts(
+                model, [prompt for _, prompt in chunk], concurrency,
+                on_result=lambda index, metrics_data, chunk=chunk: journal.append(*chunk[index], metrics_data),
+                baseline=baseline, keep_alive=keep_alive
+            )
+    except KeyboardInterrupt:
+        console.print(f"[yellow]Benchmark interrupted, finished prompts are saved in {journal.directory}. "
+                      f"Run again with --resume to continue.[/yellow]")
+        raise
+    finally:
+        journal.close()
+    journal.complete()
+
+    metrics_storage = {}
+    results = journal.results()
+    for key, prompt in cold_work + work:
+        metrics_data = results[key]
         for metric_name, value in metrics_data.items():
             if metric_name != "elapsed_time":
                 if metric_name not in metrics_storage:
@@ -21,48 +349,34 @@ def run_benchmark(model: str, prompts: list, metric_name: str, measure_function,
                 metrics_storage[metric_name]["prompts"].append(prompt)
                 metrics_storage[metric_name]["values"].append(value)
                 metrics_storage[metric_name]["times"].append(metrics_data["elapsed_time"])
-        console.print(f"[blue]Prompt {i+1}/{len(prompts)}[/blue] - Time: {metrics_data['elapsed_time']:.2f}s")
-
-    if task_name == "text-generation":
-        novel_prompts = [
-            "Generate the beginning of a science fiction story",
-            # "Write a poem about the future world",
-            # "Tell a humorous joke",
-            # "Suggest an innovative business idea",
-            # "Describe an abstract art picture"
-        ]
-
-        console.print(f"[bold green]Starting novel benchmark tests on model: {model}[/bold green]")
-        for i, prompt in enumerate(novel_prompts):
-            response, metrics_data = test_all(model, prompt)
-            for metric_name, value in metrics_data.items():
-                if metric_name != "elapsed_time":
-                    if metric_name not in metrics_storage:
-                        metrics_storage[metric_name] = {"prompts": [], "values": [], "times": []}
-                    metrics_storage[metric_name]["prompts"].append(prompt)
-                    metrics_storage[metric_name]["values"].append(value)
-                    metrics_storage[metric_name]["times"].append(metrics_data["elapsed_time"])
-            console.print(f"[magenta]Novel Prompt {i+1}/{len(novel_prompts)}[/magenta] - Time: {metrics_data['elapsed_time']:.2f}s")
 
     return metrics_storage
 
 
-def save_logs(metrics_storage, model, benchmark_name, filename="benchmark_log.csv"):
+def save_logs(metrics_storage, model, benchmark_name, filename="benchmark_log.csv",
+              results_dir="report_viewer/public/benchmark_results", run_id=None, store=None, index=None):
+    """Append a benchmark's results to the metrics store and re-export the model's log for the report viewer.
+
+    The log's rank index entry, by default the one next to the store, gets
+    the sums of the new results added.
+    """
+    store = store or MetricsStore()
+    index = index or RankIndex.of_store(store)
     safe_model = re.sub(r'[\\/:*?"<>|]', '_', model.replace('.', '_'))
-    directory = f"report_viewer/public/benchmark_results/{benchmark_name}"
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    directory = os.path.join(results_dir, benchmark_name)
     file_path = os.path.join(directory, f"{safe_model}_{filename}")
-    file_exists = os.path.exists(file_path)
-    with open(file_path, mode="a" if file_exists else "w", newline="") as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Metric Name", "Prompt", "Value", "Elapsed Time"])
-        for metric_name, data in metrics_storage.items():
-            for prompt, value, elapsed_time in zip(data["prompts"], data["values"], data["times"]):
-                writer.writerow([metric_name, prompt, value, elapsed_time])
+    entry = index.entry(file_path, benchmark_name, safe_model)
+    if os.path.exists(file_path) and not store.count(model=model, benchmark=benchmark_name):
+        # Keep the history logged before the store existed
+        store.import_csv(file_path, "legacy", model, benchmark_name)
+    segment = store.append_storage(metrics_storage, run_id or new_run_id(model, benchmark_name), model,
+                                   benchmark_name)
+    store.export_csv(file_path, model=model, benchmark=benchmark_name)
+    index.update(file_path, benchmark_name, safe_model, entry, store, segment,
+                 {"model": model, "benchmark": benchmark_name})
 
     console.print(f"[green]Log saved to {file_path}[/green]")
+    return file_path
 
     # directory = f"green_llama/data_collection/benchmark_results/{benchmark_name}"
     # if not os.path.exists(directory):
@@ -0,0 +1,172 @@
+import argparse
+import json
+import sys
+
+SUITES = {
+    "text": ("text-generation", "text_benchmark"),
+    "code": ("code-generation", "code_benchmark"),
+    "chat": ("chat-testing", "chat_benchmark"),
+}
+
+def add_subcommands(parser):
+    subparsers = parser.add_subparsers(dest="command")
+
+    bench = subparsers.add_parser("bench", help="run a benchmark suite and print a JSON summary")
+    bench.add_argument("--model", required=True)
+    bench.add_argument("--suite", choices=sorted(SUITES), default="text")
+    bench.add_argument("--concurrency", type=int, default=None,
+                       help="requests in flight, defaults to OLLAMA_NUM_PARALLEL")
+    bench.add_argument("--limit", type=int, default=None, help="only run the first N prompts")
+    bench.add_argument("--warmup", type=int, default=1, help="unmeasured requests sent before the benchmark")
+    bench.add_argument("--repetitions", type=int, default=1, help="measurements per prompt")
+    bench.add_argument("--keep-alive", type=_keep_alive, default=None,
+                       help="preload the model and keep it loaded this long, e.g. 300, 10m or -1 for forever")
+    bench.add_argument("--cold-starts", type=int, default=0,
+                       help="runs that unload the model first, reported apart from the warm runs")
+    bench.add_argument("--idle-baseline", action="store_true",
+                       help="also report net energy above the measured idle power")
+    bench.add_argument("--out", default="report_viewer/public/benchmark_results",
+                       help="directory the benchmark log is written to")
+    # Also accepted before the command, don't let the subparser's default overwrite it
+    bench.add_argument("--resume", action="store_true", default=argparse.SUPPRESS,
+                       help="continue the latest unfinished run of this model and suite")
+    bench.add_argument("--runs-dir", default="benchmark_runs", help="directory of the run journals")
+
+    rank = subparsers.add_parser("rank", help="print the model rankings as JSON")
+    rank.add_argument("--data", default="report_viewer/public", help="report viewer data folder")
+
+    calibrate = subparsers.add_parser("calibrate", help="measure and cache this machine's idle power")
+    calibrate.add_argument("--window", type=float, default=5.0, help="seconds of idle sampling")
+
+    proxy = subparsers.add_parser("proxy", help="meter every chat and generate request sent through a reverse proxy")
+    proxy.add_argument("--upstream", default="http://127.0.0.1:11434", help="Ollama server to forward to")
+    proxy.add_argument("--host", default="127.0.0.1")
+    proxy.add_argument("--port", type=int, default=11435)
+
+    prompts = subparsers.add_parser("prompts", help="write a suite's prompt store to a directory for offline use")
+    prompts.add_argument("--suite", choices=sorted(SUITES), default="text")
+    prompts.add_argument("--out", default=None,
+                         help="directory to write to, defaults to the package's data/prompts, which is bundled when it is built")
+
+    chat = subparsers.add_parser("chat", help="send one prompt and print the response and metrics as JSON")
+    chat.add_argument("--model", required=True)
+    chat.add_argument("--prompt", default=None, help="prompt text, read from stdin when omitted")
+
+def _keep_alive(value):
+    """Seconds as a number, anything else as an Ollama duration string"""
+    from .backends import parse_keep_alive
+
+    parse_keep_alive(value)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def run(args):
+    commands = {"bench": bench, "rank": rank, "calibrate": calibrate, "proxy": proxy, "prompts": prompts,
+                "chat": chat}
+    result = commands[args.command](args)
+    json.dump(result, sys.stdout, indent=2, default=float)
+    sys.stdout.write("\n")
+    return 0
+
+def _summarize(metrics_storage):
+    from .stats import summarize_storage
+
+    return {
+        metric_name: {**summary, "total": sum(metrics_storage[metric_name]["values"])}
+        for metric_name, summary in summarize_storage(metrics_storage).items()
+    }
+
+def bench(args):
+    from . import benchmark
+    from .metrics.overhead import OVERHEAD_BUDGET, get_profile
+    from .prompt_store import load_prompts
+
+    # Keep stdout for the JSON result
+    benchmark.console.stderr = True
+    task_name, benchmark_name = SUITES[args.suite]
+    prompts = load_prompts(task_name)
+    metrics_storage = benchmark.run_benchmark(
+        args.model, prompts, task_name,
+        concurrency=args.concurrency, limit=args.limit, resume=args.resume, runs_dir=args.runs_dir,
+        warmup=args.warmup, repetitions=args.repetitions, idle_baseline=args.idle_baseline,
+        keep_alive=args.keep_alive, cold_starts=args.cold_starts
+    )
+    log_path = benchmark.save_logs(metrics_storage, args.model, benchmark_name, results_dir=args.out)
+    result = {
+        "model": args.model,
+        "suite": args.suite,
+        "dataset_sha256": prompts.sha256,
+        "log": log_path,
+        "metrics": _summarize(metrics_storage),
+    }
+    profile = get_profile()
+    if profile:
+        result["overhead"] = {"budget_pct": OVERHEAD_BUDGET, "phases": profile.report()}
+    return result
+
+def rank(args):
+    from .utils import model_rankings
+
+    return {
+        benchmark_dir: [
+            {
+                "rank": rank,
+                "tied": rank is not None and sum(row[0] == rank for row in ranked_models) > 1,
+                "model": model_name,
+                "avg_co2_g": avg_co2,
+                "energy_per_token_j": j_per_token,
+                "co2_per_1k_tokens_g": co2_per_1k,
+            }
+            for rank, model_name, avg_co2, j_per_token, co2_per_1k in ranked_models
+        ]
+        for benchmark_dir, ranked_models in model_rankings(args.data).items()
+    }
+
+def calibrate(args):
+    from .metrics import baseline as idle
+
+    baseline = idle.calibrate(args.window)
+    return {
+        "host": baseline.host,
+        "window_s": baseline.window,
+        "idle_power_w": baseline.power,
+        "cache": idle.baseline_path(baseline.host),
+    }
+
+def proxy(args):
+    import asyncio
+    from .proxy import serve
+
+    def ready(server):
+        print(f"Forwarding http://{server.host}:{server.port} to {server.upstream}", file=sys.stderr)
+
+    try:
+        # Ctrl-C cancels serve(), which flushes its records and returns
+        requests = asyncio.run(serve(args.upstream, args.host, args.port, on_ready=ready))
+    except KeyboardInterrupt:
+        requests = None
+    return {"upstream": args.upstream, "port": args.port, "metered_requests": requests}
+
+def prompts(args):
+    from .prompt_store import bundled_dir, export_store
+
+    task_name, _ = SUITES[args.suite]
+    path, sha256, count = export_store(task_name, args.out or bundled_dir())
+    return {"suite": args.suite, "path": path, "prompts": count, "dataset_sha256": sha256}
+
+def chat(args):
+    from .metrics.metrics import test_all
+    from .monitoring import flops_metrics
+
+    prompt = args.prompt if args.prompt is not None else sys.stdin.read()
+    response, metrics_data = test_all(args.model, prompt)
+    metrics_data.update(flops_metrics(args.model, response, metrics_data["Total Energy (J)"],
+                                      metrics_data["elapsed_time"]))
+    return {
+        "model": args.model,
+        "prompt": prompt,
+        "response": response["message"]["content"],
+        "metrics": metrics_data,
+    }
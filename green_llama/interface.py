@@ -1,4 +1,3 @@
-import pyfiglet
 from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt
@@ -11,6 +10,8 @@ from .metrics.metrics import (
 console = Console()
 
 def display_banner():
+    import pyfiglet
+
     ascii_llama = pyfiglet.figlet_format("Green Llama", font="standard", justify="center")
     console.print(f"[bold green]{ascii_llama}[/bold green]")
 
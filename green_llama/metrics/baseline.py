@@ -0,0 +1,103 @@
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+CALIBRATION_WINDOW = 5.0       # s of idle sampling per calibration
+BASELINE_MAX_AGE = 24 * 3600   # s before a cached baseline is measured again
+BASELINE_RECHECK = 60          # s before the host cache is read again while it has no baseline
+
+@dataclass(frozen=True)
+class IdleBaseline:
+    host: str
+    measured_at: float         # epoch seconds
+    window: float              # s
+    power: dict                # component -> W
+
+    @property
+    def total_power(self):
+        return sum(self.power.values())
+
+    def age(self):
+        return time.time() - self.measured_at
+
+def baseline_path(host=None):
+    root = os.environ.get("GREEN_LLAMA_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "green_llama")
+    return os.path.join(root, f"baseline-{host or socket.gethostname()}.json")
+
+def calibrate(window=CALIBRATION_WINDOW, tracker=None, save=True):
+    """Measure the idle power of every component over window seconds.
+
+    Nothing else should run on the machine meanwhile, in particular no
+    inference request.
+    """
+    if tracker is None:
+        from .energy_tracker import EnergyTracker
+        tracker = EnergyTracker()
+    start_time = time.perf_counter()
+    with tracker:
+        time.sleep(window)
+    elapsed = time.perf_counter() - start_time
+    energy = tracker.stop()
+    baseline = IdleBaseline(
+        host=socket.gethostname(),
+        measured_at=time.time(),
+        window=elapsed,
+        power={"cpu": energy.cpu / elapsed, "gpu": energy.gpu / elapsed, "ram": energy.ram / elapsed},
+    )
+    if save:
+        save_baseline(baseline)
+    return baseline
+
+def save_baseline(baseline, path=None):
+    path = path or baseline_path(baseline.host)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(asdict(baseline), file, indent=2)
+    os.replace(temp_path, path)
+    _forget_current()
+    return path
+
+def load_baseline(max_age=BASELINE_MAX_AGE, path=None):
+    """This host's cached baseline, or None when there is none or it has expired"""
+    try:
+        with open(path or baseline_path(), encoding="utf-8") as file:
+            baseline = IdleBaseline(**json.load(file))
+    except (OSError, TypeError, ValueError):
+        return None
+    return baseline if baseline.age() <= max_age else None
+
+_current = None  # (path, max_age, baseline, time the host cache was read)
+_current_lock = threading.Lock()
+
+def current_baseline(max_age=BASELINE_MAX_AGE):
+    """load_baseline(), kept in memory for measured requests.
+
+    The host cache is read again once the baseline in memory expires, or
+    every BASELINE_RECHECK seconds while there is none, so long-running
+    processes pick up a calibration made meanwhile.
+    """
+    global _current
+    path = baseline_path()
+    with _current_lock:
+        if _current is not None and _current[:2] == (path, max_age):
+            baseline, read_at = _current[2:]
+            if baseline is not None and baseline.age() <= max_age:
+                return baseline
+            if baseline is None and time.time() - read_at < BASELINE_RECHECK:
+                return None
+        baseline = load_baseline(max_age, path)
+        _current = (path, max_age, baseline, time.time())
+        return baseline
+
+def _forget_current():
+    global _current
+    with _current_lock:
+        _current = None
+
+def get_baseline(max_age=BASELINE_MAX_AGE, window=CALIBRATION_WINDOW):
+    """The cached baseline while it is fresh, calibrating a new one otherwise"""
+    return load_baseline(max_age) or calibrate(window)
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
-import requests
 from typing import Optional
+from .intensity import get_intensity_provider
 
 @dataclass
 class CarbonEmissions:
@@ -14,9 +14,10 @@ class CarbonEmissions:
     cloud_region: Optional[str] = None
 
 class EmissionsTracker:
-    def __init__(self, country_iso_code="NLD"):
+    def __init__(self, country_iso_code="NLD", provider=None):
         self.country_iso_code = country_iso_code
-        self._co2_signal_api_token = None  # Optional CO2 Signal API token
+        # Live intensity, e.g. CO2 Signal when CO2_SIGNAL_API_TOKEN is set
+        self.provider = provider or get_intensity_provider()
         
         # Carbon intensity data (gCO2/kWh) by country
         # Source: https://ourworldindata.org/grapher/carbon-intensity-electricity
@@ -31,18 +32,11 @@ class EmissionsTracker:
 
     def get_carbon_intensity(self):
         """Get carbon intensity for the specified country (gCO2/kWh)"""
-        # Try to get real-time data from CO2 Signal API
-        if self._co2_signal_api_token:
-            try:
-                response = requests.get(
-                    f"https://api.co2signal.com/v1/latest?countryCode={self.country_iso_code}",
-                    headers={"auth-token": self._co2_signal_api_token},
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    return response.json()["data"]["carbonIntensity"]
-            except:
-                pass  # Fallback to static data if API call fails
+        # Real-time data when the provider has it, it never waits on the network
+        if self.provider:
+            carbon_intensity = self.provider.get(self.country_iso_code)
+            if carbon_intensity is not None:
+                return carbon_intensity
 
         # Use static data
         return self._carbon_intensity_data.get(
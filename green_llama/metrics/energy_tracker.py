@@ -1,32 +1,162 @@
 import time
-from .hardware import CPU, GPU, RAM, EnergyConsumption
+from . import exporter
+from .hardware import EnergyConsumption
+from .processes import ProcessAttribution, find_ollama_pids
+from .registry import get_hardware
+from .sampler import PowerSampler
+
+ENERGY_SOURCES = ("rapl", "heuristic")
+ATTRIBUTIONS = ("system", "process")
 
 class EnergyTracker:
-    def __init__(self, measure_interval=1.0):
+    def __init__(self, measure_interval=0.05, buffer_size=4096, hardware=None, gpu_devices=None,
+                 energy_source="rapl", attribution="system", baseline=None):
+        """gpu_devices selects the GPUs to track: None for every visible device,
+        "ollama" for the devices running Ollama processes, or a list of indices.
+        energy_source "rapl" reads CPU/DRAM energy counters where available and
+        falls back to the power heuristics; "heuristic" always uses the latter.
+        attribution "system" charges all CPU and RAM energy to the call, while
+        "process" only charges the Ollama processes' share of it. baseline is an
+        IdleBaseline whose power is reported as idle energy next to the gross
+        total; with process attribution only its GPU part applies, as CPU and
+        RAM are already split by process."""
+        if energy_source not in ENERGY_SOURCES:
+            raise ValueError(f"Unknown energy source {energy_source!r}, expected one of {ENERGY_SOURCES}")
+        if attribution not in ATTRIBUTIONS:
+            raise ValueError(f"Unknown attribution {attribution!r}, expected one of {ATTRIBUTIONS}")
         self.measure_interval = measure_interval
-        self.cpu = CPU()
-        self.gpu = GPU()
-        self.ram = RAM()
+        # Borrow the shared probes instead of initializing the hardware per call
+        hardware = hardware or get_hardware()
+        self.cpu = hardware.cpu
+        self.gpu = hardware.gpu
+        self.ram = hardware.ram
+        self.rapl = hardware.rapl if energy_source == "rapl" else None
+        counted = self.rapl.components if self.rapl else ()
+        # Components without a counter are sampled with the heuristics
+        probes = {"cpu": lambda: self.cpu.get_power(interval=None), "ram": self.ram.get_power}
+        self._probes = [(component, probe) for component, probe in probes.items() if component not in counted]
+        self.gpu_devices = self._resolve_gpu_devices(gpu_devices)
+        channels = tuple(component for component, _ in self._probes)
+        channels += tuple(f"gpu{index}" for index in self.gpu_devices)
+        self._sampler = PowerSampler(
+            self._read_power, channels,
+            interval=measure_interval, capacity=buffer_size,
+            on_sample=exporter.observe_power, on_stop=exporter.clear_power
+        )
+        self.attribution = ProcessAttribution() if attribution == "process" else None
+        self.baseline = baseline
+        self._idle_before = 0.0   # J of idle energy charged at earlier baselines this session
+        self._idle_elapsed = 0.0  # s into the session the current baseline applies from
+        self._rapl_start = None
         self._start_time = None
         self._energy = EnergyConsumption()
-        
+
+    @property
+    def energy_source(self):
+        return "rapl" if self.rapl else "heuristic"
+
+    def _resolve_gpu_devices(self, gpu_devices):
+        if gpu_devices is None:
+            return list(self.gpu.devices)
+        if gpu_devices == "ollama":
+            return self.gpu.devices_for_pids(find_ollama_pids())
+        return [index for index in gpu_devices if index in self.gpu.devices]
+
+    def _read_power(self):
+        # All GPUs are read in the same pass as the CPU and RAM
+        return (
+            *(probe() for _, probe in self._probes),
+            *self.gpu.get_device_powers(self.gpu_devices),
+        )
+
     def start(self):
-        self._start_time = time.time()
+        self._start_time = time.perf_counter()
         self._energy = EnergyConsumption()
-        
+        self._idle_before = self._idle_elapsed = 0.0
+        if self.attribution:
+            self.attribution.start()
+        if self.rapl:
+            self._rapl_start = self.rapl.read()
+        self._sampler.start()
+
     def stop(self):
+        """Stop the session and return its frozen EnergyConsumption.
+
+        Only the first call after start() does any work; later calls, including
+        the one made by __exit__, return the cached result.
+        """
         if self._start_time is None:
             return self._energy
-            
-        duration = time.time() - self._start_time
-        # Calculate energy consumption (power * time)
-        self._energy.cpu = self.cpu.get_power() * duration # / (3600 * 1000)  # Convert to kWh
-        self._energy.gpu = self.gpu.get_power() * duration # / (3600 * 1000)
-        self._energy.ram = self.ram.get_power() * duration # / (3600 * 1000)
-        self._energy.total = self._energy.cpu + self._energy.gpu + self._energy.ram
-        
+
+        # Energy is integrated by the background sampler, so this never blocks
+        energy = self._sampler.stop()
+        if self.rapl:
+            energy.update(self.rapl.energy(self._rapl_start, self.rapl.read()))
+        elapsed = time.perf_counter() - self._start_time
+        self._start_time = None
+        processes = {}
+        if self.attribution:
+            processes = self.attribution.stop(energy["cpu"], energy["ram"])
+            energy["cpu"] = sum(process.cpu for process in processes.values())
+            energy["ram"] = sum(process.ram for process in processes.values())
+        self._energy = self._consumption(energy, elapsed, processes)
         return self._energy
 
+    def snapshot(self):
+        """Energy of the running session so far, without stopping it.
+
+        Cheap enough to call per streamed token; process attribution is only
+        applied by stop().
+        """
+        if self._start_time is None:
+            return self._energy
+        energy = self._sampler.energy()
+        if self.rapl:
+            energy.update(self.rapl.energy(self._rapl_start, self.rapl.read()))
+        return self._consumption(energy, time.perf_counter() - self._start_time)
+
+    def set_baseline(self, baseline):
+        """Charge idle power from baseline from now on, keeping the idle energy of the session so far"""
+        if self._start_time is not None:
+            elapsed = time.perf_counter() - self._start_time
+            self._idle_before += self._idle_power() * (elapsed - self._idle_elapsed)
+            self._idle_elapsed = elapsed
+        self.baseline = baseline
+
+    def _idle_power(self):
+        if self.baseline is None:
+            return 0.0
+        components = ("gpu",) if self.attribution else ("cpu", "gpu", "ram")
+        return sum(self.baseline.power.get(component, 0.0) for component in components)
+
+    def _consumption(self, energy, elapsed, processes=None):
+        gpu_devices = {index: energy[f"gpu{index}"] for index in self.gpu_devices}
+        gpu = sum(gpu_devices.values())
+        return EnergyConsumption(
+            cpu=energy["cpu"],
+            gpu=gpu,
+            ram=energy["ram"],
+            total=energy["cpu"] + gpu + energy["ram"],
+            gpu_devices=gpu_devices,
+            processes=processes or {},
+            idle=self._idle_before + self._idle_power() * (elapsed - self._idle_elapsed),
+            sampler_cpu=self._sampler.cpu_time(),
+        )
+
+    @property
+    def energy(self):
+        return self._energy
+
+    @property
+    def channels(self):
+        return self._sampler.channels
+
+    def samples(self):
+        """Power samples of the current session as rows of [time, *sampled channels] (s, W).
+
+        Components read from RAPL counters are not sampled and have no column."""
+        return self._sampler.samples()
+
     def __enter__(self):
         self.start()
         return self
@@ -51,11 +181,12 @@ def main():
         print("Simulating workload...")
         time.sleep(5)  # Simulate a 5-second workload
 
-    tracker.stop()
-    energy = tracker._energy
+    energy = tracker.energy
     # Print the results
     print(f"CPU Energy Consumption: {energy.cpu:.6f} J")
     print(f"GPU Energy Consumption: {energy.gpu:.6f} J")
+    for index, joules in energy.gpu_devices.items():
+        print(f"  GPU {index}: {joules:.6f} J")
     print(f"RAM Energy Consumption: {energy.ram:.6f} J")
     print(f"Total Energy Consumption: {energy.total:.6f} J")
 
@@ -0,0 +1,164 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 9464
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+COUNTERS = {
+    "green_llama_energy_joules_total": "Energy charged to requests by component.",
+    "green_llama_net_energy_joules_total": "Energy charged to requests above the idle baseline.",
+    "green_llama_emissions_grams_total": "Carbon emissions of requests in gCO2.",
+    "green_llama_requests_total": "Completed requests.",
+    "green_llama_generated_tokens_total": "Tokens generated by requests.",
+}
+
+# name -> (help, metric key in the metrics dict, bucket upper bounds)
+HISTOGRAMS = {
+    "green_llama_request_duration_seconds": (
+        "Request latency.", "elapsed_time", (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)),
+    "green_llama_time_to_first_token_seconds": (
+        "Time to first token of streamed requests.", "Time to First Token (s)", (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    "green_llama_tokens_per_second": (
+        "Decode throughput of requests.", "Tokens/s", (1, 5, 10, 20, 50, 100, 200, 500)),
+}
+
+GAUGES = {
+    "green_llama_power_watts": "Latest sampled power draw by channel, while a tracker runs.",
+}
+
+COMPONENTS = {"cpu": "CPU Energy (J)", "gpu": "GPU Energy (J)", "ram": "RAM Energy (J)"}
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Telemetry:
+    """Pre-aggregated counters, histograms and gauges in the Prometheus text format.
+
+    Requests and power samples are folded in as they happen, so rendering a
+    scrape only formats numbers that are already there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {name: {} for name in COUNTERS}
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._gauges = {name: {} for name in GAUGES}
+
+    def _increment(self, name, labels, value):
+        series = self._counters[name]
+        series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, metrics, model=""):
+        """Fold in the metrics dict of one finished request"""
+        with self._lock:
+            model_label = (("model", model),)
+            for component, metric_name in COMPONENTS.items():
+                if metric_name in metrics:
+                    self._increment("green_llama_energy_joules_total",
+                                    model_label + (("component", component),), metrics[metric_name])
+            if "Net Energy (J)" in metrics:
+                self._increment("green_llama_net_energy_joules_total", model_label, metrics["Net Energy (J)"])
+            self._increment("green_llama_emissions_grams_total", model_label,
+                            metrics.get("Carbon Emissions (gCO2)", 0.0))
+            self._increment("green_llama_requests_total", model_label, 1)
+            self._increment("green_llama_generated_tokens_total", model_label, metrics.get("Generated Tokens", 0))
+            for name, (_, metric_name, bounds) in HISTOGRAMS.items():
+                value = metrics.get(metric_name)
+                if value is None:
+                    continue
+                histogram = self._histograms[name].setdefault(model_label, [0] * (len(bounds) + 1) + [0.0])
+                for index, bound in enumerate(bounds):
+                    if value <= bound:
+                        histogram[index] += 1
+                histogram[len(bounds)] += 1
+                histogram[-1] += value
+
+    def observe_power(self, channels, power):
+        with self._lock:
+            gauge = self._gauges["green_llama_power_watts"]
+            for channel, watts in zip(channels, power):
+                gauge[(("channel", channel),)] = float(watts)
+
+    def clear_power(self, channels):
+        """Drop the power series of channels whose sampler stopped, so they don't go stale"""
+        with self._lock:
+            gauge = self._gauges["green_llama_power_watts"]
+            for channel in channels:
+                gauge.pop((("channel", channel),), None)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, help_text in COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in self._counters[name].items()]
+            for name, (help_text, _, bounds) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for labels, histogram in self._histograms[name].items():
+                    for bound, count in zip((*bounds, "+Inf"), histogram):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram[-1]}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram[len(bounds)]}")
+            for name, help_text in GAUGES.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in self._gauges[name].items()]
+        return "\n".join(lines) + "\n"
+
+_telemetry = None
+
+def get_telemetry():
+    """The exporter's Telemetry, None while no exporter runs"""
+    return _telemetry
+
+def observe(metrics, model=""):
+    telemetry = _telemetry
+    if telemetry is not None:
+        telemetry.observe(metrics, model)
+
+def observe_power(channels, power):
+    telemetry = _telemetry
+    if telemetry is not None:
+        telemetry.observe_power(channels, power)
+
+def clear_power(channels):
+    telemetry = _telemetry
+    if telemetry is not None:
+        telemetry.clear_power(channels)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.telemetry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_exporter(port=DEFAULT_PORT, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread and start collecting telemetry; returns the server"""
+    global _telemetry
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.telemetry = _telemetry = Telemetry()
+    threading.Thread(target=server.serve_forever, name="green-llama-exporter", daemon=True).start()
+    return server
+
+def stop_exporter(server):
+    global _telemetry
+    server.shutdown()
+    server.server_close()
+    if _telemetry is server.telemetry:
+        _telemetry = None
@@ -0,0 +1,15 @@
+from unittest.mock import MagicMock
+
+def fake_hardware(cpu=10.0, gpus=(20.0,), ram=5.0):
+    """Stand-in for the HardwareRegistry whose probes report constant powers in watts.
+
+    The probes are mocks, so tests can count hardware reads. Patch it in with
+    ``patch("green_llama.metrics.energy_tracker.get_hardware", return_value=fake_hardware())``.
+    """
+    hardware = MagicMock()
+    hardware.cpu.get_power.return_value = cpu
+    hardware.gpu.devices = list(range(len(gpus)))
+    hardware.gpu.get_device_powers.return_value = list(gpus)
+    hardware.ram.get_power.return_value = ram
+    hardware.rapl = None
+    return hardware
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+class NVMLError(Exception):
+    pass
+
+class FakeNVML:
+    """Stand-in for the pynvml module that simulates GPUs on machines without one.
+
+    ``powers`` holds the draw of each device in watts and ``processes`` maps a
+    device index to the PIDs running on it. Pass an instance as ``GPU(nvml=...)``.
+    """
+
+    NVMLError = NVMLError
+
+    def __init__(self, powers=(), processes=None):
+        self.powers = list(powers)
+        self.processes = processes or {}
+        self.initialized = False
+        self.init_calls = 0
+        self.power_reads = 0
+
+    def nvmlInit(self):
+        self.init_calls += 1
+        self.initialized = True
+
+    def nvmlShutdown(self):
+        self.initialized = False
+
+    def _check(self):
+        if not self.initialized:
+            raise NVMLError("NVML not initialized")
+
+    def nvmlDeviceGetCount(self):
+        self._check()
+        return len(self.powers)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        self._check()
+        if not 0 <= index < len(self.powers):
+            raise NVMLError(f"Invalid device index {index}")
+        return SimpleNamespace(index=index)
+
+    def nvmlDeviceGetPowerUsage(self, handle):
+        self._check()
+        self.power_reads += 1
+        return int(self.powers[handle.index] * 1000)  # milliwatts, like NVML
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle):
+        self._check()
+        return [SimpleNamespace(pid=pid, usedGpuMemory=None) for pid in self.processes.get(handle.index, [])]
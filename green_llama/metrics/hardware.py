@@ -1,42 +1,123 @@
+import time
+
 import psutil
 import pynvml
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-@dataclass
+@dataclass(frozen=True)
 class EnergyConsumption:
     cpu: float = 0.0
     gpu: float = 0.0
     ram: float = 0.0
     total: float = 0.0
+    gpu_devices: dict = field(default_factory=dict)  # device index -> J
+    processes: dict = field(default_factory=dict)    # pid -> ProcessEnergy, with process attribution
+    idle: float = 0.0                                 # J the machine draws idle over the same time
+    sampler_cpu: float = 0.0                          # s of CPU the power sampler thread used meanwhile
+
+    @property
+    def net(self):
+        """Energy above the idle baseline, the total when there is none"""
+        return max(self.total - self.idle, 0.0)
 
 class CPU:
     def __init__(self):
         self._cpu_power = 0.0
-        
-    def get_power(self):
-        # Get CPU utilization using psutil
-        cpu_percent = psutil.cpu_percent(interval=1)
+        self.cpu_count = psutil.cpu_count()
+        # Each instance keeps its own cpu_times baseline: psutil.cpu_percent(None)
+        # shares one across the process, so concurrent trackers would shorten
+        # each other's measurement windows
+        self._times = psutil.cpu_times()
+
+    @staticmethod
+    def _utilization(before, after):
+        """Percent of CPU time spent busy between two psutil.cpu_times() readings"""
+        def idle(times):
+            return times.idle + getattr(times, "iowait", 0.0)
+        total = sum(after) - sum(before)
+        if total <= 0:
+            return None
+        busy = total - (idle(after) - idle(before))
+        return min(max(busy / total * 100, 0.0), 100.0)
+
+    def get_power(self, interval=1):
+        # Get CPU utilization from cpu_times deltas; interval=None compares against
+        # this instance's previous call instead of blocking, which is what the sampler uses
+        if interval:
+            self._times = psutil.cpu_times()
+            time.sleep(interval)
+        times = psutil.cpu_times()
+        cpu_percent = self._utilization(self._times, times)
+        self._times = times
+        if cpu_percent is None:
+            # No time elapsed since the last read; keep the previous estimate
+            return self._cpu_power
         # Assume 8W TDP per CPU core (adjust based on actual CPU)
-        self._cpu_power = cpu_percent * psutil.cpu_count() * 8 / 100
+        self._cpu_power = cpu_percent * self.cpu_count * 8 / 100
         return self._cpu_power
 
 class GPU:
-    def __init__(self):
+    def __init__(self, nvml=None):
+        # nvml defaults to pynvml; tests pass a FakeNVML to simulate devices
+        self.nvml = nvml or pynvml
         self._gpu_power = 0.0
+        self.handles = {}
         try:
-            pynvml.nvmlInit()
-            self.handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-            self.has_gpu = True
+            self.nvml.nvmlInit()
+            self._initialized = True
         except:
-            self.has_gpu = False
+            self._initialized = False
+        if self._initialized:
+            try:
+                for index in range(self.nvml.nvmlDeviceGetCount()):
+                    self.handles[index] = self.nvml.nvmlDeviceGetHandleByIndex(index)
+            except:
+                pass
+        self.has_gpu = bool(self.handles)
+        self.handle = self.handles.get(0)
 
-    def get_power(self):
+    @property
+    def devices(self):
+        return list(self.handles)
+
+    def get_device_powers(self, devices=None):
+        """Read the power draw (W) of every device, or only the given indices, in one pass"""
+        powers = []
+        for index in self.handles if devices is None else devices:
+            try:
+                powers.append(self.nvml.nvmlDeviceGetPowerUsage(self.handles[index]) / 1000.0)  # Convert to watts
+            except:
+                powers.append(0.0)
+        return powers
+
+    def get_power(self, devices=None):
         if not self.has_gpu:
             return 0.0
+        self._gpu_power = sum(self.get_device_powers(devices))
+        return self._gpu_power
+
+    def devices_for_pids(self, pids):
+        """Return the indices of devices running any of the given processes"""
+        pids = set(pids)
+        used = []
+        for index, handle in self.handles.items():
+            try:
+                processes = self.nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+            except:
+                continue
+            if any(process.pid in pids for process in processes):
+                used.append(index)
+        return used
+
+    def shutdown(self):
+        if not self._initialized:
+            return
         try:
-            return pynvml.nvmlDeviceGetPowerUsage(self.handle) / 1000.0  # Convert to watts
+            self.nvml.nvmlShutdown()
         except:
-            return 0.0
+            pass
+        self._initialized = False
+        self.has_gpu = False
 
 class RAM:
     def __init__(self):
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+
+CO2_SIGNAL_URL = "https://api.co2signal.com/v1/latest"
+DEFAULT_TTL = 900  # s a fetched intensity is served before it is refreshed
+DEFAULT_RETRY = 60  # s to wait after a failed fetch before trying again
+
+def cache_path():
+    root = os.environ.get("GREEN_LLAMA_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "green_llama")
+    return os.path.join(root, "carbon_intensity.json")
+
+def co2_signal_fetcher(token, url=CO2_SIGNAL_URL, timeout=5):
+    """fetch(country_iso_code) against the CO2 Signal API, or anything serving its response at url"""
+    def fetch(country_iso_code):
+        import requests
+
+        response = requests.get(url, params={"countryCode": country_iso_code},
+                                headers={"auth-token": token}, timeout=timeout)
+        response.raise_for_status()
+        return float(response.json()["data"]["carbonIntensity"])
+    return fetch
+
+class IntensityProvider:
+    """Grid carbon intensity (gCO2/kWh) per country that never blocks its callers.
+
+    get() only returns what is already known: a value fresher than ttl, or
+    else the last known value while a background thread fetches a new one.
+    Fetched values are persisted, so offline runs start from the last value
+    seen, and a country whose fetch failed is not retried for retry seconds.
+    fetch(country_iso_code) returns the intensity; pass a stub for tests or
+    another data source.
+    """
+
+    def __init__(self, fetch, ttl=DEFAULT_TTL, path=None, retry=DEFAULT_RETRY):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.retry = retry
+        self.path = path or cache_path()
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._refreshing = {}
+        self._failed_at = {}
+        self._values = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return {country: (entry["value"], entry["fetched_at"]) for country, entry in json.load(file).items()}
+        except (OSError, KeyError, TypeError, ValueError):
+            return {}
+
+    def _save(self):
+        # Writers take turns so the newest copy lands last, while get() only
+        # waits for the copy, never for the disk
+        with self._save_lock:
+            with self._lock:
+                values = dict(self._values)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({country: {"value": value, "fetched_at": fetched_at}
+                           for country, (value, fetched_at) in values.items()}, file, indent=2)
+            os.replace(temp_path, self.path)
+
+    def get(self, country_iso_code):
+        """Latest known intensity, None before the first fetch succeeds"""
+        with self._lock:
+            known = self._values.get(country_iso_code)
+            now = time.time()
+            if ((known is None or now - known[1] > self.ttl)
+                    and now - self._failed_at.get(country_iso_code, -self.retry) >= self.retry):
+                self._refresh_in_background(country_iso_code)
+        return known[0] if known else None
+
+    def _refresh_in_background(self, country_iso_code):
+        # Called with the lock held, one refresh per country at a time
+        thread = self._refreshing.get(country_iso_code)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=self.refresh, args=(country_iso_code,),
+                                  name="green-llama-intensity", daemon=True)
+        self._refreshing[country_iso_code] = thread
+        thread.start()
+
+    def refresh(self, country_iso_code):
+        """Fetch and persist a country's intensity now, returning it or None on failure"""
+        try:
+            value = float(self.fetch(country_iso_code))
+        except Exception as error:
+            # Keep serving the last known value, a stale get() retries once retry has passed
+            with self._lock:
+                self._failed_at[country_iso_code] = time.time()
+                self.last_error = error
+            return None
+        with self._lock:
+            self._values[country_iso_code] = (value, time.time())
+            self._failed_at.pop(country_iso_code, None)
+            self.last_error = None
+        try:
+            self._save()
+        except OSError as error:
+            self.last_error = error
+        return value
+
+    def wait(self, timeout=None):
+        """Wait for the background refreshes in flight"""
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(timeout)
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_intensity_provider():
+    """The provider shared by every EmissionsTracker: the one set with
+    set_intensity_provider(), else CO2 Signal when CO2_SIGNAL_API_TOKEN is
+    set, else None for the static per-country table only."""
+    global _provider
+    if _provider is None:
+        token = os.environ.get("CO2_SIGNAL_API_TOKEN")
+        if token:
+            with _provider_lock:
+                if _provider is None:
+                    _provider = IntensityProvider(co2_signal_fetcher(token))
+    return _provider
+
+def set_intensity_provider(provider):
+    """Replace the shared provider, None to go back to the environment's default"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
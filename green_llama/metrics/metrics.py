@@ -1,113 +1,241 @@
-
 import time
-import ollama
+import functools
+import numpy as np
+from . import exporter
+from ..backends import get_backend
+from .baseline import current_baseline
 from .energy_tracker import EnergyTracker
 from .emissions import EmissionsTracker
+from .overhead import RequestOverhead
+
+def _measure(func, *args, **kwargs):
+    """Run func inside one tracker session and return (result, energy, elapsed_time)"""
+    return _measure_profiled(RequestOverhead(), func, *args, **kwargs)
+
+def _measure_profiled(overhead, func, *args, **kwargs):
+    """_measure, timing its measurement phases with a RequestOverhead"""
+    with overhead.phase("tracker setup"):
+        energy_tracker = EnergyTracker(baseline=current_baseline())
+    start_time = time.perf_counter()
+    with overhead.phase("tracker start"):
+        energy_tracker.start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        with overhead.phase("tracker stop"):
+            energy = energy_tracker.stop()
+    end_time = time.perf_counter()
+    return result, energy, end_time - start_time
+
+TOKEN_METRICS = [
+    "Prompt Tokens",
+    "Generated Tokens",
+    "Tokens/s",
+    "Energy per Token (J/token)",
+    "gCO2 per 1k Tokens",
+    "Load Time (s)",
+    "Generation Time (s)",
+]
+
+def token_metrics(response, total_energy, emissions):
+    """Per-token metrics from the counters Ollama returns with a finished response.
+
+    Energy and emissions are normalized by generated tokens. Returns an empty
+    dict when the response carries no counters.
+    """
+    if not hasattr(response, "get") or response.get("eval_count") is None:
+        return {}
+    prompt_tokens = response.get("prompt_eval_count") or 0
+    generated_tokens = response.get("eval_count") or 0
+    # Ollama reports durations in nanoseconds
+    eval_time = (response.get("eval_duration") or 0) / 1e9
+    prompt_eval_time = (response.get("prompt_eval_duration") or 0) / 1e9
+    return {
+        "Prompt Tokens": prompt_tokens,
+        "Generated Tokens": generated_tokens,
+        "Tokens/s": generated_tokens / eval_time if eval_time > 0 else 0.0,
+        "Energy per Token (J/token)": total_energy / generated_tokens if generated_tokens else 0.0,
+        "gCO2 per 1k Tokens": emissions * 1000 / generated_tokens if generated_tokens else 0.0,
+        "Load Time (s)": (response.get("load_duration") or 0) / 1e9,
+        "Generation Time (s)": prompt_eval_time + eval_time,
+    }
 
 def measure_cpu_energy(func):
     """Decorator: Measure CPU energy consumption"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        return result, energy_tracker.stop().cpu, end_time - start_time
+        result, energy, elapsed_time = _measure(func, *args, **kwargs)
+        return result, energy.cpu, elapsed_time
     return wrapper
 
 def measure_gpu_energy(func):
     """Decorator: Measure GPU energy consumption"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        return result, energy_tracker.stop().gpu, end_time - start_time
+        result, energy, elapsed_time = _measure(func, *args, **kwargs)
+        return result, energy.gpu, elapsed_time
     return wrapper
 
 def measure_ram_energy(func):
     """Decorator: Measure RAM energy consumption"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        return result, energy_tracker.stop().ram, end_time - start_time
+        result, energy, elapsed_time = _measure(func, *args, **kwargs)
+        return result, energy.ram, elapsed_time
     return wrapper
 
 def measure_total_energy(func):
     """Decorator: Measure total energy consumption"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        return result, energy_tracker.stop().total, end_time - start_time
+        result, energy, elapsed_time = _measure(func, *args, **kwargs)
+        return result, energy.total, elapsed_time
     return wrapper
 
 def measure_emissions(func):
     """Decorator: Measure carbon emissions"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
         emissions_tracker = EmissionsTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        energy = energy_tracker.stop()
+        result, energy, elapsed_time = _measure(func, *args, **kwargs)
         emissions = emissions_tracker.compute_emissions(energy.total)
-        return result, emissions.emissions, end_time - start_time
+        return result, emissions.emissions, elapsed_time
     return wrapper
 
+BASELINE_METRICS = ["Idle Energy (J)", "Net Energy (J)"]
+
+def all_metrics(response, energy, emissions, elapsed_time):
+    """Metrics dict for one response given its EnergyConsumption and CarbonEmissions"""
+    metrics = {
+        "CPU Energy (J)": energy.cpu,
+        "GPU Energy (J)": energy.gpu,
+        "RAM Energy (J)": energy.ram,
+        "Total Energy (J)": energy.total,
+        "Idle Energy (J)": energy.idle,
+        "Net Energy (J)": energy.net,
+        "Carbon Emissions (gCO2)": emissions.emissions,
+        "elapsed_time": elapsed_time
+    }
+    if len(energy.gpu_devices) > 1:
+        for index, joules in energy.gpu_devices.items():
+            metrics[f"GPU {index} Energy (J)"] = joules
+    metrics.update(token_metrics(response, energy.total, emissions.emissions))
+    return metrics
+
 def measure_all_metrics(func):
     """Decorator: Measure all metrics (CPU, GPU, RAM energy, total energy, and carbon emissions)"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        energy_tracker = EnergyTracker()
+        overhead = RequestOverhead()
         emissions_tracker = EmissionsTracker()
-        with energy_tracker:
-            result = func(*args, **kwargs)
-        end_time = time.time()
-        energy = energy_tracker.stop()
-        emissions = emissions_tracker.compute_emissions(energy.total)
-        return result, {
-            "CPU Energy (J)": energy.cpu,
-            "GPU Energy (J)": energy.gpu,
-            "RAM Energy (J)": energy.ram,
-            "Total Energy (J)": energy.total,
-            "Carbon Emissions (gCO2)": emissions.emissions,
-            "elapsed_time": end_time - start_time
-        }
+        result, energy, elapsed_time = _measure_profiled(overhead, func, *args, **kwargs)
+        with overhead.phase("metrics"):
+            emissions = emissions_tracker.compute_emissions(energy.total)
+            metrics = all_metrics(result, energy, emissions, elapsed_time)
+        metrics.update(overhead.metrics(energy, elapsed_time))
+        # Measured functions take the model first, like test_all
+        exporter.observe(metrics, kwargs.get("model", args[0] if args else ""))
+        return result, metrics
     return wrapper
 
+def chat(model: str, prompt: str, keep_alive=None):
+    """Unmeasured chat call, for callers that track energy themselves"""
+    return get_backend().chat(model, [{"role": "user", "content": prompt}], keep_alive=keep_alive)
+
 @measure_all_metrics
 def test_all(model: str, prompt: str):
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return chat(model, prompt)
+
+STREAMING_METRICS = [
+    "Time to First Token (s)",
+    "Inter-token Latency p50 (s)",
+    "Inter-token Latency p95 (s)",
+    "Inter-token Latency p99 (s)",
+    "Decode Throughput (tokens/s)",
+    "Prefill Energy (J)",
+    "Decode Energy (J)",
+]
+
+def stream_all(model: str, prompt: str, on_token=None):
+    """Stream a chat response, passing each chunk of text to on_token as it arrives.
+
+    Returns the final response with the full message content and the metrics of
+    test_all plus latency components. Energy is split into prefill and decode at
+    the first token using a tracker snapshot.
+    """
+    overhead = RequestOverhead()
+    with overhead.phase("tracker setup"):
+        energy_tracker = EnergyTracker(baseline=current_baseline())
+        emissions_tracker = EmissionsTracker()
+    chunks = []
+    token_times = []
+    first_token_energy = None
+    response = None
+    start_time = time.perf_counter()
+    with overhead.phase("tracker start"):
+        energy_tracker.start()
+    try:
+        for response in get_backend().chat(model, [{"role": "user", "content": prompt}], stream=True):
+            content = response["message"]["content"]
+            if not content:
+                continue
+            token_times.append(time.perf_counter())
+            if first_token_energy is None:
+                with overhead.phase("snapshot"):
+                    first_token_energy = energy_tracker.snapshot().total
+            chunks.append(content)
+            if on_token:
+                on_token(content)
+        with overhead.phase("snapshot"):
+            end_energy = energy_tracker.snapshot().total
+    finally:
+        with overhead.phase("tracker stop"):
+            energy = energy_tracker.stop()
+    end_time = time.perf_counter()
+    if response is not None:
+        response["message"]["content"] = "".join(chunks)
+
+    with overhead.phase("metrics"):
+        emissions = emissions_tracker.compute_emissions(energy.total)
+        # Ollama streams one token per chunk
+        latencies = np.diff(token_times)
+        decode_time = token_times[-1] - token_times[0] if len(token_times) > 1 else 0.0
+        prefill_share = first_token_energy / end_energy if first_token_energy is not None and end_energy > 0 else 1.0
+        metrics = all_metrics(response, energy, emissions, end_time - start_time)
+        metrics.update({
+            "Time to First Token (s)": token_times[0] - start_time if token_times else end_time - start_time,
+            "Inter-token Latency p50 (s)": float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+            "Inter-token Latency p95 (s)": float(np.percentile(latencies, 95)) if latencies.size else 0.0,
+            "Inter-token Latency p99 (s)": float(np.percentile(latencies, 99)) if latencies.size else 0.0,
+            "Decode Throughput (tokens/s)": latencies.size / decode_time if decode_time > 0 else 0.0,
+            "Prefill Energy (J)": energy.total * prefill_share,
+            "Decode Energy (J)": energy.total * (1 - prefill_share),
+        })
+    metrics.update(overhead.metrics(energy, end_time - start_time))
+    exporter.observe(metrics, model)
+    return response, metrics
 
 @measure_cpu_energy
 def test_cpu(model: str, prompt: str):
     """Test function for CPU energy measurement"""
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return chat(model, prompt)
 
 @measure_gpu_energy
 def test_gpu(model: str, prompt: str):
     """Test function for GPU energy measurement"""
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return chat(model, prompt)
 
 @measure_ram_energy
 def test_ram(model: str, prompt: str):
     """Test function for RAM energy measurement"""
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return chat(model, prompt)
 
 @measure_total_energy
 def test_total_energy(model: str, prompt: str):
     """Test function for total energy measurement"""
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    return chat(model, prompt)
 
 @measure_emissions
 def test_emissions(model: str, prompt: str):
     """Test function for carbon emissions measurement"""
-    return ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
\ No newline at end of file
+    return chat(model, prompt)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import contextlib
+import threading
+import time
+
+OVERHEAD_METRICS = ["Instrumentation Time (s)", "Instrumentation CPU Time (s)", "Overhead (%)"]
+
+# Share of a request's time green_llama may spend measuring it, pinned by the overhead tests
+OVERHEAD_BUDGET = 5.0  # %
+
+class OverheadProfile:
+    """Wall and CPU time of each measurement phase, summed over a whole run.
+
+    Phases are the steps on a request's path that only exist to measure it,
+    such as setting up a tracker, starting and stopping it and computing the
+    metrics. The CPU time of the background power sampler is counted by the
+    sampler itself and reported with each EnergyConsumption.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}  # name -> [count, wall ns, cpu ns]
+
+    def add(self, name, wall_ns, cpu_ns):
+        with self._lock:
+            phase = self._phases.setdefault(name, [0, 0, 0])
+            phase[0] += 1
+            phase[1] += wall_ns
+            phase[2] += cpu_ns
+
+    def report(self):
+        """{phase: {"count", "wall_s", "cpu_s", "mean_us"}}, slowest phase first"""
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            name: {"count": count, "wall_s": wall_ns / 1e9, "cpu_s": cpu_ns / 1e9, "mean_us": wall_ns / count / 1e3}
+            for name, (count, wall_ns, cpu_ns) in phases
+        }
+
+class RequestOverhead:
+    """Times the measurement phases of one request.
+
+    Does nothing unless profiling is enabled, so it can stay on every
+    request path.
+    """
+
+    def __init__(self):
+        self.profile = _profile
+        self.wall_ns = 0
+        self.cpu_ns = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.profile is None:
+            yield
+            return
+        wall_start, cpu_start = time.perf_counter_ns(), time.thread_time_ns()
+        try:
+            yield
+        finally:
+            wall_ns, cpu_ns = time.perf_counter_ns() - wall_start, time.thread_time_ns() - cpu_start
+            self.wall_ns += wall_ns
+            self.cpu_ns += cpu_ns
+            self.profile.add(name, wall_ns, cpu_ns)
+
+    def metrics(self, energy, elapsed_time):
+        """Overhead metrics of the request, empty unless profiling is enabled.
+
+        The overhead is the time the measurement phases added to the request
+        plus the sampler CPU time charged to it, as a share of its elapsed time.
+        """
+        if self.profile is None:
+            return {}
+        instrumentation_time = self.wall_ns / 1e9
+        cpu_time = self.cpu_ns / 1e9 + energy.sampler_cpu
+        return {
+            "Instrumentation Time (s)": instrumentation_time,
+            "Instrumentation CPU Time (s)": cpu_time,
+            "Overhead (%)": (instrumentation_time + energy.sampler_cpu) * 100 / elapsed_time
+            if elapsed_time > 0 else 0.0,
+        }
+
+_profile = None
+
+def enable_profiling():
+    """Start profiling the measurement phases of every request from now on and return the profile"""
+    global _profile
+    _profile = OverheadProfile()
+    return _profile
+
+def disable_profiling():
+    global _profile
+    _profile = None
+
+def get_profile():
+    """The running OverheadProfile, None while profiling is off"""
+    return _profile
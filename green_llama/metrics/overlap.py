@@ -0,0 +1,66 @@
+import threading
+from dataclasses import replace
+from .hardware import EnergyConsumption
+
+class OverlapAttributor:
+    """Splits the energy of one running EnergyTracker across overlapping requests.
+
+    Every begin() and end() takes a tracker snapshot; the energy between two
+    consecutive events is shared equally by the requests active in that span.
+    Energy spent while no request is active is not charged to any of them.
+    Snapshots extrapolate the latest power reading, so one can come in below
+    its predecessor; such a step is charged as zero and only growth past the
+    highest snapshot seen is shared out.
+    """
+
+    COMPONENTS = ("cpu", "gpu", "ram", "total", "idle", "sampler_cpu")
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self._lock = threading.Lock()
+        self._active = set()
+        self._last = None
+        self._shares = {}
+
+    def _advance(self):
+        snapshot = self.tracker.snapshot()
+        last = self._last
+        if last is not None:
+            snapshot = replace(
+                snapshot,
+                gpu_devices={index: max(joules, last.gpu_devices.get(index, 0.0))
+                             for index, joules in snapshot.gpu_devices.items()},
+                **{component: max(getattr(snapshot, component), getattr(last, component))
+                   for component in self.COMPONENTS},
+            )
+        if last is not None and self._active:
+            count = len(self._active)
+            gpu_devices = {
+                index: (joules - last.gpu_devices.get(index, 0.0)) / count
+                for index, joules in snapshot.gpu_devices.items()
+            }
+            for key in self._active:
+                share = self._shares[key]
+                for component in self.COMPONENTS:
+                    share[component] += (getattr(snapshot, component) - getattr(last, component)) / count
+                for index, joules in gpu_devices.items():
+                    share["gpu_devices"][index] = share["gpu_devices"].get(index, 0.0) + joules
+        self._last = snapshot
+
+    @property
+    def active(self):
+        return len(self._active)
+
+    def begin(self, key):
+        with self._lock:
+            self._advance()
+            self._active.add(key)
+            self._shares[key] = dict.fromkeys(self.COMPONENTS, 0.0)
+            self._shares[key]["gpu_devices"] = {}
+
+    def end(self, key):
+        """Finish a request and return the EnergyConsumption charged to it"""
+        with self._lock:
+            self._advance()
+            self._active.discard(key)
+            return EnergyConsumption(**self._shares.pop(key))
@@ -0,0 +1,100 @@
+import os
+import psutil
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class ProcessEnergy:
+    pid: int
+    name: str
+    cpu_time: float = 0.0  # s used during the session
+    rss: float = 0.0       # bytes, mean of start and stop
+    cpu: float = 0.0       # J
+    ram: float = 0.0       # J
+
+def find_ollama_processes(name="ollama"):
+    """Return the ollama server and runner processes, including their children"""
+    found = {}
+    for process in psutil.process_iter(["name", "cmdline"]):
+        try:
+            cmdline = process.info["cmdline"] or [""]
+            names = ((process.info["name"] or "").lower(), os.path.basename(cmdline[0]).lower())
+            if not any(name in candidate for candidate in names):
+                continue
+            found[process.pid] = process
+            for child in process.children(recursive=True):
+                found[child.pid] = child
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return list(found.values())
+
+def find_ollama_pids(name="ollama"):
+    return [process.pid for process in find_ollama_processes(name)]
+
+def _system_busy_time():
+    times = psutil.cpu_times()
+    return sum(times) - times.idle - getattr(times, "iowait", 0.0)
+
+class ProcessAttribution:
+    """Apportions measured CPU and RAM energy to a set of processes.
+
+    CPU energy is split by each process's share of the system busy CPU time and
+    RAM energy by its share of used memory, both read through cheap psutil
+    counters at start and stop. Defaults to the Ollama server and runners;
+    children spawned during the session, such as a model runner, are picked up
+    at stop and charged for all their CPU time.
+    """
+
+    def __init__(self, find_processes=find_ollama_processes):
+        self.find_processes = find_processes
+        self._processes = {}
+        self._start = {}
+        self._start_busy = 0.0
+
+    def _read(self, process):
+        with process.oneshot():
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss, process.name()
+
+    def start(self):
+        self._processes = {process.pid: process for process in self.find_processes()}
+        self._start = {}
+        for pid, process in list(self._processes.items()):
+            try:
+                self._start[pid] = self._read(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                del self._processes[pid]
+        self._start_busy = _system_busy_time()
+
+    def _refresh(self):
+        for process in list(self._processes.values()):
+            try:
+                for child in process.children(recursive=True):
+                    self._processes.setdefault(child.pid, child)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+    def stop(self, cpu_energy, ram_energy):
+        """Return a ProcessEnergy per process given the system CPU and RAM energy (J)"""
+        busy = _system_busy_time() - self._start_busy
+        self._refresh()
+        readings = {}
+        for pid, process in self._processes.items():
+            try:
+                readings[pid] = self._read(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        used_memory = psutil.virtual_memory().used
+        breakdown = {}
+        for pid, (cpu_time, rss, name) in readings.items():
+            start_time, start_rss, _ = self._start.get(pid, (0.0, rss, name))
+            cpu_time = max(cpu_time - start_time, 0.0)
+            rss = (start_rss + rss) / 2
+            breakdown[pid] = ProcessEnergy(
+                pid=pid,
+                name=name,
+                cpu_time=cpu_time,
+                rss=rss,
+                cpu=cpu_energy * min(cpu_time / busy, 1.0) if busy > 0 else 0.0,
+                ram=ram_energy * min(rss / used_memory, 1.0) if used_memory else 0.0,
+            )
+        return breakdown
@@ -0,0 +1,87 @@
+import glob
+import os
+
+POWERCAP_ROOT = "/sys/class/powercap"
+
+class RaplDomain:
+    """One powercap RAPL zone exposing a cumulative energy counter in microjoules"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = _read_file(os.path.join(path, "name"))
+        try:
+            self.max_energy = int(_read_file(os.path.join(path, "max_energy_range_uj")))
+        except (OSError, ValueError):
+            self.max_energy = 2 ** 32
+
+    def read(self):
+        with open(os.path.join(self.path, "energy_uj")) as file:
+            return int(file.read())
+
+    def delta(self, start, end):
+        """Joules between two counter readings, allowing for one wraparound"""
+        if end < start:
+            end += self.max_energy
+        return (end - start) / 1e6
+
+class RaplCounters:
+    """CPU package and DRAM energy counters from /sys/class/powercap/intel-rapl:*.
+
+    The intel-rapl-mmio zones report the same package energy again, so they
+    are skipped.
+
+    Reading every counter takes microseconds, so the tracker reads them at start
+    and stop instead of sampling power. Use discover() to get None when RAPL is
+    missing or unreadable and the power heuristics have to be used instead.
+    """
+
+    def __init__(self, root=POWERCAP_ROOT):
+        self.root = root
+        self.domains = {"cpu": [], "ram": []}
+        paths = glob.glob(os.path.join(root, "intel-rapl:*")) + glob.glob(os.path.join(root, "intel-rapl:*", "intel-rapl:*"))
+        for path in sorted(set(os.path.realpath(path) for path in paths)):
+            try:
+                domain = RaplDomain(path)
+            except OSError:
+                continue
+            if domain.name.startswith("package"):
+                self.domains["cpu"].append(domain)
+            elif domain.name == "dram":
+                self.domains["ram"].append(domain)
+
+    @property
+    def components(self):
+        return tuple(component for component, domains in self.domains.items() if domains)
+
+    @classmethod
+    def discover(cls, root=POWERCAP_ROOT):
+        counters = cls(root)
+        if "cpu" not in counters.components:
+            return None
+        try:
+            counters.read()
+        except (OSError, ValueError):
+            # energy_uj is root-only on most kernels since 5.10
+            return None
+        return counters
+
+    def read(self):
+        """Raw counter values for every domain of every component"""
+        return {
+            component: [domain.read() for domain in domains]
+            for component, domains in self.domains.items() if domains
+        }
+
+    def energy(self, start, end):
+        """Joules per component between two read() results"""
+        return {
+            component: sum(
+                domain.delta(first, last)
+                for domain, first, last in zip(self.domains[component], start[component], end[component])
+            )
+            for component in start
+        }
+
+def _read_file(path):
+    with open(path) as file:
+        return file.read().strip()
@@ -0,0 +1,43 @@
+import atexit
+import threading
+from .hardware import CPU, GPU, RAM
+from .rapl import POWERCAP_ROOT, RaplCounters
+
+class HardwareRegistry:
+    """Hardware probes shared by every EnergyTracker in the process.
+
+    The probes are built once, so NVML is initialized a single time and static
+    facts such as core count, total RAM, device handles and the RAPL counters
+    (None when unavailable) are cached.
+    """
+
+    def __init__(self, nvml=None, powercap_root=POWERCAP_ROOT):
+        self.cpu = CPU()
+        self.gpu = GPU(nvml)
+        self.ram = RAM()
+        self.rapl = RaplCounters.discover(powercap_root)
+
+    def shutdown(self):
+        self.gpu.shutdown()
+
+_registry = None
+_lock = threading.Lock()
+
+def get_hardware():
+    """Return the process-wide HardwareRegistry, creating it on first use"""
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = HardwareRegistry()
+                atexit.register(_registry.shutdown)
+    return _registry
+
+def reset_hardware():
+    """Shut down the shared probes so the next get_hardware() builds new ones"""
+    global _registry
+    with _lock:
+        if _registry is not None:
+            atexit.unregister(_registry.shutdown)
+            _registry.shutdown()
+            _registry = None
@@ -0,0 +1,121 @@
+import threading
+import time
+import numpy as np
+
+
+class PowerSampler:
+    """Background thread that polls power readings (W) and integrates them into energy (J).
+
+    ``read`` must return one power value per channel. Samples are kept in a
+    preallocated ring buffer of ``capacity`` rows laid out as ``[time, *channels]``,
+    while energy is accumulated incrementally with the trapezoid rule so nothing
+    is lost when the buffer wraps around. ``on_sample(channels, power)`` is
+    called with every reading and ``on_stop(channels)`` once the session
+    stops; neither may block. The sampling thread's own
+    CPU time is counted too, see ``cpu_time()``.
+    """
+
+    def __init__(self, read, channels, interval=0.1, capacity=4096, on_sample=None, on_stop=None):
+        self.read = read
+        self.on_sample = on_sample
+        self.on_stop = on_stop
+        self.channels = tuple(channels)
+        self.interval = interval
+        self.capacity = capacity
+        self._buffer = np.zeros((capacity, len(self.channels) + 1))
+        self._count = 0
+        self._energy = np.zeros(len(self.channels))
+        self._last_time = None
+        self._last_power = np.zeros(len(self.channels))
+        self._cpu_ns = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Every session gets its own event so a thread left over from a previous
+        # session exits on its own instead of being joined.
+        self._stop_event = threading.Event()
+        if not self.channels:
+            return
+        power = self.read()
+        with self._lock:
+            self._count = 0
+            self._energy[:] = 0.0
+            self._cpu_ns = 0
+            self._last_time = None
+            self._record(time.perf_counter(), power)
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop_event,), name="green-llama-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, stop_event):
+        cpu_start = time.thread_time_ns()
+        while not stop_event.wait(self.interval):
+            power = self.read()
+            now = time.perf_counter()
+            with self._lock:
+                if stop_event.is_set():
+                    break
+                self._record(now, power)
+                self._cpu_ns = time.thread_time_ns() - cpu_start
+
+    def _record(self, now, power):
+        power = np.asarray(power, dtype=float)
+        if self._last_time is not None:
+            self._energy += (self._last_power + power) * 0.5 * (now - self._last_time)
+        row = self._buffer[self._count % self.capacity]
+        row[0] = now
+        row[1:] = power
+        self._count += 1
+        self._last_time = now
+        self._last_power = power
+        if self.on_sample:
+            self.on_sample(self.channels, power)
+
+    def _energy_at(self, now):
+        if self._last_time is None:
+            return dict.fromkeys(self.channels, 0.0)
+        # Hold the latest reading from the last sample up to ``now``; the estimate
+        # is not kept, the next sample integrates that span exactly.
+        energy = self._energy + self._last_power * max(now - self._last_time, 0.0)
+        return dict(zip(self.channels, energy.tolist()))
+
+    def energy(self):
+        """Energy per channel (J) accumulated so far, without stopping the sampler."""
+        now = time.perf_counter()
+        with self._lock:
+            return self._energy_at(now)
+
+    def cpu_time(self):
+        """CPU time (s) the sampling thread has used this session"""
+        return self._cpu_ns / 1e9
+
+    def stop(self):
+        """Signal the sampling thread to exit and return the energy per channel (J).
+
+        Never joins the thread, so it returns immediately. Only a session shorter
+        than one interval, which has nothing but its start sample, takes a final
+        non-blocking reading so windowed probes such as CPU utilization count.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self._stop_event.set()
+            if self._count == 1:
+                self._record(now, self.read())
+            if self.on_stop and self.channels:
+                self.on_stop(self.channels)
+            return self._energy_at(now)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def samples(self):
+        """Return the buffered samples, oldest first, as rows of ``[time, *channels]``."""
+        with self._lock:
+            if self._count <= self.capacity:
+                return self._buffer[:self._count].copy()
+            start = self._count % self.capacity
+            return np.concatenate((self._buffer[start:], self._buffer[:start]))
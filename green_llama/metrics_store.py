@@ -0,0 +1,295 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+STORE_DIR = "metrics_store"
+FORMAT_VERSION = 1
+
+# Columns every record has, the metrics follow as one float64 column each
+KEY_COLUMNS = {
+    "run_id": "U",
+    "model": "U",
+    "benchmark": "U",
+    "prompt_hash": "S16",
+    "timestamp": "<f8",
+    "elapsed_time": "<f8",
+}
+
+CSV_HEADER = ["Metric Name", "Prompt", "Value", "Elapsed Time"]
+
+def store_dir():
+    return os.environ.get("GREEN_LLAMA_STORE") or STORE_DIR
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+def new_run_id(model, label):
+    safe_model = "".join(char if char.isalnum() or char in "._-" else "_" for char in model)
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_model}-{label}"
+
+def storage_records(metrics_storage):
+    """Regroup a metrics_storage, which is laid out per metric, into one
+    (prompt, elapsed_time, {metric: value}) tuple per prompt run."""
+    records = []
+    runs = {}
+    for metric_name, data in metrics_storage.items():
+        for prompt, value, elapsed_time in zip(data["prompts"], data["values"], data["times"]):
+            # Every run of a prompt has its own elapsed time, a repeated value
+            # for the same key belongs to the next run with that key
+            candidates = runs.setdefault((prompt, elapsed_time), [])
+            metrics = next((metrics for metrics in candidates if metric_name not in metrics), None)
+            if metrics is None:
+                metrics = {}
+                candidates.append(metrics)
+                records.append((prompt, elapsed_time, metrics))
+            metrics[metric_name] = value
+    return records
+
+class Segment:
+    """One immutable batch of records: a directory with a .npy file per column.
+
+    Columns are memory-mapped on first access, so reading the model column of
+    every segment doesn't touch the metric values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "segment.json"), encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def metrics(self):
+        return list(self.meta["metrics"])
+
+    def column(self, name):
+        """Array of a key or metric column, NaN for a metric this segment doesn't have"""
+        if name not in self._columns:
+            if name in KEY_COLUMNS:
+                file_name = f"{name}.npy"
+            elif name in self.meta["metrics"]:
+                file_name = self.meta["metrics"][name]
+            else:
+                return np.full(len(self), np.nan)
+            self._columns[name] = np.load(os.path.join(self.path, file_name), mmap_mode="r")
+        return self._columns[name]
+
+class MetricsStore:
+    """Append-only columnar store of metric records.
+
+    Every append writes one segment under segments/, named so that listing
+    them sorts oldest first. Prompt texts are interned by hash in
+    prompts.jsonl, so records only carry the 16-character prompt hash.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or store_dir()
+        self.segments_dir = os.path.join(self.root, "segments")
+        self.prompts_path = os.path.join(self.root, "prompts.jsonl")
+        self._prompts = None
+        self._segments = {}
+
+    @property
+    def prompts(self):
+        """Prompt text by hash"""
+        if self._prompts is None:
+            self._prompts = {}
+            if os.path.exists(self.prompts_path):
+                with open(self.prompts_path, encoding="utf-8") as file:
+                    for line in file:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        self._prompts[entry["hash"]] = entry["text"]
+        return self._prompts
+
+    def intern(self, prompts):
+        """Add prompts missing from the side table and return their hashes"""
+        hashes = [prompt_hash(prompt) for prompt in prompts]
+        new = {}
+        for prompt, digest in zip(prompts, hashes):
+            if digest not in self.prompts and digest not in new:
+                new[digest] = prompt
+        if new:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.prompts_path, mode="a", encoding="utf-8") as file:
+                for digest, prompt in new.items():
+                    file.write(json.dumps({"hash": digest, "text": prompt}) + "\n")
+            self.prompts.update(new)
+        return hashes
+
+    def append(self, records):
+        """Write a batch of records as one segment and return its path.
+
+        Each record is a dict with run_id, model, benchmark, prompt,
+        elapsed_time, metrics and optionally timestamp.
+        """
+        if not records:
+            return None
+        now = time.time()
+        hashes = self.intern([record["prompt"] for record in records])
+        metric_names = list(dict.fromkeys(name for record in records for name in record["metrics"]))
+
+        os.makedirs(self.segments_dir, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}"
+        temp_path = os.path.join(self.segments_dir, f".{name}.tmp")
+        os.makedirs(temp_path)
+        columns = {
+            "run_id": [record["run_id"] for record in records],
+            "model": [record["model"] for record in records],
+            "benchmark": [record["benchmark"] for record in records],
+            "prompt_hash": [digest.encode("ascii") for digest in hashes],
+            "timestamp": [record.get("timestamp", now) for record in records],
+            "elapsed_time": [record["elapsed_time"] for record in records],
+        }
+        for column, dtype in KEY_COLUMNS.items():
+            np.save(os.path.join(temp_path, f"{column}.npy"), np.array(columns[column], dtype=dtype))
+        metric_files = {}
+        for index, metric_name in enumerate(metric_names):
+            metric_files[metric_name] = f"m{index}.npy"
+            values = [float(record["metrics"].get(metric_name, np.nan)) for record in records]
+            np.save(os.path.join(temp_path, metric_files[metric_name]), np.array(values, dtype="<f8"))
+        meta = {"version": FORMAT_VERSION, "rows": len(records), "metrics": metric_files}
+        with open(os.path.join(temp_path, "segment.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, indent=2)
+        path = os.path.join(self.segments_dir, name)
+        os.replace(temp_path, path)
+        return path
+
+    def append_storage(self, metrics_storage, run_id, model, benchmark):
+        """Append every prompt run of a metrics_storage as one batch"""
+        return self.append([
+            {"run_id": run_id, "model": model, "benchmark": benchmark, "prompt": prompt,
+             "elapsed_time": elapsed_time, "metrics": metrics}
+            for prompt, elapsed_time, metrics in storage_records(metrics_storage)
+        ])
+
+    def segments(self):
+        """Every segment, oldest first"""
+        names = sorted(name for name in os.listdir(self.segments_dir)
+                       if not name.startswith(".")) if os.path.isdir(self.segments_dir) else []
+        segments = []
+        for name in names:
+            if name not in self._segments:
+                try:
+                    self._segments[name] = Segment(os.path.join(self.segments_dir, name))
+                except (OSError, ValueError):
+                    continue
+            segments.append(self._segments[name])
+        return segments
+
+    def metrics(self):
+        return _metric_names(self.segments())
+
+    def read(self, columns=None, segments=None, **filters):
+        """Concatenated columns of the records matching filters such as model="llama3.2:1b".
+
+        Defaults to every key and metric column of every segment.
+        """
+        segments = self.segments() if segments is None else segments
+        columns = columns or [*KEY_COLUMNS, *_metric_names(segments)]
+        parts = {column: [] for column in columns}
+        for segment in segments:
+            mask = np.ones(len(segment), dtype=bool)
+            for column, value in filters.items():
+                mask &= segment.column(column) == value
+            if mask.any():
+                for column in columns:
+                    parts[column].append(np.asarray(segment.column(column))[mask])
+        return {
+            column: np.concatenate(arrays) if arrays
+            else np.array([], dtype=KEY_COLUMNS.get(column, "<f8"))
+            for column, arrays in parts.items()
+        }
+
+    def count(self, **filters):
+        return len(self.read(["timestamp"], **filters)["timestamp"])
+
+    def sums(self, segments=None, **filters):
+        """{metric: [count, sum, sum_of_squares]} of the matching records, in every segment unless given"""
+        segments = self.segments() if segments is None else segments
+        metric_names = _metric_names(segments)
+        if not metric_names:
+            return {}
+        data = self.read(metric_names, segments, **filters)
+        sums = {}
+        for metric_name, values in data.items():
+            values = values[~np.isnan(values)]
+            if values.size:
+                sums[metric_name] = [int(values.size), float(values.sum()), float(np.dot(values, values))]
+        return sums
+
+    def export_csv(self, path, **filters):
+        """Write the matching records in the report viewer's long CSV format, one row per metric value"""
+        metric_names = self.metrics()
+        data = self.read(["prompt_hash", "elapsed_time", *metric_names], **filters)
+        prompts = [self.prompts.get(digest.decode("ascii"), "") for digest in data["prompt_hash"]]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            for metric_name in metric_names:
+                values = data[metric_name]
+                for row in np.flatnonzero(~np.isnan(values)):
+                    writer.writerow([metric_name, prompts[row], float(values[row]), float(data["elapsed_time"][row])])
+        os.replace(temp_path, path)
+        return path
+
+    def import_csv(self, path, run_id, model, benchmark):
+        """Load a log written before the store existed, as a single batch"""
+        metrics_storage = {}
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                try:
+                    value, elapsed_time = float(row["Value"]), float(row["Elapsed Time"])
+                except (TypeError, ValueError):
+                    continue
+                data = metrics_storage.setdefault(row["Metric Name"], {"prompts": [], "values": [], "times": []})
+                data["prompts"].append(row["Prompt"])
+                data["values"].append(value)
+                data["times"].append(elapsed_time)
+        return self.append_storage(metrics_storage, run_id, model, benchmark)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self._prompts = None
+        self._segments = {}
+
+def _metric_names(segments):
+    return list(dict.fromkeys(name for segment in segments for name in segment.metrics))
+
+class BufferedWriter:
+    """Collects records and appends them to a store in batches of batch_size.
+
+    Keyword arguments such as run_id are defaults for every added record.
+    """
+
+    def __init__(self, store, batch_size=64, **defaults):
+        self.store = store
+        self.batch_size = batch_size
+        self.defaults = defaults
+        self._records = []
+
+    def add(self, record):
+        self._records.append({**self.defaults, **record})
+        if len(self._records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        records, self._records = self._records, []
+        return self.store.append(records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
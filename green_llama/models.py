@@ -1,16 +1,64 @@
-import ollama
+import functools
+import re
+from dataclasses import dataclass
+from typing import Optional
 from rich.console import Console
 from rich.prompt import Prompt
+from .backends import get_backend
 
 console = Console()
 
+@dataclass(frozen=True)
+class ModelInfo:
+    parameters: float                  # parameter count
+    quantization: Optional[str] = None
+    context_length: Optional[int] = None
+
+def parse_parameter_size(size):
+    """Parse Ollama's parameter_size such as "1.2B" or "137M" into a count"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMBT]?)\s*", size or "", re.IGNORECASE)
+    if not match:
+        return None
+    scale = {"": 1, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}[match.group(2).upper()]
+    return float(match.group(1)) * scale
+
+def model_info(model):
+    """Parameter count, quantization and context length from the backend's show, cached per model.
+
+    Returns None when the metadata can't be read. A failed show isn't cached,
+    so the next call asks the backend again.
+    """
+    try:
+        return _model_info(get_backend(), model)
+    except Exception:
+        return None
+
+def clear_model_info_cache():
+    """Forget the cached metadata of every model, e.g. after pulling a new version"""
+    _model_info.cache_clear()
+
+@functools.lru_cache(maxsize=None)
+def _model_info(backend, model):
+    show = backend.show(model)
+    details = show.get("details") or {}
+    modelinfo = show.get("modelinfo") or {}
+    parameters = modelinfo.get("general.parameter_count") or parse_parameter_size(details.get("parameter_size"))
+    if not parameters:
+        return None
+    architecture = modelinfo.get("general.architecture")
+    return ModelInfo(
+        parameters=float(parameters),
+        quantization=details.get("quantization_level"),
+        context_length=modelinfo.get(f"{architecture}.context_length"),
+    )
+
 def list_available_models():
-    models = ollama.list()
-    return [model['model'] for model in models['models']]
+    return get_backend().list_models()
 
 def download_model(model_name):
     console.print(f"[yellow]Downloading model {model_name}...[/yellow]")
-    ollama.pull(model_name)
+    get_backend().pull(model_name)
+    clear_model_info_cache()
     console.print(f"[green]Model {model_name} downloaded successfully![/green]")
 
 def handle_missing_model(model):
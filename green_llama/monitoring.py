@@ -1,22 +1,43 @@
 import time
 import psutil
 import threading
-import ollama
+from . import models
 from . import utils
+from .metrics.metrics import chat, test_all
+from .metrics.processes import find_ollama_processes
 
-def monitor_cpu_usage(stop_event, cpu_readings):
-    while not stop_event.is_set():
-        cpu_readings.append(psutil.cpu_percent(interval=0.1))
+def monitor_cpu_usage(stop_event, cpu_readings, processes=None):
+    """Append CPU usage (%) every 0.1 s, system-wide or summed over the given processes"""
+    if processes is None:
+        while not stop_event.is_set():
+            cpu_readings.append(psutil.cpu_percent(interval=0.1))
+        return
+    cpu_count = psutil.cpu_count()
+    for process in processes:
+        try:
+            process.cpu_percent(interval=None)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    while not stop_event.wait(0.1):
+        usage = 0.0
+        for process in processes:
+            try:
+                usage += process.cpu_percent(interval=None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        # Process percentages are per core, scale to the system-wide range
+        cpu_readings.append(usage / cpu_count)
 
-def measure_cpu_usage(model, prompt):
+def measure_cpu_usage(model, prompt, attribution="system"):
     stop_event = threading.Event()
     cpu_readings = []
+    processes = find_ollama_processes() if attribution == "process" else None
 
-    monitor_thread = threading.Thread(target=monitor_cpu_usage, args=(stop_event, cpu_readings))
+    monitor_thread = threading.Thread(target=monitor_cpu_usage, args=(stop_event, cpu_readings, processes))
     monitor_thread.start()
 
     start_time = time.time()
-    response = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+    response = chat(model, prompt)
     end_time = time.time()
 
     stop_event.set()
@@ -27,22 +48,44 @@ def measure_cpu_usage(model, prompt):
 
     return response, avg_cpu_usage, elapsed_time
 
-def estimate_flops_per_sec(model, prompt):
-    start_time = time.time()
-    response = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+FLOPS_METRICS = ["Estimated FLOPs", "Achieved FLOP/s", "Prefill FLOP/s", "Decode FLOP/s", "FLOPs per Joule"]
 
-    estimated_flops = 10 ** 12
-    flops_per_sec = estimated_flops / elapsed_time if elapsed_time > 0 else 0
-    return response, flops_per_sec, elapsed_time
+def flops_metrics(model, response, total_energy, elapsed_time):
+    """Estimate compute from the model size and the response's token counts.
+
+    A forward pass costs roughly 2 FLOPs per parameter per token, for prompt
+    (prefill) and generated (decode) tokens alike. Returns an empty dict when
+    the model metadata or token counts are unavailable.
+    """
+    info = models.model_info(model)
+    if info is None or not hasattr(response, "get") or response.get("eval_count") is None:
+        return {}
+    prefill_flops = 2 * info.parameters * (response.get("prompt_eval_count") or 0)
+    decode_flops = 2 * info.parameters * (response.get("eval_count") or 0)
+    flops = prefill_flops + decode_flops
+    # Ollama reports durations in nanoseconds
+    prefill_time = (response.get("prompt_eval_duration") or 0) / 1e9
+    decode_time = (response.get("eval_duration") or 0) / 1e9
+    compute_time = prefill_time + decode_time or elapsed_time
+    return {
+        "Estimated FLOPs": flops,
+        "Achieved FLOP/s": flops / compute_time if compute_time > 0 else 0.0,
+        "Prefill FLOP/s": prefill_flops / prefill_time if prefill_time > 0 else 0.0,
+        "Decode FLOP/s": decode_flops / decode_time if decode_time > 0 else 0.0,
+        "FLOPs per Joule": flops / total_energy if total_energy > 0 else 0.0,
+    }
+
+def estimate_flops_per_sec(model, prompt):
+    response, metrics_data = test_all(model, prompt)
+    flops = flops_metrics(model, response, metrics_data["Total Energy (J)"], metrics_data["elapsed_time"])
+    return response, flops.get("Achieved FLOP/s", 0.0), metrics_data["elapsed_time"]
 
 def real_time_monitoring(model, metric_name, measure_function, metrics_storage):
     while True:
         response, metric_value, elapsed_time = measure_function(model, "")
         metrics_storage["values"].append(metric_value)
         metrics_storage["times"].append(elapsed_time)
-        utils.save_metrics_to_csv(metric_name, metric_value, elapsed_time)
+        utils.record_monitoring_metric(metric_name, metric_value, elapsed_time, model)
         time.sleep(0.2)
 
 
@@ -61,5 +104,5 @@ def chat_monitoring(model, metric_name, measure_function, metrics_storage, promp
     response, metric_value, elapsed_time = measure_function(model, prompt)
     metrics_storage["values"].append(metric_value)
     metrics_storage["times"].append(elapsed_time)
-    utils.save_metrics_to_csv(metric_name, metric_value, elapsed_time)
+    utils.record_monitoring_metric(metric_name, metric_value, elapsed_time, model, prompt)
     return response
\ No newline at end of file
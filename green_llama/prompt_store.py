@@ -0,0 +1,181 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import numpy as np
+
+MAGIC = b"GLPROMPT"
+VERSION = 1
+SUFFIX = ".prompts"
+
+CODE_PROMPTS = [
+    "Write a Python function to sort a list",
+    "Create a JavaScript class for a binary tree",
+    "Implement a C++ function to reverse a string",
+    "Write a SQL query to find duplicate records",
+    "Create a Java method to calculate factorial",
+    "Write a Python decorator for timing functions",
+    "Implement a JavaScript promise-based API call",
+    "Create a C++ template class for a stack",
+    "Write a SQL stored procedure for user authentication",
+    "Implement a Java interface for a database connection"
+]
+
+CHAT_PROMPTS = [
+    "Hello, please introduce yourself", #
+    "What's the weather like today?",
+    "Can you help me with my homework?",
+    "Tell me a joke",
+    "What's your favorite color?",
+    "How do you feel about artificial intelligence?",
+    "Can you explain quantum computing?",
+    "What's your opinion on climate change?",
+    "Tell me about your capabilities",
+    "What's the meaning of life?"
+]
+
+def cache_dir():
+    root = os.environ.get("GREEN_LLAMA_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "green_llama")
+    return os.path.join(root, "prompts")
+
+def bundled_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prompts")
+
+def store_name(task_name, num_samples):
+    return f"{task_name}-{num_samples}{SUFFIX}"
+
+def content_hash(prompts):
+    digest = hashlib.sha256()
+    for prompt in prompts:
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class PromptStore:
+    """Read-only, memory-mapped prompt file.
+
+    Layout: magic, version and header length, a JSON header (task, count,
+    sha256), then uint64 byte offsets and uint32 character lengths of every
+    prompt, then the UTF-8 prompt text. Prompts are decoded on access, so
+    opening a store costs the same regardless of its size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = struct.unpack_from("<8sII", self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a green_llama prompt store")
+        position = struct.calcsize("<8sII")
+        self.header = json.loads(self._mmap[position:position + header_size])
+        position = _align(position + header_size)
+        count = self.header["count"]
+        self.offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=position)
+        position += self.offsets.nbytes
+        self.lengths = np.frombuffer(self._mmap, dtype="<u4", count=count, offset=position)
+        self._text_start = position + self.lengths.nbytes
+
+    @property
+    def task_name(self):
+        return self.header["task"]
+
+    @property
+    def sha256(self):
+        return self.header["sha256"]
+
+    def __len__(self):
+        return self.header["count"]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("prompt index out of range")
+        start = self._text_start + int(self.offsets[index])
+        end = self._text_start + int(self.offsets[index + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        # The offset arrays are views into the map, drop them first
+        self.offsets = self.lengths = None
+        self._mmap.close()
+
+def write_store(path, task_name, prompts, source=None):
+    """Materialize prompts into a store file, written atomically"""
+    encoded = [prompt.encode("utf-8") for prompt in prompts]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(data) for data in encoded], dtype=np.uint64)
+    lengths = np.array([len(prompt) for prompt in prompts], dtype="<u4")
+    header = json.dumps({
+        "task": task_name,
+        "count": len(prompts),
+        "sha256": content_hash(prompts),
+        "source": source,
+    }).encode("utf-8")
+    prefix = struct.pack("<8sII", MAGIC, VERSION, len(header)) + header
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(prefix)
+        file.write(b"\0" * (_align(len(prefix)) - len(prefix)))
+        file.write(offsets.tobytes())
+        file.write(lengths.tobytes())
+        for data in encoded:
+            file.write(data)
+    os.replace(temp_path, path)
+    return path
+
+def build_prompts(task_name="text-generation", num_samples=1000):
+    """Build the filtered prompt list of a task from its source"""
+    if task_name == "text-generation":
+        # Only needed on the first run, when the store has to be materialized
+        from datasets import load_dataset
+        ds = load_dataset("wikitext", "wikitext-2-raw-v1", split="test")
+        prompts = ds["text"][:num_samples]
+        return [p.strip() for p in prompts if len(p.strip()) > 10]
+    elif task_name == "code-generation":
+        return CODE_PROMPTS[:num_samples]
+    else:  # chat-testing
+        return CHAT_PROMPTS[:num_samples]
+
+def find_store(task_name, num_samples=1000):
+    """Path of an existing store: $GREEN_LLAMA_PROMPTS, the user cache, then the bundled files"""
+    name = store_name(task_name, num_samples)
+    directories = [os.environ.get("GREEN_LLAMA_PROMPTS"), cache_dir(), bundled_dir()]
+    for directory in directories:
+        if directory and os.path.exists(os.path.join(directory, name)):
+            return os.path.join(directory, name)
+    return None
+
+def load_prompts(task_name="text-generation", num_samples=1000):
+    """Open the prompt store of a task, materializing it into the cache on first use"""
+    path = find_store(task_name, num_samples)
+    if path is None:
+        prompts = build_prompts(task_name, num_samples)
+        source = "wikitext-2-raw-v1/test" if task_name == "text-generation" else "green_llama"
+        path = write_store(os.path.join(cache_dir(), store_name(task_name, num_samples)), task_name, prompts, source)
+    return PromptStore(path)
+
+def export_store(task_name, directory, num_samples=1000):
+    """Copy the prompt store of a task into directory, e.g. to bundle it or carry it to an offline host"""
+    store = load_prompts(task_name, num_samples)
+    try:
+        path = os.path.join(directory, store_name(task_name, num_samples))
+        if os.path.abspath(path) != os.path.abspath(store.path):
+            os.makedirs(directory, exist_ok=True)
+            shutil.copyfile(store.path, path)
+        return path, store.sha256, len(store)
+    finally:
+        store.close()
+
+def _align(position, alignment=8):
+    return (position + alignment - 1) // alignment * alignment
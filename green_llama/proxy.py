@@ -0,0 +1,312 @@
+import asyncio
+import itertools
+import json
+import time
+from .metrics import exporter
+from .metrics.baseline import current_baseline
+from .metrics.emissions import EmissionsTracker
+from .metrics.energy_tracker import EnergyTracker
+from .metrics.metrics import all_metrics
+from .metrics.overlap import OverlapAttributor
+from .metrics_store import MetricsStore, new_run_id
+
+DEFAULT_UPSTREAM = "http://127.0.0.1:11434"
+DEFAULT_PORT = 11435
+METERED_PATHS = ("/api/chat", "/api/generate")
+# Not forwarded, they describe one hop only
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "te", "trailer", "upgrade",
+              "host", "content-length"}
+
+class ResponseMeter:
+    """Follows an Ollama response body as it streams past.
+
+    Streamed responses are newline-delimited JSON; only the final object,
+    the one with "done": true, carries the token counters, so the rest is
+    parsed just enough to spot the first token.
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.first_token_time = None
+        self.final = None
+        self._tail = b""
+
+    def feed(self, chunk):
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        if self._tail:
+            self._line(self._tail)
+            self._tail = b""
+
+    def _line(self, line):
+        if not line.strip():
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        content = message.get("response") or (message.get("message") or {}).get("content")
+        if content and self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        if message.get("done"):
+            self.final = message
+
+class MeteringProxy:
+    """Reverse proxy in front of the Ollama HTTP API that meters what passes through.
+
+    Every request is forwarded over a pooled connection to upstream, streamed
+    responses chunk by chunk. /api/chat and /api/generate requests are
+    charged their overlapping share of one long-running EnergyTracker and
+    their metrics are appended to the metrics store in batches, as the
+    conversation history the report viewer reads.
+    """
+
+    def __init__(self, upstream=DEFAULT_UPSTREAM, host="127.0.0.1", port=DEFAULT_PORT, store=None,
+                 batch_size=16, tracker=None, data_folder="report_viewer/public"):
+        self.upstream = upstream.rstrip("/")
+        self.host = host
+        self.port = port
+        self.store = store or MetricsStore()
+        self.batch_size = batch_size
+        self.data_folder = data_folder
+        # Our own tracker follows the host's idle baseline as it is recalibrated
+        self._follow_baseline = tracker is None
+        self.tracker = tracker or EnergyTracker(baseline=current_baseline())
+        self.attributor = OverlapAttributor(self.tracker)
+        self.emissions_tracker = EmissionsTracker()
+        self.run_id = new_run_id("proxy", "requests")
+        self.requests = 0
+        self._keys = itertools.count()
+        self._records = []
+        self._flushes = set()
+        self._flush_lock = None
+        self._connections = {}
+        self._client = None
+        self._server = None
+
+    async def start(self):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=self.upstream, timeout=httpx.Timeout(None, connect=10.0),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=32),
+        )
+        self._flush_lock = asyncio.Lock()
+        self.tracker.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Hang up on keep-alive connections, their handlers then see the end of input
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+        await self._client.aclose()
+        self.tracker.stop()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _handle(self, reader, writer):
+        import httpx
+
+        handler = asyncio.current_task()
+        self._connections[handler] = writer
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                keep_alive = await self._forward(*request, writer)
+                if not keep_alive:
+                    break
+        # httpx errors here come from upstream failing halfway through a response,
+        # hanging up tells the client it was cut short
+        except (ConnectionError, asyncio.IncompleteReadError, httpx.HTTPError):
+            pass
+        finally:
+            del self._connections[handler]
+            writer.close()
+
+    async def _forward(self, method, path, version, headers, body, writer):
+        import httpx
+
+        metered = method == "POST" and path.split("?")[0] in METERED_PATHS
+        forwarded = [(name, value) for name, value in headers if name.lower() not in HOP_BY_HOP]
+        if metered:
+            # The meter reads the body, so ask upstream for it uncompressed
+            forwarded = [(name, value) for name, value in forwarded if name.lower() != "accept-encoding"]
+            key = next(self._keys)
+            if self._follow_baseline:
+                baseline = current_baseline()
+                if baseline != self.tracker.baseline:
+                    self.tracker.set_baseline(baseline)
+            self.attributor.begin(key)
+            meter = ResponseMeter(time.perf_counter())
+        keep_alive = version == "HTTP/1.1" and all(
+            value.lower() != "close" for name, value in headers if name.lower() == "connection")
+        response = None
+        try:
+            request = self._client.build_request(method, path, headers=forwarded, content=body)
+            try:
+                response = await self._client.send(request, stream=True)
+            except httpx.HTTPError as error:
+                # Nothing was written to the client yet, answer like a gateway
+                await _write_error(writer, keep_alive, 502, "Bad Gateway", f"upstream {self.upstream}: {error}")
+            else:
+                try:
+                    # HTTP/1.0 clients read the body until the connection closes
+                    chunked = version == "HTTP/1.1" and _has_body(method, response.status_code)
+                    await _write_head(writer, response, keep_alive, chunked)
+                    async for chunk in response.aiter_raw():
+                        if metered:
+                            meter.feed(chunk)
+                        if chunked and chunk:
+                            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        elif chunk:
+                            writer.write(chunk)
+                        await writer.drain()
+                    if chunked:
+                        writer.write(b"0\r\n\r\n")
+                        await writer.drain()
+                finally:
+                    await response.aclose()
+        except BaseException:
+            if metered:
+                self.attributor.end(key)
+            raise
+        if metered:
+            energy = self.attributor.end(key)
+            # Errors such as an unknown model aren't conversations
+            if response is not None and response.is_success:
+                meter.close()
+                self._record(_request_model(body), body, meter, energy)
+        return keep_alive
+
+    def _record(self, model, body, meter, energy):
+        elapsed_time = time.perf_counter() - meter.start_time
+        emissions = self.emissions_tracker.compute_emissions(energy.total)
+        metrics = all_metrics(meter.final, energy, emissions, elapsed_time)
+        if meter.first_token_time is not None:
+            metrics["Time to First Token (s)"] = meter.first_token_time - meter.start_time
+        exporter.observe(metrics, model)
+        self.requests += 1
+        self._records.append({
+            "run_id": self.run_id, "model": model, "prompt": _request_prompt(body),
+            "elapsed_time": elapsed_time,
+            "metrics": {name: value for name, value in metrics.items() if name != "elapsed_time"},
+        })
+        if len(self._records) >= self.batch_size:
+            self._flushes.add(asyncio.ensure_future(self.flush()))
+            for flush in list(self._flushes):
+                if flush.done():
+                    self._flushes.discard(flush)
+
+    async def flush(self):
+        """Write the buffered records off the event loop, one batch at a time"""
+        from .utils import save_history_records
+
+        records, self._records = self._records, []
+        if records:
+            async with self._flush_lock:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, save_history_records, records, self.store, self.data_folder
+                )
+
+async def _read_request(reader):
+    """(method, path, version, headers, body) of the next request, None at end of connection"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, version = line.decode("latin-1").split()
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    fields = {name.lower(): value for name, value in headers}
+    if fields.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(fields.get("content-length", 0)))
+    return method, path, version, headers, body
+
+async def _write_head(writer, response, keep_alive, chunked):
+    lines = [f"HTTP/1.1 {response.status_code} {response.reason_phrase}"]
+    lines += [f"{name}: {value}" for name, value in response.headers.multi_items()
+              if name.lower() not in HOP_BY_HOP]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    elif "content-length" in response.headers:
+        lines.append(f"Content-Length: {response.headers['content-length']}")
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+async def _write_error(writer, keep_alive, status_code, reason, message):
+    # Ollama reports errors as {"error": message}, which its clients raise
+    body = json.dumps({"error": message}).encode()
+    head = [f"HTTP/1.1 {status_code} {reason}", "Content-Type: application/json", f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+def _has_body(method, status_code):
+    return method != "HEAD" and status_code >= 200 and status_code not in (204, 304)
+
+def _request_json(body):
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return request if isinstance(request, dict) else {}
+
+def _request_model(body):
+    return str(_request_json(body).get("model", ""))
+
+def _request_prompt(body):
+    request = _request_json(body)
+    if "prompt" in request:
+        return str(request["prompt"])
+    messages = request.get("messages") or [{}]
+    return str(messages[-1].get("content", ""))
+
+async def serve(upstream=DEFAULT_UPSTREAM, host="127.0.0.1", port=DEFAULT_PORT, on_ready=None):
+    """Run a proxy until cancelled or interrupted and return the number of metered requests"""
+    proxy = MeteringProxy(upstream, host, port)
+    async with proxy:
+        if on_ready:
+            on_ready(proxy)
+        try:
+            await proxy.serve_forever()
+        except asyncio.CancelledError:
+            pass
+    return proxy.requests
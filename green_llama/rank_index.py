@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+from .metrics_store import Segment, store_dir
+
+INDEX_VERSION = 1
+INDEX_FILE = "rank_index.json"
+
+class RankIndex:
+    """Running count, sum and sum of squares of every metric per result file.
+
+    Entries are keyed by the file's absolute path and remember its mtime and
+    size, so refresh() only re-parses logs that changed since they were
+    indexed. Writers add() the sums of the batch they appended to a log,
+    which keeps the index current without reading the file or the store's
+    history back.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(store_dir(), INDEX_FILE)
+        self.files = {}
+        self._dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+        except (OSError, ValueError):
+            pass
+
+    @classmethod
+    def of_store(cls, store):
+        """The index kept next to a MetricsStore"""
+        return cls(os.path.join(store.root, INDEX_FILE))
+
+    @staticmethod
+    def _stat(file_path):
+        stat = os.stat(file_path)
+        return {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+    def entry(self, file_path, benchmark, model):
+        """Entry of a log if it is indexed and hasn't changed since, else None"""
+        try:
+            stat = self._stat(file_path)
+        except OSError:
+            return None
+        entry = self.files.get(os.path.abspath(file_path))
+        if (entry is None or entry["mtime"] != stat["mtime"] or entry["size"] != stat["size"]
+                or entry["benchmark"] != benchmark or entry["model"] != model):
+            return None
+        return entry
+
+    def record(self, file_path, benchmark, model, sums):
+        """Store the {metric: [count, sum, sum_of_squares]} of a log that was just written"""
+        self.files[os.path.abspath(file_path)] = {
+            **self._stat(file_path), "benchmark": benchmark, "model": model,
+            "metrics": {metric_name: list(values) for metric_name, values in sums.items()},
+        }
+        self._dirty = True
+        self.save()
+
+    def add(self, file_path, entry, sums):
+        """Add the sums of a batch just appended to a log to the log's entry from before the write"""
+        metrics = entry["metrics"]
+        for metric_name, (count, total, squares) in sums.items():
+            metric_sums = metrics.setdefault(metric_name, [0, 0.0, 0.0])
+            metric_sums[0] += count
+            metric_sums[1] += total
+            metric_sums[2] += squares
+        self.record(file_path, entry["benchmark"], entry["model"], metrics)
+
+    def update(self, file_path, benchmark, model, entry, store, segment, filters):
+        """Bring a log's entry up to date after segment was appended to store and the log re-exported.
+
+        entry is the one from before the write. Only the new segment's
+        records matching filters are summed, unless the log wasn't indexed
+        yet, then its whole history in the store is.
+        """
+        if entry is None:
+            self.record(file_path, benchmark, model, store.sums(**filters))
+        else:
+            self.add(file_path, entry, store.sums([Segment(segment)], **filters) if segment else {})
+
+    def refresh(self, logs):
+        """Bring the (benchmark, model, file_path) logs up to date and return their entries"""
+        entries = []
+        for benchmark, model, file_path in logs:
+            entry = self.entry(file_path, benchmark, model)
+            if entry is None:
+                entry = {**self._stat(file_path), "benchmark": benchmark, "model": model,
+                         "metrics": read_sums_from_csv(file_path)}
+                self.files[os.path.abspath(file_path)] = entry
+                self._dirty = True
+            entries.append(entry)
+        self.save()
+        return entries
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, file)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+def read_sums_from_csv(file_path):
+    """{metric: [count, sum, sum_of_squares]} of a log in the report viewer's format"""
+    sums = {}
+    with open(file_path, mode="r", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            try:
+                value = float(row["Value"])
+            except (TypeError, ValueError):
+                continue
+            metric_sums = sums.setdefault(row["Metric Name"], [0, 0.0, 0.0])
+            metric_sums[0] += 1
+            metric_sums[1] += value
+            metric_sums[2] += value * value
+    return sums
+
+def mean(sums):
+    count, total, _ = sums
+    return total / count if count else None
+
+def std(sums):
+    count, total, squares = sums
+    if count < 2:
+        return None
+    return max((squares - total * total / count) / (count - 1), 0.0) ** 0.5
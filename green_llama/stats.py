@@ -0,0 +1,82 @@
+import math
+import numpy as np
+
+CONFIDENCE = 0.95
+RESAMPLES = 2000
+
+def bootstrap_ci(values, statistic=np.mean, confidence=CONFIDENCE, resamples=RESAMPLES, seed=0):
+    """Percentile bootstrap confidence interval of statistic over values.
+
+    Resamples are drawn in one (resamples, n) index matrix, so statistic must
+    accept an axis argument like the numpy reductions do.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return None, None
+    if values.size == 1:
+        return float(values[0]), float(values[0])
+    rng = np.random.default_rng(seed)
+    samples = values[rng.integers(0, values.size, size=(resamples, values.size))]
+    estimates = statistic(samples, axis=1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(estimates, [tail, 100 - tail])
+    return float(low), float(high)
+
+def summarize(values, confidence=CONFIDENCE):
+    """Mean, median, p95 and the bootstrap confidence interval of the mean"""
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return {"count": 0, "mean": None, "median": None, "p95": None, "ci_low": None, "ci_high": None}
+    ci_low, ci_high = bootstrap_ci(values, confidence=confidence)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "p95": float(np.percentile(values, 95)),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+    }
+
+def summarize_storage(metrics_storage, selected_metrics=None):
+    """summarize() of every metric in a metrics_storage"""
+    return {
+        metric_name: summarize(data["values"])
+        for metric_name, data in metrics_storage.items()
+        if data["values"] and (selected_metrics is None or metric_name in selected_metrics)
+    }
+
+def welch_p_value(sums_a, sums_b):
+    """Two-sided p-value that two means differ, from [count, sum, sum_of_squares] aggregates.
+
+    Uses Welch's statistic with a normal approximation, which is what the
+    running sums of the rank index allow without the raw values. Returns None
+    when either side has fewer than two values.
+    """
+    (count_a, total_a, squares_a), (count_b, total_b, squares_b) = sums_a, sums_b
+    if count_a < 2 or count_b < 2:
+        return None
+    variance_a = max((squares_a - total_a * total_a / count_a) / (count_a - 1), 0.0)
+    variance_b = max((squares_b - total_b * total_b / count_b) / (count_b - 1), 0.0)
+    standard_error = math.sqrt(variance_a / count_a + variance_b / count_b)
+    difference = total_a / count_a - total_b / count_b
+    if standard_error == 0:
+        return 0.0 if difference else 1.0
+    return math.erfc(abs(difference) / standard_error / math.sqrt(2))
+
+def significant_ranks(sums, alpha=1 - CONFIDENCE):
+    """Competition ranks of aggregates sorted best first, sharing a rank while
+    a model isn't significantly different from the first model of its group.
+
+    Models without enough values to test are never claimed to be worse.
+    """
+    ranks = []
+    leader = None
+    for position, model_sums in enumerate(sums):
+        if leader is not None:
+            p_value = welch_p_value(sums[leader], model_sums)
+            if p_value is None or p_value >= alpha:
+                ranks.append(ranks[leader])
+                continue
+        leader = position
+        ranks.append(position + 1)
+    return ranks
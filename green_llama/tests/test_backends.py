@@ -0,0 +1,186 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from green_llama.__main__ import main
+from green_llama.backends import (
+    Backend, OpenAIBackend, SyntheticBackend, backend_from_spec, get_backend, parse_keep_alive, set_backend
+)
+from green_llama.metrics import metrics as measured
+
+MESSAGES = [{"role": "user", "content": "Why is the sky blue?"}]
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """Chat completions like llama.cpp server, streamed as server-sent events."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._send_json({"object": "list", "data": [{"id": "qwen2.5-0.5b"}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(request)
+        usage = {"prompt_tokens": 6, "completion_tokens": 3}
+        if not request["stream"]:
+            self._send_json({"choices": [{"message": {"role": "assistant", "content": "Rayleigh scattering."}}],
+                             "usage": usage})
+            return
+        events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+        events += [{"choices": [{"delta": {"content": token}}]} for token in ("Rayleigh", " scattering", ".")]
+        events.append({"choices": [], "usage": usage})
+        body = b"".join(b"data: %s\n\n" % json.dumps(event).encode() for event in events) + b"data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBackend(unittest.TestCase):
+    def test_chat_is_required(self):
+        class Incomplete(Backend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class TestSyntheticBackend(unittest.TestCase):
+    def test_deterministic_answers(self):
+        backend = SyntheticBackend(rate=1000, tokens=12)
+        response = backend.chat("llama3.2:1b", MESSAGES)
+        self.assertEqual(response, {**response, "eval_count": 12, "prompt_eval_count": 5, "done": True})
+        self.assertEqual(backend.chat("llama3.2:1b", MESSAGES)["message"], response["message"])
+        self.assertNotEqual(backend.chat("llama3.2:1b", [{"role": "user", "content": "Hi"}])["message"],
+                            response["message"])
+
+        chunks = list(backend.chat("llama3.2:1b", MESSAGES, stream=True))
+        self.assertEqual("".join(chunk["message"]["content"] for chunk in chunks), response["message"]["content"])
+        self.assertEqual(len(chunks), 13)
+        self.assertTrue(chunks[-1]["done"])
+
+    def test_rate_and_cpu_burn(self):
+        for burn in (0.0, 0.8):
+            backend = SyntheticBackend(rate=100, burn=burn, tokens=20)
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            response = backend.chat("m", MESSAGES)
+            wall, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            self.assertAlmostEqual(wall, 0.2, delta=0.1)
+            self.assertAlmostEqual(response["eval_duration"] / 1e9, wall, delta=0.01)
+            if burn:
+                self.assertGreater(cpu, 0.1)
+            else:
+                self.assertLess(cpu, 0.05)
+
+    def test_specs(self):
+        backend = backend_from_spec("synthetic:rate=20,burn=0.5,tokens=8")
+        self.assertEqual((backend.rate, backend.burn, backend.tokens), (20.0, 0.5, 8))
+        self.assertEqual(backend_from_spec("openai:http://127.0.0.1:8000/v1/").base_url, "http://127.0.0.1:8000/v1")
+        self.assertEqual(backend_from_spec("ollama:http://gpu-box:11434").host, "http://gpu-box:11434")
+        with self.assertRaises(ValueError):
+            backend_from_spec("tgi")
+        with self.assertRaises(ValueError):
+            backend_from_spec("synthetic:speed=3")
+
+    def test_residency(self):
+        backend = SyntheticBackend(rate=1000, tokens=2, load=0.05)
+        cold = backend.chat("m", MESSAGES, keep_alive="10m")
+        self.assertAlmostEqual(cold["load_duration"] / 1e9, 0.05, delta=0.03)
+        self.assertTrue(backend.resident("m"))
+        self.assertEqual(backend.chat("m", MESSAGES)["load_duration"], 0)
+
+        backend.unload("m")
+        self.assertFalse(backend.resident("m"))
+        self.assertGreater(backend.load("m", keep_alive=0)["load_duration"], 0)
+        # keep_alive=0 evicts the model as soon as the request is done
+        self.assertFalse(backend.resident("m"))
+
+    def test_parse_keep_alive(self):
+        self.assertEqual(parse_keep_alive(None), 300)
+        self.assertEqual(parse_keep_alive("10m"), 600)
+        self.assertEqual(parse_keep_alive("1.5h"), 5400)
+        self.assertEqual(parse_keep_alive(30), 30)
+        self.assertEqual(parse_keep_alive("-1"), float("inf"))
+        with self.assertRaises(ValueError):
+            parse_keep_alive("forever")
+
+
+class TestOpenAIBackend(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.backend = OpenAIBackend(f"http://127.0.0.1:{self.server.server_address[1]}/v1", api_key="")
+
+    def test_chat(self):
+        response = self.backend.chat("qwen2.5-0.5b", MESSAGES)
+        self.assertEqual(response["message"]["content"], "Rayleigh scattering.")
+        self.assertEqual((response["prompt_eval_count"], response["eval_count"]), (6, 3))
+        self.assertEqual(self.backend.list_models(), ["qwen2.5-0.5b"])
+
+    def test_stream(self):
+        chunks = list(self.backend.chat("qwen2.5-0.5b", MESSAGES, stream=True))
+        self.assertEqual([chunk["message"]["content"] for chunk in chunks[:-1]], ["Rayleigh", " scattering", "."])
+        self.assertEqual((chunks[-1]["prompt_eval_count"], chunks[-1]["eval_count"]), (6, 3))
+        self.assertTrue(self.server.requests[0]["stream_options"]["include_usage"])
+
+
+class TestOffline(unittest.TestCase):
+    """The measured pipelines run against the synthetic backend, no Ollama needed"""
+
+    def setUp(self) -> None:
+        set_backend(SyntheticBackend(rate=2000, tokens=8))
+        self.addCleanup(set_backend, None)
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {
+            "GREEN_LLAMA_CACHE": self._tmp.name, "GREEN_LLAMA_STORE": os.path.join(self._tmp.name, "store")
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_measured_calls(self):
+        response, metrics = measured.test_all("llama3.2:1b", "Hello")
+        self.assertEqual(metrics["Generated Tokens"], 8)
+        streamed, streaming_metrics = measured.stream_all("llama3.2:1b", "Hello")
+        self.assertEqual(streamed["message"]["content"], response["message"]["content"])
+        self.assertGreater(streaming_metrics["Decode Throughput (tokens/s)"], 0)
+
+    def test_bench(self):
+        set_backend(None)
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            self.assertEqual(main([
+                "--backend", "synthetic:rate=2000,tokens=4", "bench", "--model", "llama3.2:1b", "--suite", "code",
+                "--limit", "3", "--out", os.path.join(self._tmp.name, "results"),
+                "--runs-dir", os.path.join(self._tmp.name, "runs"),
+            ]), 0)
+        self.assertIsInstance(get_backend(), SyntheticBackend)
+        metrics = json.loads(stdout.getvalue())["metrics"]
+        self.assertEqual(metrics["Generated Tokens"]["total"], 12)
+        self.assertEqual(metrics["Estimated FLOPs"]["median"], 2 * 1e9 * (8 + 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
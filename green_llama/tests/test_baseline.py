@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+from green_llama import benchmark
+from green_llama.metrics import baseline as idle
+from green_llama.metrics.energy_tracker import EnergyTracker
+from green_llama.metrics.fake_hardware import fake_hardware
+from green_llama.metrics.hardware import EnergyConsumption
+
+
+class FakeTracker:
+    """Reports a constant draw of 10 W CPU, 30 W GPU and 2 W RAM for the session."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.perf_counter() - self.start
+
+    def stop(self):
+        return EnergyConsumption(cpu=10.0 * self.elapsed, gpu=30.0 * self.elapsed, ram=2.0 * self.elapsed,
+                                 total=42.0 * self.elapsed)
+
+
+class TestIdleBaseline(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {"GREEN_LLAMA_CACHE": self._tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calibrate_is_cached_per_host(self):
+        baseline = idle.calibrate(window=0.05, tracker=FakeTracker())
+        self.assertAlmostEqual(baseline.power["cpu"], 10.0, delta=0.1)
+        self.assertAlmostEqual(baseline.total_power, 42.0, delta=0.5)
+        self.assertEqual(idle.load_baseline(), baseline)
+        self.assertTrue(os.path.basename(idle.baseline_path()).startswith("baseline-"))
+
+        expired = replace(baseline, measured_at=time.time() - 7200)
+        idle.save_baseline(expired)
+        self.assertEqual(idle.load_baseline(max_age=10800), expired)
+        self.assertIsNone(idle.load_baseline(max_age=3600))
+
+    def test_current_baseline_is_kept_in_memory(self):
+        self.assertIsNone(idle.current_baseline())
+        baseline = idle.IdleBaseline("host", time.time(), 1.0, {"cpu": 4.0, "gpu": 0.0, "ram": 1.0})
+        idle.save_baseline(baseline, idle.baseline_path())
+        with patch.object(idle, "load_baseline", wraps=idle.load_baseline) as load:
+            self.assertEqual(idle.current_baseline(), baseline)
+            self.assertEqual(idle.current_baseline(), baseline)
+            self.assertEqual(load.call_count, 1)
+            # Once it expires, the host cache is read again
+            self.assertEqual(idle.current_baseline(max_age=3600), baseline)
+            self.assertEqual(load.call_count, 2)
+            with patch.object(idle.IdleBaseline, "age", return_value=7200):
+                self.assertIsNone(idle.current_baseline(max_age=3600))
+            self.assertEqual(load.call_count, 3)
+
+    def test_baseline_change_keeps_idle_energy(self):
+        low = idle.IdleBaseline("host", time.time(), 1.0, {"cpu": 5.0, "gpu": 0.0, "ram": 0.0})
+        high = replace(low, power={"cpu": 20.0, "gpu": 0.0, "ram": 0.0})
+        with patch("green_llama.metrics.energy_tracker.get_hardware", return_value=fake_hardware()):
+            tracker = EnergyTracker(measure_interval=0.01, baseline=low)
+            tracker.start()
+            time.sleep(0.1)
+            before = tracker.snapshot().idle
+            tracker.set_baseline(high)
+            self.assertGreaterEqual(tracker.snapshot().idle, before)
+            time.sleep(0.1)
+            energy = tracker.stop()
+        self.assertAlmostEqual(energy.idle, 5.0 * 0.1 + 20.0 * 0.1, delta=0.5)
+
+    def test_tracker_reports_net_energy(self):
+        baseline = idle.IdleBaseline("host", time.time(), 1.0, {"cpu": 4.0, "gpu": 10.0, "ram": 1.0})
+        with patch("green_llama.metrics.energy_tracker.get_hardware", return_value=fake_hardware()):
+            tracker = EnergyTracker(measure_interval=0.01, baseline=baseline)
+            with tracker:
+                time.sleep(0.2)
+            energy = tracker.stop()
+        # 35 W drawn against 15 W idle
+        self.assertAlmostEqual(energy.idle / energy.total, 15 / 35, delta=0.05)
+        self.assertAlmostEqual(energy.net, energy.total - energy.idle)
+        self.assertEqual(EnergyConsumption(total=3.0).net, 3.0)
+
+    @patch("green_llama.benchmark.chat")
+    def test_runner_recalibrates(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "ok"}}
+        calibrations = []
+
+        def fake_calibrate():
+            # Every baseline is already too old for the next chunk
+            calibrations.append(None)
+            return idle.IdleBaseline("host", time.time() - 100, 1.0, {"cpu": 1.0, "gpu": 0.0, "ram": 0.0})
+
+        with patch.object(benchmark, "calibrate", side_effect=fake_calibrate), \
+                patch.object(benchmark, "CALIBRATION_CHUNK", 2), \
+                tempfile.TemporaryDirectory() as runs_dir:
+            metrics_storage = benchmark.run_benchmark(
+                "model", ["a", "b", "c", "d", "e"], "chat-testing", concurrency=1, runs_dir=runs_dir,
+                idle_baseline=True, recalibrate_interval=10
+            )
+        self.assertEqual(len(calibrations), 3)
+        self.assertEqual(len(metrics_storage["Net Energy (J)"]["values"]), 5)
+        for idle_energy in metrics_storage["Idle Energy (J)"]["values"]:
+            self.assertGreater(idle_energy, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from green_llama.backends import SyntheticBackend, get_backend, set_backend
+from green_llama.benchmark import COLD_START_METRICS, RunJournal, run_benchmark, run_cold_start, run_prompts
+from green_llama.metrics.hardware import EnergyConsumption
+from green_llama.metrics.overlap import OverlapAttributor
+
+
+class FakeTracker:
+    """Snapshots report a constant 10 W CPU draw on a settable clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def snapshot(self):
+        return EnergyConsumption(cpu=10.0 * self.now, total=10.0 * self.now)
+
+
+class TestOverlapAttributor(unittest.TestCase):
+    def test_overlapping_requests_share_energy(self):
+        tracker = FakeTracker()
+        attributor = OverlapAttributor(tracker)
+        attributor.begin("a")
+        tracker.now = 1.0
+        attributor.begin("b")
+        tracker.now = 2.0
+        first = attributor.end("a")
+        tracker.now = 4.0
+        second = attributor.end("b")
+        # a: 10 J alone + 5 J shared, b: 5 J shared + 20 J alone
+        self.assertAlmostEqual(first.total, 15.0)
+        self.assertAlmostEqual(second.total, 25.0)
+        self.assertEqual(attributor.active, 0)
+
+    def test_snapshot_below_predecessor_is_not_charged(self):
+        tracker = FakeTracker()
+        attributor = OverlapAttributor(tracker)
+        attributor.begin("a")
+        tracker.now = 2.0
+        attributor.begin("b")
+        # The sampler's estimate was revised down by 5 J, then grows by 10 J
+        tracker.now = 1.5
+        first = attributor.end("a")
+        tracker.now = 3.0
+        second = attributor.end("b")
+        self.assertAlmostEqual(first.total, 20.0)
+        self.assertAlmostEqual(second.total, 10.0)
+
+
+class TestConcurrentRunner(unittest.TestCase):
+    @patch("green_llama.benchmark.chat")
+    def test_run_prompts_concurrently(self, mock_chat):
+        in_flight = []
+        lock = threading.Lock()
+
+        def fake_chat(model, prompt):
+            with lock:
+                in_flight.append(None)
+                peak = len(in_flight)
+            time.sleep(0.1)
+            with lock:
+                in_flight.pop()
+            return {"message": {"content": prompt.upper()}, "eval_count": 5, "eval_duration": 100_000_000, "peak": peak}
+
+        mock_chat.side_effect = fake_chat
+        prompts = [f"prompt {index}" for index in range(8)]
+        start = time.perf_counter()
+        results = run_prompts("model", prompts, concurrency=4)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.8 * 0.1 * len(prompts), "Prompts should run concurrently.")
+        self.assertLessEqual(max(response["peak"] for response, _ in results), 4)
+        self.assertEqual([response["message"]["content"] for response, _ in results], [p.upper() for p in prompts])
+        for _, metrics_data in results:
+            self.assertGreater(metrics_data["Total Energy (J)"], 0.0)
+            self.assertGreaterEqual(metrics_data["elapsed_time"], 0.1)
+            self.assertEqual(metrics_data["Generated Tokens"], 5)
+
+    @patch("green_llama.benchmark.chat")
+    def test_run_benchmark_single_pass(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "ok"}}
+        prompts = ["first prompt", "second prompt", "third prompt"]
+        with tempfile.TemporaryDirectory() as runs_dir:
+            metrics_storage = run_benchmark("model", prompts, task_name="code-generation", concurrency=1,
+                                            runs_dir=runs_dir)
+
+        self.assertEqual(mock_chat.call_count, len(prompts))
+        for metric in ("CPU Energy (J)", "GPU Energy (J)", "RAM Energy (J)", "Total Energy (J)", "Carbon Emissions (gCO2)"):
+            self.assertEqual(metrics_storage[metric]["prompts"], prompts)
+
+    @patch("green_llama.benchmark.chat")
+    def test_warmup_and_repetitions(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "ok"}}
+        prompts = ["a", "b"]
+        with tempfile.TemporaryDirectory() as runs_dir:
+            metrics_storage = run_benchmark("model", prompts, "chat-testing", concurrency=1, runs_dir=runs_dir,
+                                            warmup=2, repetitions=3)
+        self.assertEqual([call.args[1] for call in mock_chat.call_args_list], ["a", "b"] + prompts * 3)
+        # Warmup requests aren't recorded, repetitions run round-robin
+        self.assertEqual(metrics_storage["Total Energy (J)"]["prompts"], prompts * 3)
+
+    def test_cold_starts_and_keep_alive(self):
+        set_backend(SyntheticBackend(rate=2000, tokens=4, load=0.05))
+        self.addCleanup(set_backend, None)
+        prompts = ["a", "b", "c"]
+        with tempfile.TemporaryDirectory() as runs_dir:
+            metrics_storage = run_benchmark("model", prompts, "chat-testing", concurrency=1, runs_dir=runs_dir,
+                                            warmup=0, keep_alive="5m", cold_starts=2)
+        for metric_name in COLD_START_METRICS:
+            self.assertEqual(metrics_storage[metric_name]["prompts"], ["a", "b"])
+        for load_time in metrics_storage["Model Load Time (s)"]["values"]:
+            self.assertAlmostEqual(load_time, 0.05, delta=0.03)
+        for load_time, total_time in zip(metrics_storage["Model Load Time (s)"]["values"],
+                                         metrics_storage["Cold Start Time (s)"]["values"]):
+            self.assertGreater(total_time, load_time)
+        # The model was preloaded, so no warm request pays for loading it
+        self.assertEqual(metrics_storage["Load Time (s)"]["prompts"], prompts)
+        self.assertEqual(metrics_storage["Load Time (s)"]["values"], [0.0] * len(prompts))
+        self.assertTrue(get_backend().resident("model"))
+
+    def test_no_cold_starts_without_residency_control(self):
+        class ServerManaged(SyntheticBackend):
+            controls_residency = False
+
+        set_backend(ServerManaged(rate=2000, tokens=4, load=0.05))
+        self.addCleanup(set_backend, None)
+        with tempfile.TemporaryDirectory() as runs_dir:
+            metrics_storage = run_benchmark("model", ["a", "b"], "chat-testing", concurrency=1, runs_dir=runs_dir,
+                                            cold_starts=2)
+        self.assertFalse(set(COLD_START_METRICS) & set(metrics_storage))
+        self.assertEqual(metrics_storage["Total Energy (J)"]["prompts"], ["a", "b"])
+        with self.assertRaises(ValueError):
+            run_cold_start("model", "a")
+
+
+class TestResumableRuns(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.prompts = [f"prompt {index}" for index in range(5)]
+
+    def test_runs_in_the_same_second_get_their_own_directory(self):
+        journals = [RunJournal.create("model", "chat-testing", "sha", [0], {}, runs_dir=self._tmp.name)
+                    for _ in range(2)]
+        self.assertNotEqual(journals[0].directory, journals[1].directory)
+        self.assertEqual(len(os.listdir(self._tmp.name)), 2)
+
+    @patch("green_llama.benchmark.chat")
+    def test_resume_skips_finished_prompts(self, mock_chat):
+        def interrupted_chat(model, prompt):
+            if prompt == "prompt 3":
+                raise KeyboardInterrupt
+            return {"message": {"content": "ok"}}
+
+        mock_chat.side_effect = interrupted_chat
+        with self.assertRaises(KeyboardInterrupt):
+            run_benchmark("model", self.prompts, "chat-testing", concurrency=1, runs_dir=self._tmp.name)
+        # The worker may already have picked up the next prompt, it isn't journaled either way
+        self.assertIn(mock_chat.call_count, (4, 5))
+
+        mock_chat.reset_mock(side_effect=True)
+        mock_chat.return_value = {"message": {"content": "ok"}}
+        metrics_storage = run_benchmark(
+            "model", self.prompts, "chat-testing", concurrency=1, resume=True, runs_dir=self._tmp.name
+        )
+        self.assertEqual([call.args[1] for call in mock_chat.call_args_list], ["prompt 3", "prompt 4"])
+        self.assertEqual(metrics_storage["Total Energy (J)"]["prompts"], self.prompts)
+
+        (run_id,) = os.listdir(self._tmp.name)
+        journal = RunJournal(os.path.join(self._tmp.name, run_id))
+        self.assertTrue(journal.manifest["completed"])
+        self.assertEqual(journal.manifest["prompt_indices"], list(range(5)))
+        self.assertEqual(len(journal.results()), 5)
+
+    @patch("green_llama.benchmark.chat")
+    def test_resume_ignores_other_datasets(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "ok"}}
+        journal = RunJournal.create("model", "chat-testing", "other-hash", list(range(5)), {}, self._tmp.name)
+        journal.append("dataset:0", "prompt 0", {"elapsed_time": 1.0})
+        journal.close()
+        run_benchmark("model", self.prompts, "chat-testing", concurrency=1, resume=True, runs_dir=self._tmp.name)
+        self.assertEqual(mock_chat.call_count, 5)
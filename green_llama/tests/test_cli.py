@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from green_llama.__main__ import main, parse_args
+
+
+class TestBatchCLI(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {
+            "GREEN_LLAMA_CACHE": self._tmp.name, "GREEN_LLAMA_STORE": os.path.join(self._tmp.name, "store")
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, *argv):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            self.assertEqual(main(list(argv)), 0)
+        return json.loads(stdout.getvalue())
+
+    @patch("green_llama.benchmark.chat")
+    def test_bench(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "ok"}, "eval_count": 4, "eval_duration": 10 ** 8}
+        out = os.path.join(self._tmp.name, "results")
+        result = self._run(
+            "bench", "--model", "llama3.2:1b", "--suite", "code", "--limit", "3", "--concurrency", "2",
+            "--repetitions", "2",
+            "--out", out, "--runs-dir", os.path.join(self._tmp.name, "runs"),
+        )
+        # One warmup request plus two repetitions of three prompts
+        self.assertEqual(mock_chat.call_count, 7)
+        self.assertEqual(result["suite"], "code")
+        tokens = result["metrics"]["Generated Tokens"]
+        self.assertEqual((tokens["total"], tokens["count"], tokens["median"]), (24, 6, 4))
+        self.assertEqual((tokens["ci_low"], tokens["ci_high"]), (4, 4))
+        self.assertTrue(result["log"].startswith(os.path.join(out, "code_benchmark")))
+        self.assertTrue(os.path.exists(result["log"]))
+
+    def test_rank(self):
+        folder = os.path.join(self._tmp.name, "benchmark_results", "chat_benchmark")
+        os.makedirs(folder)
+        for model, co2 in (("big", 0.5), ("small", 0.1)):
+            with open(os.path.join(folder, f"{model}_benchmark_log.csv"), "w") as file:
+                file.write(f"Metric Name,Prompt,Value,Elapsed Time\nCarbon Emissions (gCO2),hi,{co2},1.0\n")
+        result = self._run("rank", "--data", self._tmp.name)
+        self.assertEqual([row["model"] for row in result["chat_benchmark"]], ["small", "big"])
+        self.assertEqual(result["text_benchmark"], [])
+
+    @patch("ollama.chat")
+    def test_chat(self, mock_chat):
+        mock_chat.return_value = {"message": {"content": "Hello!"}}
+        result = self._run("chat", "--model", "llama3.2:1b", "--prompt", "Hi")
+        self.assertEqual(result["response"], "Hello!")
+        self.assertIn("Total Energy (J)", result["metrics"])
+
+    def test_prompts(self):
+        out = os.path.join(self._tmp.name, "bundle")
+        result = self._run("prompts", "--suite", "code", "--out", out)
+        self.assertEqual(result["prompts"], 10)
+        self.assertEqual(os.listdir(out), ["code-generation-1000.prompts"])
+
+    def test_resume_before_or_after_command(self):
+        self.assertTrue(parse_args(["--resume", "bench", "--model", "x"]).resume)
+        self.assertTrue(parse_args(["bench", "--model", "x", "--resume"]).resume)
+        self.assertFalse(parse_args(["bench", "--model", "x"]).resume)
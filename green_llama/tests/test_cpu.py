@@ -1,6 +1,7 @@
 import os
 import sys
 import unittest
+from collections import namedtuple
 from unittest import mock
 
 from codecarbon import EmissionsTracker
@@ -41,3 +42,16 @@ class TestCPUHardware(unittest.TestCase):
         # Test CPU details retrieval
         cpu_power = self.cpu.get_power()
         self.assertGreater(cpu_power, 0.0, "CPU power should be greater than 0.")
+
+    def test_instances_keep_separate_windows(self):
+        # Reads on one instance must not reset the window another is measuring
+        times = lambda busy, idle: namedtuple("scputimes", "user idle")(busy, idle)
+        with mock.patch("green_llama.metrics.hardware.psutil") as fake:
+            fake.cpu_count.return_value = 1
+            fake.cpu_times.return_value = times(0.0, 0.0)
+            first, second = CPU(), CPU()
+            fake.cpu_times.return_value = times(1.0, 1.0)
+            self.assertAlmostEqual(first.get_power(interval=None), 4.0)
+            fake.cpu_times.return_value = times(1.0, 2.0)
+            self.assertAlmostEqual(first.get_power(interval=None), 0.0)
+            self.assertAlmostEqual(second.get_power(interval=None), 8 / 3)
@@ -1,5 +1,11 @@
+import dataclasses
+import time
 import unittest
 from unittest.mock import patch, MagicMock
+from green_llama.metrics.energy_tracker import EnergyTracker
+from green_llama.metrics.fake_hardware import fake_hardware
+from green_llama.metrics.registry import get_hardware, reset_hardware
+from green_llama.metrics.sampler import PowerSampler
 from green_llama.metrics.metrics import (
     measure_cpu_energy,
     measure_gpu_energy,
@@ -7,6 +13,8 @@ from green_llama.metrics.metrics import (
     measure_total_energy,
     measure_emissions,
     measure_all_metrics,
+    stream_all,
+    token_metrics,
 )
 
 
@@ -116,3 +124,127 @@ class TestMetricsDecorators(unittest.TestCase):
         self.assertEqual(metrics["Total Energy (J)"], 35.0)
         self.assertEqual(metrics["Carbon Emissions (gCO2)"], 8.0)
         self.assertGreater(metrics["elapsed_time"], 0)
+
+
+class TestTrackerLifecycle(unittest.TestCase):
+    def setUp(self):
+        hardware = fake_hardware()
+        self.probes = [hardware.cpu.get_power, hardware.gpu.get_device_powers, hardware.ram.get_power]
+        patcher = patch("green_llama.metrics.energy_tracker.get_hardware", return_value=hardware)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reads(self):
+        return [probe.call_count for probe in self.probes]
+
+    def test_stop_is_idempotent(self):
+        tracker = EnergyTracker(measure_interval=3600)
+
+        with tracker:
+            pass
+        reads = self._reads()
+        energy = tracker.stop()
+
+        self.assertIs(tracker.stop(), energy)
+        self.assertEqual(self._reads(), reads, "Repeated stop() calls should not sample the hardware.")
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            energy.cpu = 0.0
+
+    def test_decorators_stop_sampler_once(self):
+        decorators = (
+            measure_cpu_energy, measure_gpu_energy, measure_ram_energy,
+            measure_total_energy, measure_emissions, measure_all_metrics,
+        )
+        for decorator in decorators:
+            with self.subTest(decorator=decorator.__name__), \
+                    patch.object(PowerSampler, "stop", autospec=True, side_effect=PowerSampler.stop) as stop:
+                @decorator
+                def dummy_function():
+                    return "Lifecycle Test"
+
+                dummy_function()
+                self.assertEqual(stop.call_count, 1)
+
+    def test_measure_all_metrics_single_snapshot(self):
+
+        @measure_all_metrics
+        def dummy_function():
+            return "Snapshot Test"
+
+        _, metrics = dummy_function()
+        # Every component comes from the same snapshot, so the ratios are exact
+        self.assertAlmostEqual(metrics["GPU Energy (J)"], 2 * metrics["CPU Energy (J)"])
+        self.assertAlmostEqual(metrics["CPU Energy (J)"], 2 * metrics["RAM Energy (J)"])
+        self.assertAlmostEqual(
+            metrics["Total Energy (J)"],
+            metrics["CPU Energy (J)"] + metrics["GPU Energy (J)"] + metrics["RAM Energy (J)"],
+        )
+        for probe in self.probes:
+            self.assertEqual(probe.call_count, 2, "Expected one start and one final reading per probe.")
+
+
+class TestHardwareRegistry(unittest.TestCase):
+    def test_trackers_share_hardware(self):
+        first, second = EnergyTracker(), EnergyTracker()
+        self.assertIs(first.cpu, second.cpu)
+        self.assertIs(first.gpu, second.gpu)
+        self.assertIs(first.ram, second.ram)
+
+    @patch("green_llama.metrics.registry.GPU")
+    def test_reset_shuts_down_gpu(self, mock_gpu):
+        reset_hardware()
+        hardware = get_hardware()
+        self.assertIs(get_hardware(), hardware)
+        reset_hardware()
+        mock_gpu.return_value.shutdown.assert_called_once()
+        self.assertEqual(mock_gpu.call_count, 1)
+
+
+class TestStreaming(unittest.TestCase):
+    @patch("ollama.chat")
+    def test_stream_all(self, mock_chat):
+        def chunks(**kwargs):
+            self.assertTrue(kwargs["stream"])
+            for token in ["Hello", " there", "!"]:
+                time.sleep(0.02)
+                yield {"message": {"role": "assistant", "content": token}, "done": False}
+            yield {"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 3}
+
+        mock_chat.side_effect = chunks
+        tokens = []
+        response, metrics = stream_all("model", "prompt", on_token=tokens.append)
+
+        self.assertEqual(tokens, ["Hello", " there", "!"])
+        self.assertEqual(response["message"]["content"], "Hello there!")
+        self.assertEqual(response["eval_count"], 3)
+        self.assertGreater(metrics["Time to First Token (s)"], 0.0)
+        self.assertLess(metrics["Time to First Token (s)"], metrics["elapsed_time"])
+        self.assertGreaterEqual(metrics["Inter-token Latency p95 (s)"], metrics["Inter-token Latency p50 (s)"])
+        self.assertGreater(metrics["Decode Throughput (tokens/s)"], 0.0)
+        self.assertAlmostEqual(
+            metrics["Prefill Energy (J)"] + metrics["Decode Energy (J)"], metrics["Total Energy (J)"]
+        )
+
+
+class TestTokenMetrics(unittest.TestCase):
+    def test_token_metrics(self):
+        response = {
+            "message": {"role": "assistant", "content": "..."},
+            "prompt_eval_count": 20,
+            "prompt_eval_duration": 500_000_000,
+            "eval_count": 100,
+            "eval_duration": 2_000_000_000,
+            "load_duration": 1_500_000_000,
+        }
+        metrics = token_metrics(response, total_energy=50.0, emissions=0.2)
+        self.assertEqual(metrics["Prompt Tokens"], 20)
+        self.assertEqual(metrics["Generated Tokens"], 100)
+        self.assertEqual(metrics["Tokens/s"], 50.0)
+        self.assertEqual(metrics["Energy per Token (J/token)"], 0.5)
+        self.assertAlmostEqual(metrics["gCO2 per 1k Tokens"], 2.0)
+        self.assertEqual(metrics["Load Time (s)"], 1.5)
+        self.assertEqual(metrics["Generation Time (s)"], 2.5)
+
+    def test_no_counters(self):
+        self.assertEqual(token_metrics("text", 1.0, 1.0), {})
+        self.assertEqual(token_metrics({"message": {}}, 1.0, 1.0), {})
@@ -0,0 +1,71 @@
+import time
+import unittest
+import urllib.request
+from unittest.mock import patch
+from green_llama.metrics import exporter
+from green_llama.metrics.energy_tracker import EnergyTracker
+from green_llama.metrics.fake_hardware import fake_hardware
+
+METRICS = {
+    "CPU Energy (J)": 2.0,
+    "GPU Energy (J)": 6.0,
+    "RAM Energy (J)": 1.0,
+    "Net Energy (J)": 4.0,
+    "Carbon Emissions (gCO2)": 0.5,
+    "Generated Tokens": 40,
+    "Tokens/s": 25.0,
+    "Time to First Token (s)": 0.3,
+    "elapsed_time": 1.8,
+}
+
+
+class TestExporter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = exporter.start_exporter(port=0)
+        self.addCleanup(exporter.stop_exporter, self.server)
+
+    def scrape(self):
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            return response.read().decode()
+
+    def test_requests_are_aggregated(self):
+        exporter.observe(METRICS, "llama3.2:1b")
+        exporter.observe({**METRICS, "elapsed_time": 40.0}, "llama3.2:1b")
+        body = self.scrape()
+        self.assertIn('green_llama_energy_joules_total{model="llama3.2:1b",component="gpu"} 12.0', body)
+        self.assertIn('green_llama_requests_total{model="llama3.2:1b"} 2', body)
+        self.assertIn('green_llama_generated_tokens_total{model="llama3.2:1b"} 80', body)
+        self.assertIn('green_llama_request_duration_seconds_bucket{model="llama3.2:1b",le="2.5"} 1', body)
+        self.assertIn('green_llama_request_duration_seconds_bucket{model="llama3.2:1b",le="+Inf"} 2', body)
+        self.assertIn('green_llama_request_duration_seconds_sum{model="llama3.2:1b"} 41.8', body)
+        self.assertIn("# TYPE green_llama_time_to_first_token_seconds histogram", body)
+
+    def test_power_comes_from_tracker_samples(self):
+        hardware = fake_hardware()
+        with patch("green_llama.metrics.energy_tracker.get_hardware", return_value=hardware):
+            with EnergyTracker(measure_interval=3600):
+                reads = hardware.gpu.get_device_powers.call_count
+                body = self.scrape()
+                self.assertEqual(hardware.gpu.get_device_powers.call_count, reads,
+                                 "Scrapes must not read the hardware.")
+        self.assertIn('green_llama_power_watts{channel="gpu0"} 20.0', body)
+        self.assertNotIn('green_llama_power_watts{channel="gpu0"}', self.scrape(),
+                         "Power must not be reported once the tracker stops.")
+
+    def test_measured_requests_are_observed(self):
+        from green_llama.metrics.metrics import test_all
+
+        with patch("green_llama.metrics.metrics.chat", return_value={"message": {"content": "ok"}}):
+            test_all("llama3.2:1b", "Hello")
+        self.assertIn('green_llama_requests_total{model="llama3.2:1b"} 1', self.scrape())
+
+    def test_off_by_default(self):
+        exporter.stop_exporter(self.server)
+        self.assertIsNone(exporter.get_telemetry())
+        exporter.observe(METRICS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
+import time
 import unittest
 from unittest import mock
 from green_llama.metrics.hardware import GPU
 from green_llama.metrics.energy_tracker import EnergyTracker
+from green_llama.metrics.fake_nvml import FakeNVML
+from green_llama.metrics.registry import HardwareRegistry
 from codecarbon import EmissionsTracker
 
 
@@ -35,3 +38,43 @@ class TestGPUHardware(unittest.TestCase):
             self.assertGreaterEqual(gpu_power, 0.0, "GPU power should be >= 0.")
         else:
             self.skipTest("No GPU available on this system.")
+
+
+class TestMultiGPU(unittest.TestCase):
+    def setUp(self) -> None:
+        self.nvml = FakeNVML(powers=[100.0, 250.0, 50.0], processes={1: [4242]})
+        self.hardware = HardwareRegistry(nvml=self.nvml)
+
+    def test_enumerates_all_devices(self):
+        gpu = self.hardware.gpu
+        self.assertEqual(gpu.devices, [0, 1, 2])
+        self.assertEqual(gpu.get_device_powers(), [100.0, 250.0, 50.0])
+        self.assertEqual(gpu.get_power(), 400.0)
+        self.assertEqual(gpu.get_power(devices=[0, 2]), 150.0)
+
+    def test_per_device_energy(self):
+        tracker = EnergyTracker(measure_interval=0.01, hardware=self.hardware)
+        with tracker:
+            time.sleep(0.1)
+        energy = tracker.stop()
+        self.assertEqual(sorted(energy.gpu_devices), [0, 1, 2])
+        self.assertAlmostEqual(energy.gpu, sum(energy.gpu_devices.values()))
+        self.assertAlmostEqual(energy.gpu_devices[1], 2.5 * energy.gpu_devices[0])
+        self.assertAlmostEqual(energy.total, energy.cpu + energy.gpu + energy.ram)
+
+    def test_restrict_to_devices(self):
+        tracker = EnergyTracker(hardware=self.hardware, gpu_devices=[2, 7])
+        self.assertEqual(tracker.gpu_devices, [2])
+        with tracker:
+            pass
+        self.assertEqual(list(tracker.stop().gpu_devices), [2])
+
+    @mock.patch("green_llama.metrics.energy_tracker.find_ollama_pids", return_value=[4242])
+    def test_restrict_to_ollama_devices(self, _):
+        tracker = EnergyTracker(hardware=self.hardware, gpu_devices="ollama")
+        self.assertEqual(tracker.gpu_devices, [1])
+
+    def test_shutdown(self):
+        self.hardware.shutdown()
+        self.assertFalse(self.nvml.initialized)
+        self.assertEqual(self.hardware.gpu.get_power(), 0.0)
@@ -0,0 +1,67 @@
+import re
+import subprocess
+import sys
+import unittest
+
+# Everything the interactive startup and the batch CLI import before doing any work
+STARTUP_MODULES = [
+    "green_llama.__main__",
+    "green_llama.backends",
+    "green_llama.cli",
+    "green_llama.benchmark",
+    "green_llama.interface",
+    "green_llama.models",
+    "green_llama.monitoring",
+    "green_llama.utils",
+]
+
+# Only loaded once a feature needs them
+HEAVY_MODULES = ["matplotlib", "datasets", "ollama", "requests", "pyfiglet", "httpx"]
+
+# Startup takes about 0.25 s on a laptop, so the budget leaves a 4x margin for
+# slow CI machines while the heavy modules alone would still take well over it
+IMPORT_BUDGET = 1.0
+# The fastest of this many interpreter starts is compared, so one cold cache
+# or busy moment doesn't fail the test
+IMPORT_RUNS = 3
+
+
+def import_profile(modules):
+    """(depth, module, cumulative seconds) of every module loaded while importing `modules`"""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True
+    )
+    profile = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | module, indented two spaces per nesting level
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if match:
+            profile.append((len(match.group(2)) // 2, match.group(3), int(match.group(1)) / 1e6))
+    return profile
+
+
+class TestImportTime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.profile = import_profile(STARTUP_MODULES)
+
+    def test_heavy_modules_are_lazy(self):
+        loaded = {module.split(".")[0] for _, module, _ in self.profile}
+        self.assertIn("green_llama", loaded)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, loaded, f"{module} is imported at startup")
+
+    def test_startup_budget(self):
+        # Outermost green_llama imports include everything they pull in
+        startup_times = [
+            sum(seconds for depth, module, seconds in profile if depth == 0 and module.split(".")[0] == "green_llama")
+            for profile in [self.profile] + [import_profile(STARTUP_MODULES) for _ in range(IMPORT_RUNS - 1)]
+        ]
+        self.assertGreater(min(startup_times), 0.0)
+        self.assertLess(min(startup_times), IMPORT_BUDGET, startup_times)
+
+
+if __name__ == "__main__":
+    unittest.main()
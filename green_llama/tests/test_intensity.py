@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from green_llama.metrics.emissions import EmissionsTracker
+from green_llama.metrics.intensity import IntensityProvider, co2_signal_fetcher
+
+
+class StubCO2Signal(BaseHTTPRequestHandler):
+    """Serves CO2 Signal style responses from the server's intensities, per country."""
+
+    def do_GET(self):
+        country = parse_qs(urlparse(self.path).query)["countryCode"][0]
+        self.server.requests.append((country, self.headers["auth-token"]))
+        time.sleep(self.server.delay)
+        body = json.dumps({"data": {"carbonIntensity": self.server.intensities[country]}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestIntensityProvider(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "carbon_intensity.json")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubCO2Signal)
+        self.server.intensities = {"NLD": 300.0}
+        self.server.requests = []
+        self.server.delay = 0.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/latest"
+
+    def provider(self, ttl=60):
+        return IntensityProvider(co2_signal_fetcher("token", url=self.url), ttl=ttl, path=self.path)
+
+    def test_never_blocks_on_the_network(self):
+        self.server.delay = 0.3
+        provider = self.provider()
+        tracker = EmissionsTracker("NLD", provider=provider)
+        start = time.perf_counter()
+        # Static table until the first fetch lands, then the live value from the cache
+        self.assertEqual(tracker.get_carbon_intensity(), 375.0)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        provider.wait()
+        self.assertEqual(tracker.get_carbon_intensity(), 300.0)
+        self.assertEqual(tracker.get_carbon_intensity(), 300.0)
+        self.assertEqual(self.server.requests, [("NLD", "token")])
+
+    def test_stale_values_refresh_in_background(self):
+        provider = self.provider(ttl=0)
+        provider.refresh("NLD")
+        self.server.intensities["NLD"] = 250.0
+        self.assertEqual(provider.get("NLD"), 300.0)
+        provider.wait()
+        self.assertEqual(provider.get("NLD"), 250.0)
+
+    def test_last_value_persists_for_offline_runs(self):
+        self.provider().refresh("NLD")
+        offline = IntensityProvider(co2_signal_fetcher("token", url="http://127.0.0.1:9/v1/latest", timeout=0.5),
+                                    ttl=0, path=self.path)
+        self.assertEqual(offline.get("NLD"), 300.0)
+        offline.wait()
+        self.assertIsNotNone(offline.last_error)
+        self.assertEqual(offline.get("NLD"), 300.0)
+
+    def test_failed_fetch_waits_before_retrying(self):
+        calls = []
+
+        def failing_fetch(country_iso_code):
+            calls.append(country_iso_code)
+            raise OSError("offline")
+
+        provider = IntensityProvider(failing_fetch, ttl=0, path=self.path, retry=3600)
+        self.assertIsNone(provider.get("NLD"))
+        provider.wait()
+        self.assertIsNone(provider.get("NLD"))
+        provider.wait()
+        self.assertEqual(calls, ["NLD"])
+        provider.retry = 0
+        provider.get("NLD")
+        provider.wait()
+        self.assertEqual(calls, ["NLD", "NLD"])
+
+
+if __name__ == "__main__":
+    unittest.main()
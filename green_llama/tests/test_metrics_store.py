@@ -0,0 +1,102 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from green_llama.benchmark import save_logs
+from green_llama.metrics_store import BufferedWriter, MetricsStore, storage_records
+from green_llama.rank_index import RankIndex
+
+
+def storage(*runs):
+    """metrics_storage of (prompt, elapsed_time, {metric: value}) runs"""
+    metrics_storage = {}
+    for prompt, elapsed_time, metrics in runs:
+        for metric_name, value in metrics.items():
+            data = metrics_storage.setdefault(metric_name, {"prompts": [], "values": [], "times": []})
+            data["prompts"].append(prompt)
+            data["values"].append(value)
+            data["times"].append(elapsed_time)
+    return metrics_storage
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return [(row["Metric Name"], row["Prompt"], float(row["Value"])) for row in csv.DictReader(file)]
+
+
+class TestMetricsStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.store = MetricsStore(os.path.join(self._tmp.name, "store"))
+
+    def test_storage_records(self):
+        runs = [("hi", 1.0, {"A": 1.0, "B": 2.0}), ("hi", 1.5, {"A": 3.0}), ("bye", 2.0, {"B": 4.0})]
+        self.assertEqual(storage_records(storage(*runs)), [runs[0], runs[1], runs[2]])
+
+    def test_append_and_read(self):
+        self.store.append_storage(storage(("hi", 1.0, {"A": 1.0}), ("bye", 2.0, {"A": 2.0})), "r1", "m1", "chat")
+        self.store.append_storage(storage(("hi", 3.0, {"A": 5.0, "B": 7.0})), "r2", "m2", "chat")
+
+        data = self.store.read()
+        self.assertEqual(data["run_id"].tolist(), ["r1", "r1", "r2"])
+        self.assertEqual(data["A"].tolist(), [1.0, 2.0, 5.0])
+        self.assertTrue(np.isnan(data["B"][:2]).all(), "Metrics a batch lacks read as NaN.")
+        self.assertEqual(self.store.read(["A"], model="m2")["A"].tolist(), [5.0])
+        self.assertEqual(self.store.count(benchmark="chat"), 3)
+        self.assertEqual(self.store.count(benchmark="code"), 0)
+
+    def test_prompts_are_interned(self):
+        self.store.append_storage(storage(("same prompt", 1.0, {"A": 1.0}), ("same prompt", 2.0, {"A": 2.0})),
+                                  "r1", "m", "chat")
+        self.store.append_storage(storage(("same prompt", 3.0, {"A": 3.0})), "r2", "m", "chat")
+        with open(self.store.prompts_path, encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 1)
+        reopened = MetricsStore(self.store.root)
+        digest = reopened.read(["prompt_hash"])["prompt_hash"][0].decode("ascii")
+        self.assertEqual(reopened.prompts[digest], "same prompt")
+
+    def test_buffered_writer_batches(self):
+        with BufferedWriter(self.store, batch_size=2, run_id="r", model="m", benchmark="monitoring") as writer:
+            for index in range(5):
+                writer.add({"prompt": "", "elapsed_time": 0.1, "metrics": {"A": float(index)}})
+            self.assertEqual(len(self.store.segments()), 2)
+        self.assertEqual(len(self.store.segments()), 3)
+        self.assertEqual(self.store.read(["A"])["A"].tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_monitoring_runs_are_per_model(self):
+        from green_llama import utils
+
+        with patch.object(utils, "_monitoring_writer", BufferedWriter(self.store, benchmark="monitoring")), \
+                patch.dict(utils._monitoring_run_ids, clear=True):
+            utils.record_monitoring_metric("A", 1.0, 0.1, "first")
+            utils.record_monitoring_metric("A", 2.0, 0.1, "second")
+            utils._monitoring_writer.flush()
+        run_ids = self.store.read(["run_id"])["run_id"].tolist()
+        self.assertEqual([run_id.split("-")[2] for run_id in run_ids], ["first", "second"])
+
+    def test_save_logs_exports_history(self):
+        results_dir = os.path.join(self._tmp.name, "results")
+        log = os.path.join(results_dir, "chat_benchmark", "m_benchmark_log.csv")
+        os.makedirs(os.path.dirname(log))
+        with open(log, "w", newline="") as file:
+            file.write("Metric Name,Prompt,Value,Elapsed Time\nA,old,9.0,1.0\n")
+
+        path = save_logs(storage(("new", 2.0, {"A": 1.0, "B": 2.0})), "m", "chat_benchmark",
+                         results_dir=results_dir, store=self.store)
+        self.assertEqual(path, log)
+        # Rows logged before the store existed are imported once, not duplicated
+        save_logs(storage(("newer", 3.0, {"A": 3.0})), "m", "chat_benchmark", results_dir=results_dir,
+                  store=self.store)
+        self.assertEqual(read_csv(log), [("A", "old", 9.0), ("A", "new", 1.0), ("A", "newer", 3.0), ("B", "new", 2.0)])
+        # The rank index lives next to the store, not in the working directory
+        index = RankIndex.of_store(self.store)
+        self.assertTrue(os.path.exists(index.path))
+        self.assertEqual(index.entry(log, "chat_benchmark", "m")["metrics"],
+                         {"A": [3, 13.0, 91.0], "B": [1, 2.0, 4.0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import psutil
+from green_llama import models
+from green_llama.monitoring import flops_metrics, monitor_cpu_usage
+
+
+SHOW_RESPONSE = {
+    "details": {"parameter_size": "1.2B", "quantization_level": "Q8_0"},
+    "modelinfo": {
+        "general.architecture": "llama",
+        "general.parameter_count": 1_000_000_000,
+        "llama.context_length": 131072,
+    },
+}
+
+RESPONSE = {
+    "prompt_eval_count": 10,
+    "prompt_eval_duration": 100_000_000,
+    "eval_count": 40,
+    "eval_duration": 900_000_000,
+}
+
+
+class TestFlopsEstimator(unittest.TestCase):
+    def setUp(self) -> None:
+        models.clear_model_info_cache()
+        self.addCleanup(models.clear_model_info_cache)
+
+    @patch("ollama.show")
+    def test_model_info_is_cached(self, mock_show):
+        mock_show.return_value = SHOW_RESPONSE
+        info = models.model_info("llama3.2:1b")
+        self.assertEqual(info, models.ModelInfo(1e9, "Q8_0", 131072))
+        models.model_info("llama3.2:1b")
+        mock_show.assert_called_once_with("llama3.2:1b")
+
+    @patch("ollama.show")
+    def test_failures_are_not_cached(self, mock_show):
+        mock_show.side_effect = [ConnectionError("ollama is down"), SHOW_RESPONSE]
+        self.assertIsNone(models.model_info("llama3.2:1b"))
+        self.assertEqual(models.model_info("llama3.2:1b").parameters, 1e9)
+
+    def test_parse_parameter_size(self):
+        self.assertEqual(models.parse_parameter_size("1.2B"), 1.2e9)
+        self.assertEqual(models.parse_parameter_size("137M"), 137e6)
+        self.assertIsNone(models.parse_parameter_size("unknown"))
+
+    @patch("ollama.show")
+    def test_flops_metrics(self, mock_show):
+        mock_show.return_value = {"details": {"parameter_size": "1B"}, "modelinfo": {}}
+        metrics = flops_metrics("model", RESPONSE, total_energy=10.0, elapsed_time=2.0)
+        self.assertEqual(metrics["Estimated FLOPs"], 2 * 1e9 * 50)
+        self.assertAlmostEqual(metrics["Achieved FLOP/s"], 1e11)
+        self.assertAlmostEqual(metrics["Prefill FLOP/s"], 2e11)
+        self.assertAlmostEqual(metrics["FLOPs per Joule"], 1e10)
+
+    @patch("ollama.show")
+    def test_missing_metadata(self, mock_show):
+        mock_show.side_effect = RuntimeError("model not found")
+        self.assertEqual(flops_metrics("model", RESPONSE, 10.0, 2.0), {})
+
+
+class TestMonitorCpuUsage(unittest.TestCase):
+    def test_process_gone_before_priming(self):
+        gone = MagicMock()
+        gone.cpu_percent.side_effect = psutil.NoSuchProcess(4242)
+        alive = MagicMock()
+        alive.cpu_percent.return_value = 50.0
+        stop_event, readings = threading.Event(), []
+        thread = threading.Thread(target=monitor_cpu_usage, args=(stop_event, readings, [gone, alive]))
+        thread.start()
+        time.sleep(0.25)
+        stop_event.set()
+        thread.join()
+        self.assertTrue(readings)
+        self.assertEqual(readings[0], 50.0 / psutil.cpu_count())
@@ -0,0 +1,79 @@
+import os
+import statistics
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from green_llama.backends import SyntheticBackend, set_backend
+from green_llama.benchmark import run_prompts
+from green_llama.metrics import metrics as measured
+from green_llama.metrics.overhead import (
+    OVERHEAD_BUDGET, OVERHEAD_METRICS, disable_profiling, enable_profiling, get_profile
+)
+from green_llama.metrics.sampler import PowerSampler
+
+
+class TestOverhead(unittest.TestCase):
+    def setUp(self) -> None:
+        # 40 tokens at 200 tokens/s, a 0.2 s request
+        set_backend(SyntheticBackend(rate=200, tokens=40))
+        self.addCleanup(set_backend, None)
+        self.addCleanup(disable_profiling)
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {"GREEN_LLAMA_CACHE": self._tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_off_by_default(self):
+        _, metrics = measured.test_all("llama3.2:1b", "Hello")
+        self.assertIsNone(get_profile())
+        self.assertFalse(set(OVERHEAD_METRICS) & set(metrics))
+
+    def test_phases_are_profiled(self):
+        profile = enable_profiling()
+        _, metrics = measured.test_all("llama3.2:1b", "Hello")
+        _, streaming_metrics = measured.stream_all("llama3.2:1b", "Hello")
+        for metric_name in OVERHEAD_METRICS:
+            self.assertGreaterEqual(metrics[metric_name], 0.0)
+            self.assertGreaterEqual(streaming_metrics[metric_name], 0.0)
+        report = profile.report()
+        self.assertEqual(report["tracker setup"]["count"], 2)
+        self.assertEqual(report["snapshot"]["count"], 2)
+        self.assertEqual(set(report), {"tracker setup", "tracker start", "tracker stop", "snapshot", "metrics"})
+
+    def test_sampler_cpu_time(self):
+        def busy_read():
+            deadline = time.thread_time() + 0.002
+            while time.thread_time() < deadline:
+                pass
+            return (1.0,)
+
+        sampler = PowerSampler(busy_read, ("a",), interval=0.01)
+        sampler.start()
+        time.sleep(0.1)
+        sampler.stop()
+        self.assertGreater(sampler.cpu_time(), 0.01)
+        self.assertLess(sampler.cpu_time(), 0.1)
+
+    def test_overhead_budget(self):
+        """Instrumentation changes must keep the measurement overhead within budget.
+
+        The budget is checked against CPU time, which a busy CI machine doesn't
+        inflate the way it stretches wall-clock phases, on 0.5 s requests so
+        the fixed per-request cost is a realistic share. The median is about
+        1% on a laptop, leaving OVERHEAD_BUDGET a 5x margin.
+        """
+        # 100 tokens at 200 tokens/s
+        set_backend(SyntheticBackend(rate=200, tokens=100))
+        enable_profiling()
+        results = [metrics for _, metrics in
+                   run_prompts("llama3.2:1b", [f"Prompt {index}" for index in range(4)], concurrency=2)]
+        results += [measured.test_all("llama3.2:1b", "Hello")[1] for _ in range(2)]
+        results += [measured.stream_all("llama3.2:1b", "Hello")[1] for _ in range(2)]
+        overheads = [metrics["Instrumentation CPU Time (s)"] * 100 / metrics["elapsed_time"] for metrics in results]
+        self.assertLess(statistics.median(overheads), OVERHEAD_BUDGET, overheads)
+
+
+if __name__ == "__main__":
+    unittest.main()
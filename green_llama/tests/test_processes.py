@@ -0,0 +1,47 @@
+import multiprocessing
+import time
+import unittest
+import psutil
+from green_llama.metrics.processes import ProcessAttribution
+from green_llama.metrics.energy_tracker import EnergyTracker
+
+
+def _burn(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProcessAttribution(unittest.TestCase):
+    def setUp(self) -> None:
+        self.worker = multiprocessing.Process(target=_burn, args=(0.5,))
+        self.worker.start()
+        self.addCleanup(self.worker.join)
+        self.process = psutil.Process(self.worker.pid)
+
+    def test_shares_are_bounded(self):
+        attribution = ProcessAttribution(find_processes=lambda: [self.process])
+        attribution.start()
+        time.sleep(0.3)
+        breakdown = attribution.stop(cpu_energy=100.0, ram_energy=10.0)
+
+        share = breakdown[self.worker.pid]
+        self.assertGreater(share.cpu_time, 0.0)
+        self.assertGreater(share.cpu, 0.0)
+        self.assertLessEqual(share.cpu, 100.0)
+        self.assertGreater(share.ram, 0.0)
+        self.assertLess(share.ram, 10.0)
+
+    def test_tracker_process_mode(self):
+        tracker = EnergyTracker(energy_source="heuristic", attribution="process")
+        tracker.attribution.find_processes = lambda: [self.process]
+        with tracker:
+            time.sleep(0.3)
+        energy = tracker.stop()
+        self.assertEqual(list(energy.processes), [self.worker.pid])
+        self.assertAlmostEqual(energy.cpu, energy.processes[self.worker.pid].cpu)
+        self.assertAlmostEqual(energy.total, energy.cpu + energy.gpu + energy.ram)
+
+    def test_unknown_attribution(self):
+        with self.assertRaises(ValueError):
+            EnergyTracker(attribution="container")
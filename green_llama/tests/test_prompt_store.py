@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from green_llama import prompt_store
+
+
+class TestPromptStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {"GREEN_LLAMA_CACHE": self._tmp.name, "GREEN_LLAMA_PROMPTS": ""})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        prompts = ["first prompt", "naïve café ☕", "", "a" * 1000]
+        path = prompt_store.write_store(os.path.join(self._tmp.name, "t.prompts"), "text-generation", prompts)
+        store = prompt_store.PromptStore(path)
+        self.addCleanup(store.close)
+        self.assertEqual(list(store), prompts)
+        self.assertEqual(store[-1], prompts[-1])
+        self.assertEqual(store[1:3], prompts[1:3])
+        self.assertEqual(store.lengths.tolist(), [len(prompt) for prompt in prompts])
+        self.assertEqual(store.sha256, prompt_store.content_hash(prompts))
+
+    def test_materialized_once(self):
+        with patch.object(prompt_store, "build_prompts", wraps=prompt_store.build_prompts) as build:
+            first = prompt_store.load_prompts("code-generation")
+            second = prompt_store.load_prompts("code-generation")
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(list(second), prompt_store.CODE_PROMPTS)
+
+    def test_offline_bundle(self):
+        bundle = os.path.join(self._tmp.name, "bundle")
+        name = prompt_store.store_name("text-generation", 1000)
+        prompt_store.write_store(os.path.join(bundle, name), "text-generation", ["bundled prompt"])
+        with patch.dict(os.environ, {"GREEN_LLAMA_PROMPTS": bundle}), \
+                patch.object(prompt_store, "build_prompts", side_effect=AssertionError("should not build")):
+            store = prompt_store.load_prompts("text-generation")
+        self.addCleanup(store.close)
+        self.assertEqual(list(store), ["bundled prompt"])
+
+    def test_export_for_offline_use(self):
+        bundle = os.path.join(self._tmp.name, "bundle")
+        path, sha256, count = prompt_store.export_store("chat-testing", bundle)
+        self.assertEqual(path, os.path.join(bundle, prompt_store.store_name("chat-testing", 1000)))
+        self.assertEqual((sha256, count), (prompt_store.content_hash(prompt_store.CHAT_PROMPTS), 10))
+        with patch.dict(os.environ, {"GREEN_LLAMA_PROMPTS": bundle, "GREEN_LLAMA_CACHE": os.path.join(bundle, "x")}), \
+                patch.object(prompt_store, "build_prompts", side_effect=AssertionError("should not build")):
+            store = prompt_store.load_prompts("chat-testing")
+        self.addCleanup(store.close)
+        self.assertEqual(store.path, path)
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self._tmp.name, "bogus.prompts")
+        with open(path, "wb") as file:
+            file.write(b"not a prompt store at all")
+        with self.assertRaises(ValueError):
+            prompt_store.PromptStore(path)
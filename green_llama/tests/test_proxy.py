@@ -0,0 +1,167 @@
+import asyncio
+import csv
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from green_llama.metrics_store import MetricsStore
+from green_llama.proxy import MeteringProxy
+
+FINAL = {"done": True, "prompt_eval_count": 5, "prompt_eval_duration": 10 ** 7,
+         "eval_count": 3, "eval_duration": 3 * 10 ** 7, "load_duration": 10 ** 6}
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Answers chat and generate like Ollama, streaming one NDJSON line per token."""
+
+    protocol_version = "HTTP/1.1"
+    tokens = ["Hello", " there", "!"]
+
+    def do_GET(self):
+        self._send_json({"models": [{"model": "llama3.2:1b"}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        chat = self.path == "/api/chat"
+        if request["model"] == "missing":
+            self._send_json({"error": "model 'missing' not found"}, status=404)
+            return
+
+        def message(token, **fields):
+            body = {"message": {"role": "assistant", "content": token}} if chat else {"response": token}
+            return {"model": request["model"], **body, "done": False, **fields}
+
+        if not request.get("stream", True):
+            self._send_json(message("".join(self.tokens), **FINAL))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in self.tokens:
+            self._write_chunk(json.dumps(message(token)).encode() + b"\n")
+            time.sleep(0.01)
+        self._write_chunk(json.dumps(message("", **FINAL)).encode() + b"\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMeteringProxy(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = patch.dict(os.environ, {
+            "GREEN_LLAMA_CACHE": self._tmp.name, "GREEN_LLAMA_STORE": os.path.join(self._tmp.name, "store")
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.data_folder = os.path.join(self._tmp.name, "public")
+
+        self.upstream = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+        self.upstream.daemon_threads = True
+        threading.Thread(target=self.upstream.serve_forever, daemon=True).start()
+        self.addCleanup(self.upstream.server_close)
+        self.addCleanup(self.upstream.shutdown)
+
+        self.store = MetricsStore()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(self.loop_thread.join)
+        self.proxy = MeteringProxy(f"http://127.0.0.1:{self.upstream.server_address[1]}", port=0,
+                                   store=self.store, batch_size=2, data_folder=self.data_folder)
+        asyncio.run_coroutine_threadsafe(self.proxy.start(), self.loop).result(10)
+        self.closed = False
+        self.addCleanup(self.close)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                asyncio.run_coroutine_threadsafe(self.proxy.close(), self.loop).result(10)
+            finally:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def client(self):
+        import ollama
+        return ollama.Client(host=f"http://127.0.0.1:{self.proxy.port}")
+
+    def test_streams_are_forwarded_and_metered(self):
+        chunks = list(self.client().chat(model="llama3.2:1b", messages=[{"role": "user", "content": "Hi"}],
+                                         stream=True))
+        self.assertEqual("".join(chunk["message"]["content"] for chunk in chunks), "Hello there!")
+        response = self.client().generate(model="llama3.2:1b", prompt="Hey", stream=False)
+        self.assertEqual(response["response"], "Hello there!")
+        self.assertEqual(self.client().list()["models"][0]["model"], "llama3.2:1b")
+        self.close()
+
+        self.assertEqual(self.proxy.requests, 2)
+        self.assertEqual(self.store.count(model="llama3.2:1b", benchmark="model_history"), 2)
+        path = os.path.join(self.data_folder, "model_history", "llama3_2_1b_all_metrics.csv")
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        tokens = [row for row in rows if row["Metric Name"] == "Generated Tokens"]
+        self.assertEqual([(row["Prompt"], float(row["Value"])) for row in tokens], [("Hi", 3.0), ("Hey", 3.0)])
+        self.assertIn("Time to First Token (s)", {row["Metric Name"] for row in rows})
+        energy = [float(row["Value"]) for row in rows if row["Metric Name"] == "Total Energy (J)"]
+        self.assertTrue(all(joules >= 0 for joules in energy))
+
+    def test_concurrent_requests_get_their_own_record(self):
+        def ask(index):
+            chunks = self.client().chat(model="llama3.2:1b", messages=[{"role": "user", "content": f"Q{index}"}],
+                                        stream=True)
+            return "".join(chunk["message"]["content"] for chunk in chunks)
+
+        with ThreadPoolExecutor(4) as pool:
+            self.assertEqual(list(pool.map(ask, range(5))), ["Hello there!"] * 5)
+        self.close()
+        self.assertEqual(self.store.count(model="llama3.2:1b", benchmark="model_history"), 5)
+        self.assertEqual(self.proxy.attributor.active, 0)
+
+    def test_upstream_errors(self):
+        import ollama
+
+        with self.assertRaises(ollama.ResponseError) as context:
+            self.client().chat(model="missing", messages=[{"role": "user", "content": "Hi"}])
+        self.assertEqual(context.exception.status_code, 404)
+
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            down = MeteringProxy(f"http://127.0.0.1:{unused.getsockname()[1]}", port=0, store=self.store,
+                                 data_folder=self.data_folder)
+        asyncio.run_coroutine_threadsafe(down.start(), self.loop).result(10)
+        try:
+            with self.assertRaises(ollama.ResponseError) as context:
+                ollama.Client(host=f"http://127.0.0.1:{down.port}").chat(
+                    model="llama3.2:1b", messages=[{"role": "user", "content": "Hi"}])
+            self.assertEqual(context.exception.status_code, 502)
+        finally:
+            asyncio.run_coroutine_threadsafe(down.close(), self.loop).result(10)
+        self.close()
+        # Neither answer is a conversation worth recording
+        self.assertEqual((self.proxy.requests, down.requests), (0, 0))
+        self.assertEqual(down.attributor.active, 0)
+
+if __name__ == "__main__":
+    unittest.main()
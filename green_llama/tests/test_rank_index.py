@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from green_llama import rank_index
+from green_llama.benchmark import save_logs
+from green_llama.metrics_store import MetricsStore
+from green_llama.rank_index import RankIndex
+from green_llama.utils import model_rankings
+
+
+def write_log(path, co2_values):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write("Metric Name,Prompt,Value,Elapsed Time\n")
+        for value in co2_values:
+            file.write(f"Carbon Emissions (gCO2),hi,{value},1.0\n")
+
+
+class TestRankIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.data = os.path.join(self._tmp.name, "public")
+        self.folder = os.path.join(self.data, "benchmark_results", "chat_benchmark")
+        self.index_path = os.path.join(self._tmp.name, "rank_index.json")
+
+    def rankings(self):
+        return [(model, co2) for _, model, co2, _, _ in
+                model_rankings(self.data, RankIndex(self.index_path))["chat_benchmark"]]
+
+    def test_only_changed_logs_are_reparsed(self):
+        write_log(os.path.join(self.folder, "big_benchmark_log.csv"), [0.4, 0.6])
+        write_log(os.path.join(self.folder, "small_benchmark_log.csv"), [0.1])
+        with patch.object(rank_index, "read_sums_from_csv", wraps=rank_index.read_sums_from_csv) as read:
+            self.assertEqual(self.rankings(), [("small", 0.1), ("big", 0.5)])
+            self.assertEqual(read.call_count, 2)
+            # A new process loads the persisted index and reads nothing
+            self.assertEqual(self.rankings(), [("small", 0.1), ("big", 0.5)])
+            self.assertEqual(read.call_count, 2)
+            write_log(os.path.join(self.folder, "small_benchmark_log.csv"), [0.1, 0.3, 3.2])
+            self.assertEqual(self.rankings(), [("big", 0.5), ("small", 1.2)])
+            self.assertEqual(read.call_count, 3)
+
+    def test_writes_update_the_index(self):
+        store = MetricsStore(os.path.join(self._tmp.name, "store"))
+        metrics_storage = {"Carbon Emissions (gCO2)": {"prompts": ["a", "b"], "values": [1.0, 3.0], "times": [1.0, 2.0]}}
+        results_dir = os.path.join(self.data, "benchmark_results")
+        with patch.object(rank_index, "read_sums_from_csv") as read:
+            save_logs(metrics_storage, "llama3.2:1b", "chat_benchmark", results_dir=results_dir, store=store,
+                      index=RankIndex(self.index_path))
+            self.assertEqual(self.rankings(), [("llama3_2_1b", 2.0)])
+            # Later writes add the new results to the running sums instead of summing the history again
+            with patch.object(store, "sums", wraps=store.sums) as sums:
+                save_logs({"Carbon Emissions (gCO2)": {"prompts": ["c"], "values": [8.0], "times": [1.0]}},
+                          "llama3.2:1b", "chat_benchmark", results_dir=results_dir, store=store,
+                          index=RankIndex(self.index_path))
+            self.assertEqual(len(sums.call_args.args[0]), 1)
+            self.assertEqual(self.rankings(), [("llama3_2_1b", 4.0)])
+            read.assert_not_called()
+        entry = RankIndex(self.index_path).files[os.path.abspath(
+            os.path.join(results_dir, "chat_benchmark", "llama3_2_1b_benchmark_log.csv"))]
+        self.assertEqual(entry["metrics"], store.sums(model="llama3.2:1b", benchmark="chat_benchmark"))
+
+    def test_models_without_the_metric_come_last(self):
+        write_log(os.path.join(self.folder, "big_benchmark_log.csv"), [0.50, 0.52, 0.51])
+        write_log(os.path.join(self.folder, "small_benchmark_log.csv"), [0.10, 0.11, 0.12])
+        with open(os.path.join(self.folder, "energy_only_benchmark_log.csv"), "w") as file:
+            file.write("Metric Name,Prompt,Value,Elapsed Time\nTotal Energy (J),hi,5.0,1.0\n")
+        rankings = model_rankings(self.data, RankIndex(self.index_path))["chat_benchmark"]
+        self.assertEqual([(rank, model) for rank, model, *_ in rankings],
+                         [(1, "small"), (2, "big"), (None, "energy_only")])
+
+    def test_mean_and_std(self):
+        # 1.0, 3.0: count, sum, sum of squares
+        sums = [2, 4.0, 10.0]
+        self.assertEqual(rank_index.mean(sums), 2.0)
+        self.assertAlmostEqual(rank_index.std(sums), 2 ** 0.5)
+        self.assertIsNone(rank_index.std([1, 1.0, 1.0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import unittest
+from green_llama.metrics.fake_nvml import FakeNVML
+from green_llama.metrics.rapl import RaplCounters
+from green_llama.metrics.registry import HardwareRegistry
+from green_llama.metrics.energy_tracker import EnergyTracker
+
+
+class TestRaplCounters(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.root = self._tmp.name
+        self.package = self._zone("intel-rapl:0", "package-0", 1_000_000, 10_000_000)
+        self.core = self._zone("intel-rapl:0/intel-rapl:0:0", "core", 0, 10_000_000)
+        self.dram = self._zone("intel-rapl:0/intel-rapl:0:1", "dram", 500_000, 10_000_000)
+
+    def _zone(self, relative, name, energy, max_energy):
+        path = os.path.join(self.root, relative)
+        os.makedirs(path)
+        with open(os.path.join(path, "name"), "w") as file:
+            file.write(name + "\n")
+        with open(os.path.join(path, "max_energy_range_uj"), "w") as file:
+            file.write(f"{max_energy}\n")
+        self._set(path, energy)
+        return path
+
+    def _set(self, path, energy):
+        with open(os.path.join(path, "energy_uj"), "w") as file:
+            file.write(f"{energy}\n")
+
+    def test_discovers_package_and_dram(self):
+        counters = RaplCounters.discover(self.root)
+        self.assertEqual(counters.components, ("cpu", "ram"))
+        self.assertEqual(counters.read(), {"cpu": [1_000_000], "ram": [500_000]})
+
+    def test_skips_mmio_zones(self):
+        # Recent Intel CPUs expose the package a second time over MMIO
+        self._zone("intel-rapl-mmio:0", "package-0", 2_000_000, 10_000_000)
+        counters = RaplCounters.discover(self.root)
+        self.assertEqual(counters.read(), {"cpu": [1_000_000], "ram": [500_000]})
+
+    def test_energy_delta(self):
+        counters = RaplCounters.discover(self.root)
+        start = counters.read()
+        self._set(self.package, 4_000_000)
+        self._set(self.dram, 750_000)
+        self.assertEqual(counters.energy(start, counters.read()), {"cpu": 3.0, "ram": 0.25})
+
+    def test_counter_wraparound(self):
+        counters = RaplCounters.discover(self.root)
+        self._set(self.package, 9_500_000)
+        start = counters.read()
+        self._set(self.package, 500_000)
+        self.assertAlmostEqual(counters.energy(start, counters.read())["cpu"], 1.0)
+
+    def test_unavailable(self):
+        self.assertIsNone(RaplCounters.discover(os.path.join(self.root, "missing")))
+        os.remove(os.path.join(self.package, "energy_uj"))
+        self.assertIsNone(RaplCounters.discover(self.root))
+
+    def test_tracker_uses_counters(self):
+        hardware = HardwareRegistry(nvml=FakeNVML(powers=[100.0]), powercap_root=self.root)
+        tracker = EnergyTracker(hardware=hardware)
+        self.assertEqual(tracker.energy_source, "rapl")
+        self.assertEqual(tracker.channels, ("gpu0",))
+        with tracker:
+            self._set(self.package, 3_000_000)
+            self._set(self.dram, 1_500_000)
+            time.sleep(0.05)
+        energy = tracker.stop()
+        self.assertEqual(energy.cpu, 2.0)
+        self.assertEqual(energy.ram, 1.0)
+        self.assertGreater(energy.gpu, 0.0)
+
+    def test_tracker_heuristic_fallback(self):
+        hardware = HardwareRegistry(nvml=FakeNVML(), powercap_root=os.path.join(self.root, "missing"))
+        tracker = EnergyTracker(hardware=hardware)
+        self.assertEqual(tracker.energy_source, "heuristic")
+        self.assertEqual(tracker.channels, ("cpu", "ram"))
+        forced = EnergyTracker(hardware=HardwareRegistry(powercap_root=self.root), energy_source="heuristic")
+        self.assertEqual(forced.energy_source, "heuristic")
@@ -0,0 +1,67 @@
+import time
+import unittest
+from green_llama.metrics.sampler import PowerSampler
+
+
+class TestPowerSampler(unittest.TestCase):
+    def test_constant_power_energy(self):
+        # 10 W on one channel and 2 W on the other for ~0.3 s
+        sampler = PowerSampler(lambda: (10.0, 2.0), ("a", "b"), interval=0.01)
+        sampler.start()
+        time.sleep(0.3)
+        energy = sampler.stop()
+        self.assertAlmostEqual(energy["a"], 3.0, delta=0.5)
+        self.assertAlmostEqual(energy["b"] * 5, energy["a"], places=6)
+
+    def test_trapezoid_integration(self):
+        readings = iter([(0.0,), (10.0,)])
+        sampler = PowerSampler(lambda: next(readings), ("a",), interval=3600)
+        sampler.start()
+        sampler._record(sampler._last_time + 2.0, next(readings))
+        # Ramp from 0 W to 10 W over 2 s is 10 J
+        self.assertAlmostEqual(sampler._energy[0], 10.0)
+
+    def test_extrapolation_is_not_kept(self):
+        readings = iter([(10.0,), (0.0,)])
+        sampler = PowerSampler(lambda: next(readings), ("a",), interval=3600)
+        sampler.start()
+        start_time = sampler._last_time
+        # Holding 10 W for 2 s estimates 20 J, the trapezoid step down to 0 W is 10 J
+        self.assertAlmostEqual(sampler._energy_at(start_time + 2.0)["a"], 20.0)
+        sampler._record(start_time + 2.0, next(readings))
+        self.assertAlmostEqual(sampler._energy_at(start_time + 2.0)["a"], 10.0)
+
+    def test_ring_buffer_wraps(self):
+        sampler = PowerSampler(lambda: (1.0,), ("a",), interval=0.001, capacity=8)
+        sampler.start()
+        time.sleep(0.1)
+        sampler.stop()
+        samples = sampler.samples()
+        self.assertEqual(samples.shape, (8, 2))
+        self.assertTrue((samples[1:, 0] > samples[:-1, 0]).all(), "Samples should be oldest first.")
+
+    def test_stop_does_not_block(self):
+        calls = []
+
+        def slow_read():
+            calls.append(None)
+            if len(calls) > 2:
+                time.sleep(0.2)
+            return (1.0,)
+
+        sampler = PowerSampler(slow_read, ("a",), interval=0.01)
+        sampler.start()
+        time.sleep(0.05)
+        begin = time.perf_counter()
+        sampler.stop()
+        self.assertEqual(len(calls), 3)
+        self.assertLess(time.perf_counter() - begin, 0.01, "stop() should not wait on the hardware.")
+
+    def test_short_session_takes_final_reading(self):
+        readings = iter([(0.0,), (4.0,)])
+        sampler = PowerSampler(lambda: next(readings), ("a",), interval=3600)
+        sampler.start()
+        time.sleep(0.05)
+        energy = sampler.stop()
+        self.assertGreater(energy["a"], 0.0)
+        self.assertEqual(len(sampler.samples()), 2)
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from green_llama import stats
+
+
+def sums(values):
+    values = np.asarray(values, dtype=float)
+    return [values.size, float(values.sum()), float(np.dot(values, values))]
+
+
+class TestStats(unittest.TestCase):
+    def test_summarize(self):
+        values = np.random.default_rng(1).normal(10.0, 1.0, size=200)
+        summary = stats.summarize(values)
+        self.assertEqual(summary["count"], 200)
+        self.assertAlmostEqual(summary["median"], float(np.median(values)))
+        self.assertLess(summary["ci_low"], summary["mean"])
+        self.assertGreater(summary["ci_high"], summary["mean"])
+        # The interval of the mean is about 2 standard errors wide either way
+        self.assertAlmostEqual(summary["ci_high"] - summary["ci_low"], 4 * values.std() / np.sqrt(200), delta=0.05)
+        self.assertGreater(summary["p95"], summary["median"])
+
+    def test_single_value(self):
+        self.assertEqual(stats.bootstrap_ci([3.0]), (3.0, 3.0))
+        self.assertEqual(stats.summarize([])["count"], 0)
+
+    def test_significant_ranks(self):
+        rng = np.random.default_rng(2)
+        best = sums(rng.normal(1.0, 0.1, 50))
+        close = sums(rng.normal(1.01, 0.1, 50))
+        worse = sums(rng.normal(2.0, 0.1, 50))
+        single = sums([2.5])
+        self.assertGreater(stats.welch_p_value(best, close), 0.05)
+        self.assertLess(stats.welch_p_value(best, worse), 0.05)
+        self.assertEqual(stats.significant_ranks([best, close, worse, single]), [1, 1, 3, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
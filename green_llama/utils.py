@@ -1,22 +1,38 @@
+import atexit
 import csv
 import os
 import platform
-import matplotlib.pyplot as plt
 from rich.console import Console
 from rich.table import Table
-from datasets import load_dataset
 import re
 import time
-import requests
 import subprocess
 from rich import print
+from . import prompt_store
+from .metrics_store import BufferedWriter, MetricsStore, new_run_id, storage_records
+from .rank_index import RankIndex, mean
+from .stats import significant_ranks, summarize_storage
 
 console = Console()
 
-def save_metrics_to_csv(metric_name, metric_value, elapsed_time):
-    with open("metrics.csv", mode="a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([metric_name, metric_value, elapsed_time])
+_monitoring_writer = None
+_monitoring_run_ids = {}
+
+def record_monitoring_metric(metric_name, metric_value, elapsed_time, model="", prompt=""):
+    """Record one monitored value, buffered and appended to the metrics store in batches.
+
+    Every model gets its own monitoring run_id the first time it is recorded.
+    """
+    global _monitoring_writer
+    if _monitoring_writer is None:
+        _monitoring_writer = BufferedWriter(MetricsStore(), benchmark="monitoring")
+        atexit.register(_monitoring_writer.flush)
+    if model not in _monitoring_run_ids:
+        _monitoring_run_ids[model] = new_run_id(model, "monitoring")
+    _monitoring_writer.add({
+        "run_id": _monitoring_run_ids[model], "model": model, "prompt": prompt, "elapsed_time": elapsed_time,
+        "metrics": {metric_name: metric_value},
+    })
 
 def make_report():
     return 0
@@ -27,6 +43,8 @@ def calculate_average_metric(metrics_storage):
     return sum(metrics_storage["values"]) / len(metrics_storage["values"])
 
 def plot_metrics(metric_name, values):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(8, 5))
     plt.plot(range(len(values)), values, color='skyblue')
     plt.xlabel("Time")
@@ -34,13 +52,15 @@ def plot_metrics(metric_name, values):
     plt.title(f"{metric_name} over Time")
     plt.show()
 
-def display_summary(metrics_storage):
+def display_summary(metrics_storage, selected_metrics=None):
+    """Show averages of the selected metrics (all when None) plus conversation totals"""
     table = Table(title="Summary of Metrics for this Conversation")
     table.add_column("Metric", style="bold")
     table.add_column("Value", justify="right")
 
     total_energy = 0
     total_co2 = 0
+    total_tokens = 0
     total_time = 0
     num_prompts = 0
     most_costly_prompt = ("", 0)
@@ -56,7 +76,8 @@ def display_summary(metrics_storage):
             
         avg_metric = sum(data["values"]) / len(data["values"])
         if avg_metric > 0: 
-            table.add_row(f"Average {metric_name}", f"{avg_metric:.2f}")
+            if selected_metrics is None or metric_name in selected_metrics:
+                table.add_row(f"Average {metric_name}", f"{avg_metric:.2f}")
 
             if metric_name == "Total Energy (J)":
                 total_energy = sum(data["values"])
@@ -67,19 +88,27 @@ def display_summary(metrics_storage):
                         least_costly_prompt = (prompt, value)
             elif metric_name == "Carbon Emissions (gCO2)":
                 total_co2 = sum(data["values"])
+            elif metric_name == "Generated Tokens":
+                total_tokens = sum(data["values"])
 
-            total_time += sum(data["times"])
-            num_prompts += len(data["prompts"])
+            # Every metric is recorded once per prompt with the same elapsed time
+            if len(data["prompts"]) > num_prompts:
+                num_prompts = len(data["prompts"])
+                total_time = sum(data["times"])
 
     if num_prompts > 0:  
         avg_response_time = total_time / num_prompts
         table.add_row("Average Response Time (s)", f"{avg_response_time:.2f}")
-        table.add_row("Number of Prompts", str(int(num_prompts/4)))
+        table.add_row("Number of Prompts", str(num_prompts))
         
         if total_energy > 0:
             table.add_row("Total Energy (J)", f"{total_energy:.2f}")
         if total_co2 > 0:
             table.add_row("Total CO2 Emissions (gCO2)", f"{total_co2:.2f}")
+        if total_tokens > 0:
+            table.add_row("Total Generated Tokens", str(int(total_tokens)))
+            table.add_row("Overall Energy per Token (J/token)", f"{total_energy / total_tokens:.4f}")
+            table.add_row("Overall gCO2 per 1k Tokens", f"{total_co2 * 1000 / total_tokens:.4f}")
         if most_costly_prompt[0]:  
             table.add_row("Most Costly Prompt", most_costly_prompt[0][:25] + "..." if len(most_costly_prompt[0]) > 25 else most_costly_prompt[0])
         if least_costly_prompt[0]:
@@ -87,40 +116,62 @@ def display_summary(metrics_storage):
 
     console.print(table)
 
-def save_all_metrics_to_csv(model, metrics_storage):
-
-    system = platform.system()
+def display_statistics(metrics_storage, selected_metrics=None):
+    """Show the spread of every metric over the benchmark's measurements"""
+    table = Table(title="Benchmark Statistics")
+    table.add_column("Metric", style="bold")
+    table.add_column("N", justify="right")
+    table.add_column("Median", justify="right")
+    table.add_column("p95", justify="right")
+    table.add_column("Mean [95% CI]", justify="right")
+    for metric_name, summary in summarize_storage(metrics_storage, selected_metrics).items():
+        table.add_row(
+            metric_name, str(summary["count"]), f"{summary['median']:.4f}", f"{summary['p95']:.4f}",
+            f"{summary['mean']:.4f} [{summary['ci_low']:.4f}, {summary['ci_high']:.4f}]",
+        )
+    console.print(table)
 
-    file_path = f"report_viewer/public/model_history/{model}_all_metrics.csv"
-    out_path = "report_viewer/public/conversation_metrics.csv"
-    if system == "Windows":
+def model_history_log(model, data_folder="report_viewer/public"):
+    """(safe_model, file_path) of a model's conversation history log in the report viewer"""
+    if platform.system() == "Windows":
         safe_model = re.sub(r'[\\/:*?"<>|]', '_', model.replace('.', '_'))
-        file_path = f"report_viewer/public/model_history/{safe_model}_all_metrics.csv"
     else:
         safe_model = model.replace('.', '_').replace(':', '_').replace('-', '_')
-        file_path = f"report_viewer/public/model_history/{safe_model}_all_metrics.csv"
-
-
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    def write_metrics(writer):
-        for metric_name, data in metrics_storage.items():
-            for prompt, value, elapsed_time in zip(data["prompts"], data["values"], data["times"]):
-                writer.writerow([metric_name, prompt, value, elapsed_time])
+    return safe_model, os.path.join(data_folder, "model_history", f"{safe_model}_all_metrics.csv")
+
+def save_history_records(records, store=None, data_folder="report_viewer/public", index=None):
+    """Append conversation records to the metrics store as one batch and re-export the
+    history logs of their models"""
+    store = store or MetricsStore()
+    index = index or RankIndex.of_store(store)
+    models = list(dict.fromkeys(record["model"] for record in records))
+    entries = {}
+    for model in models:
+        safe_model, file_path = model_history_log(model, data_folder)
+        entries[model] = index.entry(file_path, "model_history", safe_model)
+        if os.path.exists(file_path) and not store.count(model=model, benchmark="model_history"):
+            # Keep the history logged before the store existed
+            store.import_csv(file_path, "legacy", model, "model_history")
+    segment = store.append([{**record, "benchmark": "model_history"} for record in records])
+    for model in models:
+        safe_model, file_path = model_history_log(model, data_folder)
+        store.export_csv(file_path, model=model, benchmark="model_history")
+        index.update(file_path, "model_history", safe_model, entries[model], store, segment,
+                     {"model": model, "benchmark": "model_history"})
+
+def save_all_metrics_to_csv(model, metrics_storage, store=None, run_id=None):
+    """Append a conversation to the metrics store and re-export the viewer's model history and conversation logs"""
+    store = store or MetricsStore()
+    run_id = run_id or new_run_id(model, "conversation")
+    out_path = "report_viewer/public/conversation_metrics.csv"
 
     # Save model-specific
-    file_exists = os.path.exists(file_path)
-    with open(file_path, mode="a" if file_exists else "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Metric Name", "Prompt", "Value", "Elapsed Time"])
-        write_metrics(writer)
-
+    save_history_records([
+        {"run_id": run_id, "model": model, "prompt": prompt, "elapsed_time": elapsed_time, "metrics": metrics}
+        for prompt, elapsed_time, metrics in storage_records(metrics_storage)
+    ], store)
     # Save conversation log
-    with open(out_path, mode="w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(["Metric Name", "Prompt", "Value", "Elapsed Time"])
-        write_metrics(writer)
+    store.export_csv(out_path, run_id=run_id)
 
 def clear_metrics_storage(metrics_storage):
     for metric in metrics_storage:
@@ -172,115 +223,89 @@ def display_ranking(data_collection_folder):
     console.print(table)
 
 
-def rank_models_by_co2(data_collection_folder):
-    benchmark_directories = ["chat_benchmark", "code_benchmark", "text_benchmark", "model_history"]
-    benchmark_names = {
-        "chat_benchmark": "Chat Testing Benchmark",
-        "code_benchmark": "Code Generation Benchmark",
-        "text_benchmark": "Text Generation Benchmark",
-        "model_history": "Conversations History"
-    }
-    if os.name == "nt":
-        for x in benchmark_directories :
-            x = x.replace("/", "\\")
-    model_history_folder = os.path.join(data_collection_folder, "model_history")
-
-    for benchmark_dir in benchmark_directories:
-        if benchmark_dir != "model_history":
-            benchmark_results_folder = os.path.join(data_collection_folder, "benchmark_results", benchmark_dir)
-
-            model_averages = {}
-            ranked_models = []
-
-            # Process benchmark_results directory first
-            for file_name in os.listdir(benchmark_results_folder):
-                if file_name.endswith("_benchmark_log.csv"):
-                    file_path = os.path.join(benchmark_results_folder, file_name)
-                    model_name = file_name.replace("_benchmark_log.csv", "")
-                    co2_values = read_co2_emissions_from_csv(file_path)
-                    avg_co2 = calculate_average(co2_values)
-                    model_averages[model_name] = avg_co2
-                    ranked_models.append((model_name, avg_co2))
-            # Sort models by average CO2 emissions
-            ranked_models.sort(key=lambda x: x[1])
-
-            # Display the ranking
-            console.print(" ")
-            table = Table(title=f"Model Ranking by Average CO2 Emissions per Prompt - {benchmark_names[benchmark_dir]}")
-            table.add_column("Rank", style="bold")
-            table.add_column("Model", style="bold")
-            table.add_column("Average CO2 Emissions (gCO2)", justify="right")
-
-            for rank, (model_name, avg_co2) in enumerate(ranked_models, start=1):
-                table.add_row(str(rank), model_name, f"{avg_co2:.4f}")
-
-            console.print(table)
-            console.print(" ")
-        else:
+BENCHMARK_NAMES = {
+    "chat_benchmark": "Chat Testing Benchmark",
+    "code_benchmark": "Code Generation Benchmark",
+    "text_benchmark": "Text Generation Benchmark",
+    "model_history": "Conversations History"
+}
 
-            model_averages = {}
-            ranked_models = []
-            for file_name in os.listdir(model_history_folder):
-                if file_name.endswith("_all_metrics.csv"):
-                    file_path = os.path.join(model_history_folder, file_name)
-                    model_name = file_name.replace("_all_metrics.csv", "")
-                    if model_name not in model_averages:
-                        co2_values = read_co2_emissions_from_csv(file_path)
-                        avg_co2 = calculate_average(co2_values)
-                        model_averages[model_name] = avg_co2
-                        ranked_models.append((model_name , avg_co2))
-
-            # Sort models by average CO2 emissions
-            ranked_models.sort(key=lambda x: x[1])
-
-            # Display the ranking
-            console.print(" ")
-            table = Table(title=f"Model Ranking by Average CO2 Emissions per Prompt - {benchmark_names[benchmark_dir]}")
-            table.add_column("Rank", style="bold")
-            table.add_column("Model", style="bold")
-            table.add_column("Average CO2 Emissions (gCO2)", justify="right")
+def benchmark_logs(data_collection_folder, benchmark_dir):
+    """(benchmark_dir, model, file_path) of every model's log of a benchmark"""
+    if benchmark_dir != "model_history":
+        folder = os.path.join(data_collection_folder, "benchmark_results", benchmark_dir)
+        suffix = "_benchmark_log.csv"
+    else:
+        folder = os.path.join(data_collection_folder, "model_history")
+        suffix = "_all_metrics.csv"
+    if not os.path.isdir(folder):
+        return []
+    return [
+        (benchmark_dir, file_name[:-len(suffix)], os.path.join(folder, file_name))
+        for file_name in sorted(os.listdir(folder)) if file_name.endswith(suffix)
+    ]
+
+def model_rankings(data_collection_folder, index=None):
+    """Rank models per benchmark, returning {benchmark_dir: [(rank, model, avg_co2, j_per_token, co2_per_1k)]}.
+
+    Averages come from the rank index, which only re-reads logs changed since
+    they were last indexed. Models share a rank unless their difference is
+    statistically significant. Models without the ranking metric come last
+    with rank None.
+    """
+    index = index or RankIndex()
+    rankings = {}
+    for benchmark_dir in BENCHMARK_NAMES:
+        entries = index.refresh(benchmark_logs(data_collection_folder, benchmark_dir))
+        # Per-token emissions compare models fairly when outputs differ in length,
+        # older logs without token counts fall back to emissions per prompt
+        if entries and all("gCO2 per 1k Tokens" in entry["metrics"] for entry in entries):
+            ranking_metric = "gCO2 per 1k Tokens"
+        else:
+            ranking_metric = "Carbon Emissions (gCO2)"
+        # Logs without the metric can't be compared, they are listed last without a rank
+        ranked = [entry for entry in entries if ranking_metric in entry["metrics"]]
+        unranked = [entry for entry in entries if entry not in ranked]
+        ranked.sort(key=lambda entry: mean(entry["metrics"][ranking_metric]))
+        ranks = significant_ranks([entry["metrics"][ranking_metric] for entry in ranked]) + [None] * len(unranked)
+        entries = ranked + unranked
+        rankings[benchmark_dir] = [
+            (rank, entry["model"], *(mean(entry["metrics"][metric]) if metric in entry["metrics"] else None
+                                     for metric in RANKING_METRICS))
+            for rank, entry in zip(ranks, entries)
+        ]
+    return rankings
 
-            for rank, (model_name, avg_co2) in enumerate(ranked_models, start=1):
-                table.add_row(str(rank), model_name, f"{avg_co2:.4f}")
+def rank_models_by_co2(data_collection_folder):
+    for benchmark_dir, ranked_models in model_rankings(data_collection_folder).items():
+        # Display the ranking
+        console.print(" ")
+        table = Table(title=f"Model Ranking by CO2 Emissions per 1k Tokens - {BENCHMARK_NAMES[benchmark_dir]}")
+        table.add_column("Rank", style="bold")
+        table.add_column("Model", style="bold")
+        table.add_column("gCO2 per 1k Tokens", justify="right")
+        table.add_column("Energy per Token (J/token)", justify="right")
+        table.add_column("Average CO2 per Prompt (gCO2)", justify="right")
+
+        ranks = [rank for rank, *_ in ranked_models]
+        for rank, model_name, avg_co2, j_per_token, co2_per_1k in ranked_models:
+            table.add_row(
+                "-" if rank is None else f"{rank}=" if ranks.count(rank) > 1 else str(rank), model_name,
+                f"{co2_per_1k:.4f}" if co2_per_1k is not None else "-",
+                f"{j_per_token:.4f}" if j_per_token is not None else "-",
+                f"{avg_co2:.4f}" if avg_co2 is not None else "-",
+            )
 
-            console.print(table)
-            console.print(" ")
+        console.print(table)
+        console.print("Models sharing a rank (=) are not significantly different at 95% confidence.")
+        console.print(" ")
 
 
 def load_benchmark_dataset(task_name="text-generation", num_samples=1000):
-    if task_name == "text-generation":
-        ds = load_dataset("wikitext", "wikitext-2-raw-v1", split="test")
-        prompts = ds["text"][:num_samples]
-        return [p.strip() for p in prompts if len(p.strip()) > 10]
-    elif task_name == "code-generation":
-        
-        code_prompts = [
-            "Write a Python function to sort a list",
-            "Create a JavaScript class for a binary tree",
-            "Implement a C++ function to reverse a string",
-            "Write a SQL query to find duplicate records",
-            "Create a Java method to calculate factorial",
-            "Write a Python decorator for timing functions",
-            "Implement a JavaScript promise-based API call",
-            "Create a C++ template class for a stack",
-            "Write a SQL stored procedure for user authentication",
-            "Implement a Java interface for a database connection"
-        ]
-        return code_prompts
-    else:  # chat-testing
-        chat_prompts = [
-            "Hello, please introduce yourself", # 
-            "What's the weather like today?",
-            "Can you help me with my homework?",
-            "Tell me a joke",
-            "What's your favorite color?",
-            "How do you feel about artificial intelligence?",
-            "Can you explain quantum computing?",
-            "What's your opinion on climate change?",
-            "Tell me about your capabilities",
-            "What's the meaning of life?"
-        ]
-        return chat_prompts
+    """Prompts of a benchmark task from the local prompt store, built on first use"""
+    return prompt_store.load_prompts(task_name, num_samples)
+
+RANKING_METRICS = ["Carbon Emissions (gCO2)", "Energy per Token (J/token)", "gCO2 per 1k Tokens"]
 
 def read_co2_emissions_from_csv(file_path):
     co2_values = []
@@ -299,6 +324,8 @@ def clear_terminal():
 
 
 def launch_report_viewer():
+    import requests
+
     viewer_dir = os.path.join(os.getcwd(), "report_viewer")
     npm_cmd = "npm.cmd" if os.name == "nt" else "npm"
     node_modules = os.path.join(viewer_dir, "node_modules")
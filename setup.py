@@ -4,6 +4,7 @@ setup(
     name="green-llama",
     version="1.0.0",
     packages=find_packages(),
+    package_data={"green_llama": ["data/prompts/*.prompts"]},
     install_requires=[
         "psutil",
         "pynvml",
@@ -14,6 +15,7 @@ setup(
         "datasets",
         "requests",
         "numpy",
+        "httpx",
     ],
     entry_points={
         "console_scripts": [